@@ -0,0 +1,56 @@
+"""Parse-throughput micro-benchmark for the @bot command router.
+
+    python benchmarks/bench_command_router.py [--iterations N]
+
+Replays benchmarks/corpus/messages.txt through CommandRouter.parse and reports
+messages/second, mean latency per message and how the corpus was classified.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+from zoho_whatsapp_bot import command_router  # noqa: E402
+
+CORPUS_PATH = os.path.join(ROOT, "benchmarks", "corpus", "messages.txt")
+
+
+def load_corpus(path=CORPUS_PATH):
+    with open(path, encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f if line.strip() and not line.startswith("#")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    counts = Counter(getattr(command_router.parse(m), "name", None) for m in corpus)
+
+    # Warm up regex caches before timing
+    for message in corpus:
+        command_router.parse(message)
+
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        for message in corpus:
+            command_router.parse(message)
+    elapsed = time.perf_counter() - start
+
+    total = args.iterations * len(corpus)
+    print(f"messages parsed : {total}")
+    print(f"throughput      : {total / elapsed:,.0f} msg/s")
+    print(f"mean latency    : {elapsed / total * 1e6:.2f} µs/msg")
+    print("classification  :")
+    for name, count in sorted(counts.items(), key=lambda item: str(item[0])):
+        print(f"  {str(name):<16} {count}")
+
+
+if __name__ == "__main__":
+    main()
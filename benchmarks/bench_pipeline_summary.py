@@ -0,0 +1,162 @@
+"""Pipeline summary: full scan per request vs the aggregate cache.
+
+    python benchmarks/bench_pipeline_summary.py [--deals N] [--requests R] [--changed M]
+
+Fills the fake Zoho from fake_upstreams.py with N generated deals, then reports:
+
+  scan         what answering without the cache costs: paging every deal
+               through the list API and adding them up (time, Zoho calls)
+  build        the cache's first load through COQL (time, Zoho calls)
+  cached       R summaries answered from the cache, in-process and as
+               "@bot pipeline summary" webhooks (p50/p95)
+  incremental  M deals change stage and amount in the fake; one sync picks
+               them up (time, Zoho calls, deals read), and the totals are
+               checked against a recount of every deal
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import fake_upstreams  # noqa: E402
+
+TZ = timezone(timedelta(hours=4))
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def ms(value):
+    return f"{value * 1000:9.2f} ms"
+
+
+def modified_time(moment):
+    return moment.astimezone(TZ).replace(microsecond=0).isoformat()
+
+
+def generate_deals(count, seed=7):
+    rng = random.Random(seed)
+    start = datetime.now(TZ) - timedelta(days=365)
+    deals = []
+    for i in range(count):
+        deals.append({
+            "id": str(5000000000000000000 + i),
+            "Deal_Name": f"Deal {i:06d}",
+            "Pipeline": rng.choice(fake_upstreams.DEAL_PIPELINES),
+            "Stage": rng.choice(fake_upstreams.DEAL_STAGES),
+            "Amount": rng.choice([None, rng.randrange(5, 5000) * 1000]),
+            "Closing_Date": (date.today() + timedelta(days=rng.randint(-60, 60))).isoformat(),
+            "Modified_Time": modified_time(start + timedelta(seconds=i * 365 * 86400 // count)),
+        })
+    return deals
+
+
+def recount(deals):
+    totals = defaultdict(lambda: [0, 0.0])
+    for deal in deals:
+        entry = totals[(deal.get("Pipeline"), deal.get("Stage"))]
+        entry[0] += 1
+        entry[1] += float(deal.get("Amount") or 0)
+    return {key: (count, round(amount, 2)) for key, (count, amount) in totals.items()}
+
+
+def cached_totals(summary):
+    return {(pipeline, stage): (count, round(amount, 2))
+            for pipeline, entry in summary["pipelines"].items()
+            for stage, (count, amount) in entry["stages"].items()}
+
+
+class Calls:
+    # Zoho calls by fake route since the last take().
+    def __init__(self, server):
+        self.server = server
+        self.last = dict(server.calls)
+
+    def take(self):
+        now = dict(self.server.calls)
+        diff = {k: v - self.last.get(k, 0) for k, v in now.items() if v - self.last.get(k, 0)}
+        self.last = now
+        return diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--deals", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--changed", type=int, default=50)
+    fake_upstreams.add_arguments(parser)
+    parser.set_defaults(zoho_latency=40, zoho_jitter=10, twilio_latency=5, twilio_jitter=1)
+    args = parser.parse_args()
+
+    records = fake_upstreams.load_records()
+    deals = generate_deals(args.deals)
+    records["Deals"] = deals
+    servers = fake_upstreams.start_all(args, records)
+    os.environ.update(fake_upstreams.app_environment(servers))
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("OUTBOUND_RECIPIENT_RATE", "1000")
+    os.environ.setdefault("OUTBOUND_RECIPIENT_BURST", "1000")
+    os.environ.setdefault("OUTBOUND_GLOBAL_RATE", "10000")
+    os.environ.setdefault("OUTBOUND_GLOBAL_BURST", "10000")
+
+    import zoho_whatsapp_bot as bot
+    from crm_mirror import iter_records
+
+    summary = bot.tenants.default().pipeline_summary
+    calls = Calls(servers["zoho"])
+    bot.get_access_token()
+    calls.take()
+
+    started = time.perf_counter()
+    recount(iter_records(bot.zoho, "Deals"))
+    print(f"scan         {ms(time.perf_counter() - started)} per request   zoho calls {calls.take()}")
+
+    started = time.perf_counter()
+    summary.sync(full=True)
+    print(f"build        {ms(time.perf_counter() - started)} once          zoho calls {calls.take()}")
+
+    in_process = []
+    for _ in range(args.requests):
+        started = time.perf_counter()
+        summary.summary()
+        in_process.append(time.perf_counter() - started)
+    client = bot.create_app().test_client()
+    webhook = []
+    for i in range(args.requests):
+        started = time.perf_counter()
+        client.post("/whatsapp", data={"Body": "@bot pipeline summary", "From": f"whatsapp:+9715{i:08d}",
+                                       "MessageSid": f"SMsummary{i:08d}"})
+        webhook.append(time.perf_counter() - started)
+    zoho_calls = {k: v for k, v in calls.take().items() if k != "zoho_fields"}
+    print(f"cached       summary() p50 {ms(statistics.median(in_process))} p95 {ms(percentile(in_process, 0.95))}"
+          f"   webhook p50 {ms(statistics.median(webhook))} p95 {ms(percentile(webhook, 0.95))}"
+          f"   zoho calls {zoho_calls}")
+
+    now = datetime.now(TZ)
+    for offset, deal in enumerate(random.Random(11).sample(deals, min(args.changed, len(deals)))):
+        deal["Stage"] = random.choice(fake_upstreams.DEAL_STAGES)
+        deal["Amount"] = (deal["Amount"] or 0) + 1000
+        deal["Modified_Time"] = modified_time(now + timedelta(seconds=offset))
+    deals.sort(key=lambda deal: deal["Modified_Time"])
+    started = time.perf_counter()
+    read = summary.sync()
+    elapsed = time.perf_counter() - started
+    correct = cached_totals(summary.summary()) == recount(deals)
+    print(f"incremental  {ms(elapsed)} for {read} deals read   zoho calls {calls.take()}"
+          f"   totals match recount: {correct}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Many tenants on one worker: build cost, cold vs warm messages, eviction churn, noisy neighbours.
+
+    python benchmarks/bench_tenants.py [--tenants N] [--rounds R] [--churn-threads C] [--noisy-threads T]
+                                       [--outbound sync|async]
+
+Starts the fakes from fake_upstreams.py and writes a TENANTS_FILE with N
+tenants (each its own number, Zoho credentials and Twilio account) before
+importing the app. Reports:
+
+  build      time and traced memory for build_tenant() per tenant
+  messages   first ("cold": builds the tenant, fetches its token) vs later
+             ("warm") "@bot search deal" latency, with every tenant kept active
+  churn      the same round-robin traffic from --churn-threads threads with
+             TENANT_MAX_ACTIVE at half of N, so most messages rebuild an evicted
+             tenant; replies dropped because their tenant was closed under them
+             should stay at 0 (use --outbound async to send through the queues)
+  noisy      quiet tenants' p95 on their own, then while one tenant floods the
+             bot from --noisy-threads threads (its own Zoho in-flight cap and
+             Twilio send rate hold it back, not the others)
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import fake_upstreams  # noqa: E402
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def write_tenants_file(count):
+    tenants = [{
+        "id": f"unit{i:03d}",
+        "number": f"whatsapp:+1555{i:07d}",
+        "zoho_client_id": f"unit{i:03d}", "zoho_client_secret": "bench", "zoho_refresh_token": "bench",
+        "twilio_account_sid": f"ACunit{i:03d}",
+    } for i in range(count)]
+    f = tempfile.NamedTemporaryFile("w", suffix=".json", delete=False)
+    json.dump(tenants, f)
+    f.close()
+    return f.name, [t["number"] for t in tenants]
+
+
+class Messages:
+    # Posts "@bot search deal" webhooks through the Flask test client, one sender per message so the
+    # per-recipient send limit doesn't get in the way.
+    def __init__(self, app, deal_name):
+        self.app = app
+        self.deal_name = deal_name
+        self._lock = threading.Lock()
+        self._count = 0
+
+    def send(self, number):
+        with self._lock:
+            self._count += 1
+            n = self._count
+        started = time.perf_counter()
+        response = self.app.test_client().post("/whatsapp", data={
+            "Body": f"@bot search deal {self.deal_name}", "From": f"whatsapp:+9715{n:08d}", "To": number,
+            "MessageSid": f"SMtenant{n:010d}",
+        })
+        elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            raise RuntimeError(f"webhook returned {response.status_code}")
+        return elapsed
+
+
+def ms(value):
+    return f"{value * 1000:8.1f} ms" if value is not None else f"{'-':>11}"
+
+
+def bench_build(bot, configs):
+    times, sizes = [], []
+    tracemalloc.start()
+    for config in configs:
+        before = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        tenant = bot.build_tenant(config)
+        times.append(time.perf_counter() - started)
+        sizes.append(tracemalloc.get_traced_memory()[0] - before)
+        tenant.close()
+    tracemalloc.stop()
+    print(f"build      p50 {ms(statistics.median(times))}  p95 {ms(percentile(times, 0.95))}"
+          f"  memory {statistics.median(sizes) / 1024:.0f} KiB/tenant (traced, median)")
+
+
+def bench_messages(messages, numbers, rounds):
+    cold = [messages.send(number) for number in numbers]
+    warm = [messages.send(number) for _ in range(rounds) for number in numbers]
+    print(f"messages   cold p50 {ms(statistics.median(cold))}  p95 {ms(percentile(cold, 0.95))}"
+          f"   warm p50 {ms(statistics.median(warm))}  p95 {ms(percentile(warm, 0.95))}")
+
+
+def bench_churn(bot, messages, numbers, rounds, threads):
+    from outbound import SENDS
+
+    registry = bot.tenants
+    registry.max_active = max(1, len(numbers) // 2)
+    registry.evict()  # down to max_active before counting
+    builds, evictions, dropped = registry.builds, registry.evictions, SENDS.value(outcome="dropped")
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = list(pool.map(messages.send, [number for _ in range(rounds) for number in numbers]))
+    print(f"churn      max_active={registry.max_active}  p50 {ms(statistics.median(latencies))}"
+          f"  p95 {ms(percentile(latencies, 0.95))}  builds {registry.builds - builds}"
+          f"  evictions {registry.evictions - evictions}"
+          f"  replies dropped {SENDS.value(outcome='dropped') - dropped}")
+    registry.max_active = len(numbers) + 1
+
+
+def bench_noisy(messages, numbers, rounds, threads):
+    noisy, quiet = numbers[0], numbers[1:]
+    for number in numbers:
+        messages.send(number)  # make sure every tenant is built before measuring
+
+    def quiet_p95():
+        return percentile([messages.send(number) for _ in range(rounds) for number in quiet], 0.95)
+
+    alone = quiet_p95()
+    stop = threading.Event()
+    flooded = []
+
+    def flood():
+        while not stop.is_set():
+            flooded.append(messages.send(noisy))
+
+    workers = [threading.Thread(target=flood, daemon=True) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    time.sleep(0.5)
+    with_noise = quiet_p95()
+    stop.set()
+    for worker in workers:
+        worker.join()
+    print(f"noisy      quiet p95 alone {ms(alone)}  with neighbour flooding {ms(with_noise)}"
+          f"   noisy tenant p95 {ms(percentile(flooded, 0.95))} ({len(flooded)} messages)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tenants", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=3, help="messages per tenant in each timed phase")
+    parser.add_argument("--churn-threads", type=int, default=32)
+    parser.add_argument("--noisy-threads", type=int, default=16)
+    parser.add_argument("--outbound", choices=("sync", "async"), default="sync", help="OUTBOUND_MODE")
+    fake_upstreams.add_arguments(parser)
+    parser.set_defaults(zoho_latency=20, zoho_jitter=5, twilio_latency=10, twilio_jitter=2)
+    args = parser.parse_args()
+
+    records = fake_upstreams.load_records()
+    servers = fake_upstreams.start_all(args, records)
+    path, numbers = write_tenants_file(args.tenants)
+    os.environ.update(fake_upstreams.app_environment(servers))
+    os.environ.update({"TENANTS_FILE": path, "TENANT_MAX_ACTIVE": str(args.tenants + 1), "OUTBOUND_MODE": args.outbound,
+                       "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING")})
+
+    import zoho_whatsapp_bot as bot
+
+    messages = Messages(bot.create_app(), records["Deals"][0]["Deal_Name"])
+    try:
+        bench_build(bot, list(bot.tenants.configs.values()))
+        bench_messages(messages, numbers, args.rounds)
+        bench_churn(bot, messages, numbers, args.rounds, args.churn_threads)
+        bench_noisy(messages, numbers, args.rounds, args.noisy_threads)
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
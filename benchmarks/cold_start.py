@@ -0,0 +1,106 @@
+"""Cold start: time from starting a fresh worker process to its first webhook response.
+
+    python benchmarks/cold_start.py [--runs N] [--warmup off,background,blocking]
+
+Each run starts a new Python process that imports the app and serves it on a
+local port against the fakes from fake_upstreams.py, then posts one
+"@bot search deal" webhook as soon as the port is open. Reports the median
+import time, time until the port accepts requests, time until /ready is 200 and
+time until the first webhook has been answered, per WARMUP mode.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import fake_upstreams  # noqa: E402
+
+
+def child():
+    # Runs in the fresh process: import, serve, and tell the parent where.
+    started = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    from werkzeug.serving import make_server
+    from zoho_whatsapp_bot import create_app
+    app = create_app()
+
+    imported = time.perf_counter() - started
+    httpd = make_server("127.0.0.1", 0, app, threaded=True)
+    print(json.dumps({"port": httpd.server_port, "import_s": imported}), flush=True)
+    httpd.serve_forever()
+
+
+def poll(url, deadline):
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url, timeout=5).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.005)
+    return False
+
+
+def run_once(environment, deal_name, timeout=60):
+    started = time.monotonic()
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--child"], env=environment,
+                               stdout=subprocess.PIPE, text=True)
+    try:
+        # Log lines share stdout with the child's handshake.
+        info = {}
+        while "port" not in info:
+            line = process.stdout.readline()
+            if not line:
+                raise RuntimeError("app process exited before serving")
+            info = json.loads(line) if line.startswith('{"port"') else {}
+        base = f"http://127.0.0.1:{info['port']}"
+        listening = time.monotonic() - started
+        response = requests.post(f"{base}/whatsapp", timeout=timeout, data={
+            "Body": f"@bot search deal {deal_name}", "From": "whatsapp:+971500000000", "MessageSid": "SMcoldstart",
+        })
+        first_response = time.monotonic() - started
+        ready = time.monotonic() - started if poll(f"{base}/ready", started + timeout) else None
+        return {"import_s": info["import_s"], "listen_s": listening, "ready_s": ready,
+                "first_response_s": first_response, "ok": response.status_code == 200}
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    if "--child" in sys.argv:
+        return child()
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warmup", default="off,background,blocking", help="WARMUP modes to compare")
+    fake_upstreams.add_arguments(parser)
+    args = parser.parse_args()
+
+    records = fake_upstreams.load_records()
+    servers = fake_upstreams.start_all(args, records)
+    deal_name = records["Deals"][0]["Deal_Name"]
+    base_environment = dict(os.environ, LOG_LEVEL="WARNING", **fake_upstreams.app_environment(servers))
+
+    columns = ("import_s", "listen_s", "ready_s", "first_response_s")
+    print(f"{'warmup':<12}" + "".join(f"{c:>18}" for c in columns))
+    for mode in args.warmup.split(","):
+        runs = [run_once(dict(base_environment, WARMUP=mode), deal_name) for _ in range(args.runs)]
+        failed = sum(not run["ok"] for run in runs)
+        row = []
+        for column in columns:
+            values = [run[column] for run in runs if run[column] is not None]
+            row.append(f"{statistics.median(values) * 1000:>15.0f} ms" if values else f"{'-':>18}")
+        print(f"{mode:<12}" + "".join(row) + (f"  ({failed} failed)" if failed else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Offline evaluation of the local intent classifier.
+
+    python benchmarks/eval_intent_classifier.py [--threshold 0.8] [--verbose]
+
+Runs benchmarks/corpus/intents.jsonl (text + expected command name, or "llm" for
+messages that should go to the model) through IntentClassifier and reports precision
+and recall of local routing plus per-message classification latency. The Deal
+picklists come from the fake Zoho's field metadata, so nothing goes over the network
+and every run sees the same stages.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+import fake_upstreams  # noqa: E402
+from intent_classifier import IntentClassifier  # noqa: E402
+from picklists import DealPicklists, parse_deal_fields  # noqa: E402
+# Only the command tables; importing the bot builds no app or tenant.
+from zoho_whatsapp_bot import DEFAULT_PIPELINES, DEFAULT_STAGES, command_router  # noqa: E402
+
+LABELS_PATH = os.path.join(ROOT, "benchmarks", "corpus", "intents.jsonl")
+
+
+def load_labels(path=LABELS_PATH):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def build_classifier(threshold=0.8):
+    _, fields = fake_upstreams.zoho_fields(None, None, {"module": ["Deals"]}, b"", {})
+    picklists = DealPicklists(lambda: parse_deal_fields(fields), DEFAULT_STAGES, DEFAULT_PIPELINES,
+                              ttl=float("inf"))
+    picklists.refresh()
+    return IntentClassifier(command_router, picklists, threshold=threshold)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threshold", type=float, default=float(os.environ.get("INTENT_THRESHOLD", "0.8")))
+    parser.add_argument("--repeat", type=int, default=200, help="timing passes over the set")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    intent_classifier = build_classifier(args.threshold)
+    examples = load_labels()
+    true_pos = false_pos = false_neg = 0
+    for example in examples:
+        intent = intent_classifier.classify(example["text"])
+        routed = intent.command is not None and intent.confidence >= args.threshold
+        predicted = intent.command.name if routed else "llm"
+        expected = example["label"]
+
+        if predicted != "llm" and predicted == expected:
+            true_pos += 1
+        elif predicted != "llm":
+            false_pos += 1
+        if expected != "llm" and predicted != expected:
+            false_neg += 1
+
+        if args.verbose or predicted != expected:
+            mark = "ok " if predicted == expected else "ERR"
+            print(f"{mark} {intent.confidence:.2f} {intent.reason:<14} {predicted:<15} <- {example['text']!r}"
+                  f"{'' if predicted == expected else f' (expected {expected})'}")
+
+    timings = []
+    for _ in range(args.repeat):
+        for example in examples:
+            start = time.perf_counter()
+            intent_classifier.classify(example["text"])
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+
+    precision = true_pos / (true_pos + false_pos) if true_pos + false_pos else 0.0
+    recall = true_pos / (true_pos + false_neg) if true_pos + false_neg else 0.0
+    print(f"examples        : {len(examples)} (threshold {args.threshold})")
+    print(f"precision       : {precision:.3f}  (routed locally and correct)")
+    print(f"recall          : {recall:.3f}  (commands caught without the LLM)")
+    print(f"latency mean    : {statistics.mean(timings) * 1e6:.1f} µs")
+    print(f"latency p99     : {timings[int(len(timings) * 0.99) - 1] * 1e6:.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,526 @@
+"""Local stand-ins for Zoho (OAuth + CRM), Twilio, OpenAI and Redis.
+
+Each HTTP fake is a threaded server with its own latency, jitter and error rate,
+serving canned data from benchmarks/corpus/crm_records.json. FakeRedis speaks
+enough RESP2 for the redis conversation-state store. Used by load_replay.py and
+the tests; can also be run on its own to poke at the bot by hand:
+
+    python benchmarks/fake_upstreams.py --zoho-latency 150 --openai-latency 900 --state-store redis
+"""
+import argparse
+import json
+import os
+import random
+import re
+import socketserver
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RECORDS_PATH = os.path.join(ROOT, "benchmarks", "corpus", "crm_records.json")
+CRITERIA_PATTERN = re.compile(r"\((\w+):(equals|contains|starts_with):([^()]*)\)")
+
+
+def load_records(path=RECORDS_PATH):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class FakeServer:
+    # routes: (method, path regex, handler(server, match, query, raw_body, headers) -> (status, payload)).
+    # A handler may return (status, bytes, content type) for a non-JSON body.
+    def __init__(self, name, routes, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, error_status=503):
+        self.name = name
+        self.routes = routes
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.calls = Counter()
+        # latency_for(raw_body) -> mean ms for this request, or None for latency_ms
+        self.latency_for = None
+        self._lock = threading.Lock()
+        self._httpd = None
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, payload, content_type="application/json"):
+                if isinstance(payload, bytes):
+                    body = payload
+                else:
+                    body = b"" if payload is None else json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _handle(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                parsed = urllib.parse.urlparse(self.path)
+                query = urllib.parse.parse_qs(parsed.query)
+                server.simulate_latency(raw)
+                for route_method, pattern, handler in server.routes:
+                    match = pattern.search(parsed.path)
+                    if route_method == method and match:
+                        with server._lock:
+                            server.calls[handler.__name__] += 1
+                        if random.random() < server.error_rate:
+                            return self._reply(server.error_status, {"code": "FAKE_ERROR", "message": "injected"})
+                        return self._reply(*handler(server, match, query, raw, self.headers))
+                self._reply(404, {"code": "INVALID_URL_PATTERN"})
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+            def do_PUT(self):
+                self._handle("PUT")
+
+        return Handler
+
+    def simulate_latency(self, raw=b""):
+        mean = self.latency_for(raw) if self.latency_for else None
+        mean = self.latency_ms if mean is None else mean
+        delay = random.gauss(mean, self.jitter_ms) if self.jitter_ms else mean
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def start(self, host="127.0.0.1", port=0):
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, name=f"fake-{self.name}", daemon=True).start()
+        return self
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+
+
+# ---------------- Zoho ----------------
+def _json_body(raw):
+    try:
+        return json.loads(raw or b"{}")
+    except ValueError:
+        return {}
+
+
+def _field_text(value):
+    if isinstance(value, dict):
+        return str(value.get("name") or "")
+    return str(value or "")
+
+
+def zoho_token(server, match, query, raw, headers):
+    return 200, {"access_token": f"fake-{random.getrandbits(32):x}", "expires_in": 3600, "token_type": "Bearer"}
+
+
+def zoho_search(server, match, query, raw, headers):
+    module = match.group("module")
+    criteria = urllib.parse.unquote(query.get("criteria", [""])[0])
+    conditions = CRITERIA_PATTERN.findall(criteria)
+    results = []
+    for record in server.records.get(module, []):
+        for field, op, value in conditions:
+            text, value = _field_text(record.get(field)).lower(), value.lower()
+            if (op == "equals" and text == value) or (op == "contains" and value in text) or \
+                    (op == "starts_with" and text.startswith(value)):
+                results.append(record)
+                break
+    return (200, {"data": results[:200]}) if results else (204, None)
+
+
+def zoho_list(server, match, query, raw, headers):
+    records = server.records.get(match.group("module"), [])
+    page = int(query.get("page", ["1"])[0])
+    per_page = int(query.get("per_page", ["200"])[0])
+    chunk = records[(page - 1) * per_page:page * per_page]
+    if not chunk:
+        return 204, None
+    return 200, {"data": chunk, "info": {"page": page, "per_page": per_page,
+                                          "more_records": page * per_page < len(records)}}
+
+
+def zoho_write(server, match, query, raw, headers):
+    data = _json_body(raw).get("data", [])
+    return 201, {"data": [{"code": "SUCCESS", "status": "success",
+                           "details": {"id": str(random.randint(10 ** 17, 10 ** 18))}} for _ in data]}
+
+
+def zoho_update(server, match, query, raw, headers):
+    data = _json_body(raw).get("data", [])
+    return 200, {"data": [{"code": "SUCCESS", "status": "success", "details": {"id": r.get("id")}} for r in data]}
+
+
+COQL_PATTERN = re.compile(
+    r"select (?P<fields>.+?) from (?P<module>\w+) where (?:Modified_Time >= '(?P<since>[^']*)'|id is not null)"
+    r"(?: order by Modified_Time asc)? limit (?P<offset>\d+), (?P<limit>\d+)$", re.IGNORECASE)
+
+
+def zoho_coql(server, match, query, raw, headers):
+    # Only the Modified_Time scans used by the pipeline summary; other queries find nothing.
+    m = COQL_PATTERN.match(_json_body(raw).get("select_query", "").strip())
+    if not m:
+        return 204, None
+    records = server.records.get(m.group("module"), [])
+    if m.group("since") is not None:
+        records = [r for r in records if (r.get("Modified_Time") or "") >= m.group("since")]
+    records = sorted(records, key=lambda r: r.get("Modified_Time") or "")
+    offset, limit = int(m.group("offset")), int(m.group("limit"))
+    fields = [f.strip() for f in m.group("fields").split(",")]
+    chunk = [dict({f: r.get(f) for f in fields}, id=r["id"]) for r in records[offset:offset + limit]]
+    if not chunk:
+        return 204, None
+    return 200, {"data": chunk, "info": {"count": len(chunk), "more_records": offset + limit < len(records)}}
+
+
+def zoho_deleted(server, match, query, raw, headers):
+    return 204, None
+
+
+DEAL_STAGES = [
+    "HFS Initial Email and Engagement", "HFS Filtration", "HFS Prelimary Data Collection",
+    "HFS Preliminary Assement", "HFS Application Pre-Approval", "HFS - Non-Binding Contract Issued",
+    "HFS - Contract terms approved", "HFS - Credit Risk Assessment", "HFS - Operational DD", "HFS KYC/KYB",
+    "HFS Security Mechanism - Initiated", "HFS Security Mechanism - Done", "HFS CFO Meeting - Done",
+    "HFS Final Review", "On Hold", "HFS - Contract won & Funds deployed", "Cold - Lead", "Closed Lost",
+    "Risk Assessment Failed", "Closed-Lost to Competition", "Current KPIs not fit",
+]
+DEAL_PIPELINES = ["Standard(Standard)", "HFS - CX pipeline", "HFS - Altalease", "Moneste"]
+
+
+def zoho_fields(server, match, query, raw, headers):
+    if query.get("module", [""])[0] != "Deals":
+        return 200, {"fields": []}
+
+    def values(names):
+        return [{"display_value": "-None-", "actual_value": "-None-"}] + \
+            [{"display_value": name, "actual_value": name} for name in names]
+
+    pipelines = values(DEAL_PIPELINES)
+    for pipeline in pipelines[1:]:
+        # Moneste runs without the HFS stages; the other pipelines allow every stage.
+        stages = [s for s in DEAL_STAGES if pipeline["display_value"] != "Moneste" or not s.startswith("HFS")]
+        pipeline["maps"] = [{"api_name": "Stage", "pick_list_values": values(stages)[1:]}]
+    return 200, {"fields": [
+        {"api_name": "Deal_Name", "data_type": "text"},
+        {"api_name": "Stage", "data_type": "picklist", "pick_list_values": values(DEAL_STAGES)},
+        {"api_name": "Pipeline", "data_type": "picklist", "pick_list_values": pipelines},
+    ]}
+
+
+def make_zoho(records, **kwargs):
+    server = FakeServer("zoho", [
+        ("POST", re.compile(r"/oauth/v2/token$"), zoho_token),
+        ("GET", re.compile(r"/crm/v2/(?P<module>\w+)/search$"), zoho_search),
+        ("POST", re.compile(r"/crm/v2/coql$"), zoho_coql),
+        ("GET", re.compile(r"/crm/v2/settings/fields$"), zoho_fields),
+        ("GET", re.compile(r"/crm/v2/\w+/deleted$"), zoho_deleted),
+        ("POST", re.compile(r"/crm/v2/(?:Deals/\w+/)?Notes$"), zoho_write),
+        ("PUT", re.compile(r"/crm/v2/Deals(?:/\w+)?$"), zoho_update),
+        ("POST", re.compile(r"/crm/v2/(?P<module>Contacts|Deals|Accounts)$"), zoho_write),
+        ("GET", re.compile(r"/crm/v2/(?P<module>Contacts|Deals|Accounts)$"), zoho_list),
+    ], **kwargs)
+    server.records = records
+    return server
+
+
+# ---------------- Twilio ----------------
+def twilio_message(server, match, query, raw, headers):
+    form = urllib.parse.parse_qs(raw.decode())
+    return 201, {"sid": f"SM{random.getrandbits(64):016x}", "status": "queued",
+                 "to": form.get("To", [""])[0], "body": form.get("Body", [""])[0][:40]}
+
+
+def make_twilio(**kwargs):
+    return FakeServer("twilio", [
+        ("POST", re.compile(r"/Accounts/\w+/Messages\.json$"), twilio_message),
+    ], error_status=429, **kwargs)
+
+
+# ---------------- OpenAI ----------------
+CANNED_REPLIES = [
+    "To add a contact, send: @bot add contact NAME company COMPANY.",
+    "You can move a deal with: @bot update deal DEAL stage STAGE.",
+    "Send @bot help to see everything I can do.",
+]
+
+
+def openai_stream(model, reply):
+    # Server-sent events, one word per chunk, the way the API streams a completion.
+    created = int(time.time())
+    events = []
+    for i, word in enumerate(reply.split(" ")):
+        delta = {"content": word if i == 0 else " " + word}
+        events.append({"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                       "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+    events.append({"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                   "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+    lines = [f"data: {json.dumps(event)}\n\n" for event in events] + ["data: [DONE]\n\n"]
+    return "".join(lines).encode()
+
+
+def openai_chat(server, match, query, raw, headers):
+    body = _json_body(raw)
+    if body.get("stream"):
+        return 200, openai_stream(body.get("model", "gpt-4"), random.choice(CANNED_REPLIES)), "text/event-stream"
+    return 200, {
+        "id": f"chatcmpl-{random.getrandbits(48):x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4"),
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": random.choice(CANNED_REPLIES)}}],
+        "usage": {"prompt_tokens": 50, "completion_tokens": 20, "total_tokens": 70},
+    }
+
+
+def make_openai(fast_models=(), fast_latency_ms=None, **kwargs):
+    server = FakeServer("openai", [
+        ("POST", re.compile(r"/chat/completions$"), openai_chat),
+    ], **kwargs)
+    if fast_models and fast_latency_ms is not None:
+        # Smaller models answer sooner, which is what hedging relies on.
+        server.latency_for = lambda raw: fast_latency_ms if _json_body(raw).get("model") in fast_models else None
+    return server
+
+
+# ---------------- Redis ----------------
+class FakeRedis:
+    # In-process RESP2 server: strings with expiry, DEL, EXPIRE/TTL and MULTI/EXEC, one keyspace per db.
+    # `clock` gives the time used for expiry, so tests can move it forward instead of sleeping.
+    def __init__(self, password=None, clock=time.monotonic):
+        self.password = password
+        self.clock = clock
+        self.dbs = {}  # db -> {key: (value, expires_at or None)}
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _live(self, db, key):
+        entry = self.dbs.get(db, {}).get(key)
+        if entry and entry[1] is not None and entry[1] <= self.clock():
+            del self.dbs[db][key]
+            return None
+        return entry
+
+    def run(self, session, args):
+        # One command -> reply value; an Exception instance is sent as an error reply.
+        name = args[0].upper() if args else ""
+        with self._lock:
+            self.calls[name] += 1
+        if name == "AUTH":
+            if self.password is None or args[-1] != self.password:
+                return RuntimeError("WRONGPASS invalid username-password pair")
+            session["authed"] = True
+            return "OK"
+        if self.password is not None and not session.get("authed"):
+            return RuntimeError("NOAUTH Authentication required.")
+        if name == "MULTI":
+            if session.get("queue") is not None:
+                return RuntimeError("ERR MULTI calls can not be nested")
+            session["queue"] = []
+            return "OK"
+        if name == "EXEC":
+            queue, session["queue"] = session.get("queue"), None
+            if queue is None:
+                return RuntimeError("ERR EXEC without MULTI")
+            with self._lock:
+                return [self._apply(session, queued) for queued in queue]
+        if name == "DISCARD":
+            session["queue"] = None
+            return "OK"
+        if session.get("queue") is not None:
+            session["queue"].append(args)
+            return "QUEUED"
+        with self._lock:
+            return self._apply(session, args)
+
+    def _apply(self, session, args):
+        name, args = args[0].upper(), args[1:]
+        db = session.setdefault("db", 0)
+        keys = self.dbs.setdefault(db, {})
+        try:
+            if name == "PING":
+                return args[0] if args else "PONG"
+            if name == "SELECT":
+                session["db"] = int(args[0])
+                return "OK"
+            if name == "GET":
+                entry = self._live(db, args[0])
+                return entry[0] if entry else None
+            if name == "SET":
+                key, value, options = args[0], args[1], [a.upper() for a in args[2:]]
+                expires_at = None
+                if "EX" in options:
+                    expires_at = self.clock() + int(args[2 + options.index("EX") + 1])
+                elif "PX" in options:
+                    expires_at = self.clock() + int(args[2 + options.index("PX") + 1]) / 1000
+                exists = self._live(db, key) is not None
+                if ("NX" in options and exists) or ("XX" in options and not exists):
+                    return None
+                keys[key] = (value, expires_at)
+                return "OK"
+            if name == "DEL":
+                return sum(1 for key in args if self._live(db, key) and keys.pop(key, None))
+            if name == "EXISTS":
+                return sum(1 for key in args if self._live(db, key))
+            if name == "EXPIRE":
+                entry = self._live(db, args[0])
+                if not entry:
+                    return 0
+                keys[args[0]] = (entry[0], self.clock() + int(args[1]))
+                return 1
+            if name == "TTL":
+                entry = self._live(db, args[0])
+                if not entry:
+                    return -2
+                return -1 if entry[1] is None else int(-(-(entry[1] - self.clock()) // 1))
+            if name == "FLUSHDB":
+                keys.clear()
+                return "OK"
+        except (IndexError, ValueError):
+            return RuntimeError(f"ERR syntax error in '{name.lower()}'")
+        return RuntimeError(f"ERR unknown command '{name.lower()}'")
+
+    @staticmethod
+    def _encode(value):
+        if isinstance(value, Exception):
+            return f"-{value}\r\n".encode()
+        if value is None:
+            return b"$-1\r\n"
+        if isinstance(value, int):
+            return f":{value}\r\n".encode()
+        if isinstance(value, list):
+            return f"*{len(value)}\r\n".encode() + b"".join(FakeRedis._encode(v) for v in value)
+        if value in ("OK", "QUEUED", "PONG"):
+            return f"+{value}\r\n".encode()
+        data = value.encode("utf-8")
+        return f"${len(data)}\r\n".encode() + data + b"\r\n"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def _read_command(self):
+                line = self.rfile.readline()
+                if not line:
+                    return None
+                if not line.startswith(b"*"):
+                    return line.decode().split()  # inline command, e.g. from telnet
+                args = []
+                for _ in range(int(line[1:])):
+                    length = int(self.rfile.readline()[1:])
+                    args.append(self.rfile.read(length + 2)[:-2].decode("utf-8"))
+                return args
+
+            def handle(self):
+                session = {}
+                while True:
+                    args = self._read_command()
+                    if args is None:
+                        return
+                    if args:
+                        self.wfile.write(server._encode(server.run(session, args)))
+
+        return Handler
+
+    def start(self, host="127.0.0.1", port=0):
+        self._server = socketserver.ThreadingTCPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="fake-redis", daemon=True).start()
+        return self
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        auth = f":{self.password}@" if self.password else ""
+        return f"redis://{auth}{host}:{port}/0"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+# ---------------- Wiring ----------------
+def add_arguments(parser):
+    for name, latency in (("zoho", 120), ("twilio", 80), ("openai", 900)):
+        parser.add_argument(f"--{name}-latency", type=float, default=latency, help="mean latency in ms")
+        parser.add_argument(f"--{name}-jitter", type=float, default=latency / 4, help="latency std dev in ms")
+        parser.add_argument(f"--{name}-error-rate", type=float, default=0.0, help="fraction of calls that fail")
+    parser.add_argument("--openai-fast-models", default="gpt-3.5-turbo", help="comma-separated models answered sooner")
+    parser.add_argument("--openai-fast-latency", type=float, default=300, help="mean latency in ms for those models")
+    parser.add_argument("--state-store", choices=("memory", "redis"), default="memory",
+                        help="conversation-state backend; redis runs against FakeRedis")
+
+
+def start_all(args, records=None):
+    records = records or load_records()
+    servers = {
+        "zoho": make_zoho(records, latency_ms=args.zoho_latency, jitter_ms=args.zoho_jitter,
+                          error_rate=args.zoho_error_rate),
+        "twilio": make_twilio(latency_ms=args.twilio_latency, jitter_ms=args.twilio_jitter,
+                              error_rate=args.twilio_error_rate),
+        "openai": make_openai(fast_models=args.openai_fast_models.split(","),
+                              fast_latency_ms=args.openai_fast_latency, latency_ms=args.openai_latency,
+                              jitter_ms=args.openai_jitter, error_rate=args.openai_error_rate),
+    }
+    if getattr(args, "state_store", "memory") == "redis":
+        servers["redis"] = FakeRedis()
+    for server in servers.values():
+        server.start()
+    return servers
+
+
+def app_environment(servers):
+    # The base-URL settings the bot reads at import time.
+    environment = {
+        "ZOHO_ACCOUNTS_URL": servers["zoho"].url,
+        "ZOHO_API_BASE": servers["zoho"].url + "/crm/v2",
+        "TWILIO_API_BASE": servers["twilio"].url + "/2010-04-01",
+        "OPENAI_BASE_URL": servers["openai"].url + "/v1",
+        "ZOHO_CLIENT_ID": "bench", "ZOHO_CLIENT_SECRET": "bench", "ZOHO_REFRESH_TOKEN": "bench",
+        "TWILIO_ACCOUNT_SID": "ACbench", "TWILIO_AUTH_TOKEN": "bench", "TWILIO_NUMBER": "whatsapp:+10000000000",
+        "OPENAI_API_KEY": "bench",
+    }
+    if "redis" in servers:
+        environment.update(STATE_STORE="redis", STATE_REDIS_URL=servers["redis"].url)
+    return environment
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    args = parser.parse_args()
+    servers = start_all(args)
+    for key, value in app_environment(servers).items():
+        print(f"export {key}={value!r}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""End-to-end load test of the /whatsapp webhook against fake upstreams.
+
+    python benchmarks/load_replay.py [--requests N] [--concurrency C] [--baseline NAME] [--save-baseline NAME]
+
+Starts the fakes from fake_upstreams.py, points the bot at them through its
+base-URL settings, serves the app on a local port and replays the weighted
+conversations in benchmarks/corpus/load_mix.jsonl as Twilio form posts, one
+sender per virtual user. Reports requests/second and p50/p95/p99 latency per
+command. --save-baseline stores the results under benchmarks/baselines/;
+--baseline compares against a stored run and exits non-zero on a regression.
+Outbound rate limits are lifted unless OUTBOUND_* is set in the environment.
+--duplicate-rate re-posts that share of messages with the same MessageSid while
+the first delivery is in flight, the way Twilio retries a slow webhook.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import fake_upstreams  # noqa: E402
+
+MIX_PATH = os.path.join(ROOT, "benchmarks", "corpus", "load_mix.jsonl")
+BASELINE_DIR = os.path.join(ROOT, "benchmarks", "baselines")
+
+
+def load_mix(path=MIX_PATH):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def start_app(args, servers):
+    os.environ.update(fake_upstreams.app_environment(servers))
+    os.environ["DISPATCH_MODE"] = args.dispatch
+    os.environ.setdefault("LOG_LEVEL", args.log_level)
+    if not args.llm_cache:
+        os.environ["LLM_CACHE_TTL"] = "0"
+    # Twilio's send-rate limits would otherwise cap throughput at ~20 req/s; set these to measure them.
+    os.environ.setdefault("OUTBOUND_GLOBAL_RATE", "10000")
+    os.environ.setdefault("OUTBOUND_GLOBAL_BURST", "10000")
+    os.environ.setdefault("OUTBOUND_RECIPIENT_RATE", "1000")
+    os.environ.setdefault("OUTBOUND_RECIPIENT_BURST", "1000")
+
+    from werkzeug.serving import make_server
+    from zoho_whatsapp_bot import create_app
+    app = create_app()
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    httpd = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=httpd.serve_forever, name="bench-app", daemon=True).start()
+    return httpd, f"http://127.0.0.1:{httpd.server_port}/whatsapp"
+
+
+def run_load(url, mix, total, concurrency, seed, duplicate_rate=0.0):
+    samples = defaultdict(list)  # command -> latencies in seconds
+    errors = defaultdict(int)
+    remaining = [total]
+    lock = threading.Lock()
+    retries = []
+    weights = [c.get("weight", 1) for c in mix]
+
+    def post(session, command, data):
+        start = time.perf_counter()
+        try:
+            ok = session.post(url, data=data, timeout=60).status_code == 200
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            samples[command].append(elapsed)
+            if not ok:
+                errors[command] += 1
+
+    def user(index):
+        rng = random.Random(seed + index)
+        sender = f"whatsapp:+97150{index:07d}"
+        session = requests.Session()
+        while True:
+            conversation = rng.choices(mix, weights)[0]
+            # A conversation runs to the end so multi-step flows stay consistent per sender.
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= len(conversation["steps"])
+            for command, text in conversation["steps"]:
+                data = {"Body": text, "From": sender, "MessageSid": f"SM{rng.getrandbits(128):032x}"}
+                if rng.random() < duplicate_rate:
+                    retry = threading.Timer(0.05, post, args=(requests.Session(), "duplicate", data))
+                    retry.start()
+                    with lock:
+                        retries.append(retry)
+                post(session, command, data)
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for retry in retries:
+        retry.join()
+    return samples, errors, time.perf_counter() - start
+
+
+def summarise(samples, errors, elapsed):
+    def row(latencies, error_count):
+        return {
+            "count": len(latencies),
+            "errors": error_count,
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        }
+
+    everything = [value for latencies in samples.values() for value in latencies]
+    return {
+        "requests": len(everything),
+        "elapsed_s": round(elapsed, 2),
+        "rps": round(len(everything) / elapsed, 1) if elapsed else 0.0,
+        "overall": row(everything, sum(errors.values())),
+        "commands": {command: row(latencies, errors[command]) for command, latencies in sorted(samples.items())},
+    }
+
+
+def print_report(result, upstream_calls):
+    print(f"requests        : {result['requests']} in {result['elapsed_s']} s")
+    print(f"throughput      : {result['rps']} req/s")
+    print(f"{'command':<16} {'count':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for command, row in list(result["commands"].items()) + [("ALL", result["overall"])]:
+        print(f"{command:<16} {row['count']:>6} {row['errors']:>6} "
+              f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8}")
+    print("upstream calls  :")
+    for name, calls in upstream_calls.items():
+        print(f"  {name:<14} {sum(calls.values()):>6}  {dict(calls)}")
+
+
+def compare(result, baseline, tolerance, min_samples=0):
+    # A regression is a throughput drop or a p95 rise beyond the tolerance. Commands with fewer than
+    # min_samples requests are shown but not judged: their p95 is one or two outliers. They still count
+    # towards the overall p95.
+    regressions = []
+    base_rps = baseline["result"]["rps"]
+    if base_rps and result["rps"] < base_rps * (1 - tolerance):
+        regressions.append(f"throughput {result['rps']} req/s vs {base_rps} req/s")
+    print(f"\nvs baseline ({baseline['name']}, {baseline['recorded_at']}):")
+    rows = [("overall", result["overall"], baseline["result"]["overall"])]
+    rows += [(command, row, baseline["result"]["commands"].get(command)) for command, row in result["commands"].items()]
+    for command, row, base in rows:
+        if not base:
+            continue
+        delta = (row["p95_ms"] - base["p95_ms"]) / base["p95_ms"] if base["p95_ms"] else 0.0
+        judged = min(row["count"], base["count"]) >= min_samples
+        note = "" if judged else "  few samples, not judged"
+        print(f"  {command:<16} p95 {row['p95_ms']:>8} ms  (baseline {base['p95_ms']} ms, {delta:+.0%}){note}")
+        if judged and delta > tolerance:
+            regressions.append(f"{command} p95 {row['p95_ms']} ms vs {base['p95_ms']} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=40, help="requests sent before measuring")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--dispatch", choices=("sync", "async"), default="sync",
+                        help="sync measures full handling; async measures only the webhook ack")
+    parser.add_argument("--duplicate-rate", type=float, default=0.0,
+                        help="fraction of messages re-delivered with the same MessageSid")
+    parser.add_argument("--llm-cache", action="store_true", help="keep the LLM response cache enabled")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--baseline", help="compare against benchmarks/baselines/NAME.json")
+    parser.add_argument("--save-baseline", help="store this run as benchmarks/baselines/NAME.json")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression, as a fraction")
+    parser.add_argument("--min-samples", type=int, default=60,
+                        help="requests a command needs before its p95 is checked against the baseline")
+    fake_upstreams.add_arguments(parser)
+    args = parser.parse_args()
+
+    servers = fake_upstreams.start_all(args)
+    httpd, url = start_app(args, servers)
+    mix = load_mix()
+
+    if args.warmup:
+        run_load(url, mix, args.warmup, min(args.concurrency, 4), args.seed + 1000)
+    for server in servers.values():
+        server.calls.clear()
+
+    samples, errors, elapsed = run_load(url, mix, args.requests, args.concurrency, args.seed, args.duplicate_rate)
+    result = summarise(samples, errors, elapsed)
+    print_report(result, {name: server.calls for name, server in servers.items()})
+    httpd.shutdown()
+
+    settings = {key: value for key, value in vars(args).items() if key not in ("baseline", "save_baseline")}
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save_baseline}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"name": args.save_baseline, "recorded_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                       "settings": settings, "result": result}, f, indent=2)
+            f.write("\n")
+        print(f"\nbaseline saved  : {path}")
+
+    if args.baseline:
+        with open(os.path.join(BASELINE_DIR, f"{args.baseline}.json"), encoding="utf-8") as f:
+            baseline = json.load(f)
+        changed = {k: v for k, v in settings.items()
+                   if baseline["settings"].get(k) != v and k not in ("tolerance", "min_samples")}
+        if changed:
+            print(f"\n⚠️ settings differ from the baseline: {changed}")
+        regressions = compare(result, baseline, args.tolerance, args.min_samples)
+        if regressions:
+            print("\nREGRESSIONS:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("\nno regressions beyond tolerance")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+import contextvars
+import csv
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+ZOHO_BATCH_SIZE = 100  # Max records per Zoho insert
+COQL_IN_LIMIT = 50     # Max values in a COQL "in (...)" clause
+COQL_PAGE_SIZE = 200   # Max rows per COQL page
+
+HEADER_ALIASES = {
+    "name": "full_name", "full name": "full_name", "full_name": "full_name", "contact": "full_name",
+    "first name": "first_name", "first_name": "first_name",
+    "last name": "last_name", "last_name": "last_name",
+    "company": "company", "account": "company", "account name": "company", "account_name": "company",
+    "organisation": "company", "organization": "company",
+    "email": "email", "e-mail": "email",
+    "phone": "phone", "mobile": "phone", "telephone": "phone",
+}
+POSITIONAL_FIELDS = ["full_name", "company", "email", "phone"]
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+# ---------------- Row Parsing ----------------
+def parse_text_lines(lines):
+    # "Name, Company[, Email, Phone]" or "Name company Company" per line.
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if "," in line:
+            values = next(csv.reader([line]))
+            yield line_no, dict(zip(POSITIONAL_FIELDS, (v.strip() for v in values)))
+        elif re.search(r"\bcompany\b", line, re.IGNORECASE):
+            name, company = re.split(r"\bcompany\b", line, maxsplit=1, flags=re.IGNORECASE)
+            yield line_no, {"full_name": name.strip(), "company": company.strip()}
+        else:
+            yield line_no, {"full_name": line}
+
+
+def parse_csv_lines(lines):
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    mapped = [HEADER_ALIASES.get(h.strip().lower()) for h in header]
+    if not any(mapped):
+        # No recognisable header: the first line is data in positional order.
+        mapped = POSITIONAL_FIELDS
+        yield 1, dict(zip(mapped, (v.strip() for v in header)))
+    for line_no, values in enumerate(reader, 2):
+        if not any(v.strip() for v in values):
+            continue
+        yield line_no, {field: v.strip() for field, v in zip(mapped, values) if field}
+
+
+def parse_vcard_lines(lines):
+    row = None
+    line_no = 0
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        key, _, value = line.partition(":")
+        key = key.split(";", 1)[0].upper()
+        if key == "BEGIN" and value.upper() == "VCARD":
+            row = {}
+        elif key == "END" and row is not None:
+            yield line_no, row
+            row = None
+        elif row is None:
+            continue
+        elif key == "FN":
+            row["full_name"] = value.strip()
+        elif key == "N" and "full_name" not in row:
+            parts = value.split(";")
+            row["last_name"] = parts[0].strip()
+            row["first_name"] = parts[1].strip() if len(parts) > 1 else ""
+        elif key == "ORG":
+            row["company"] = value.split(";", 1)[0].strip()
+        elif key == "EMAIL" and "email" not in row:
+            row["email"] = value.strip()
+        elif key == "TEL" and "phone" not in row:
+            row["phone"] = value.strip()
+
+
+def parse_rows(lines, content_type=""):
+    content_type = (content_type or "").lower()
+    if "vcard" in content_type or "directory" in content_type:
+        return parse_vcard_lines(lines)
+    if "csv" in content_type or "comma-separated" in content_type:
+        return parse_csv_lines(lines)
+    return parse_text_lines(lines)
+
+
+def to_zoho_contact(row):
+    # Returns (record, None) or (None, error message).
+    first_name = row.get("first_name", "")
+    last_name = row.get("last_name", "")
+    full_name = row.get("full_name", "")
+    if full_name and not last_name:
+        first_name = " ".join(full_name.split()[:-1])
+        last_name = full_name.split()[-1]
+    if not last_name:
+        return None, "name is missing"
+
+    company = row.get("company", "")
+    if not company:
+        return None, "company is missing"
+
+    email = row.get("email", "")
+    if email and not EMAIL_PATTERN.match(email):
+        return None, f"invalid email {email}"
+
+    record = {"First_Name": first_name, "Last_Name": last_name, "Account_Name": company}
+    if email:
+        record["Email"] = email
+    if row.get("phone"):
+        record["Phone"] = row["phone"]
+    return record, None
+
+
+def display_name(record):
+    return " ".join(p for p in (record.get("First_Name"), record.get("Last_Name")) if p)
+
+
+# ---------------- Importer ----------------
+class ImportSummary:
+    def __init__(self):
+        self.added = []
+        self.skipped = []  # (line, name, reason)
+        self.failed = []   # (line, name, reason)
+        self.not_read = 0  # rows past the importer's max_rows
+        self.max_rows = None
+        self._lock = threading.Lock()
+
+    def add(self, bucket, item):
+        with self._lock:
+            getattr(self, bucket).append(item)
+
+    @property
+    def total(self):
+        return len(self.added) + len(self.skipped) + len(self.failed)
+
+
+class ContactImporter:
+    def __init__(self, zoho, concurrency=3, max_rows=2000, batch_size=ZOHO_BATCH_SIZE):
+        self.zoho = zoho
+        self.concurrency = concurrency
+        self.max_rows = max_rows
+        self.batch_size = batch_size
+
+    @staticmethod
+    def _coql_quote(value):
+        return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+    def _lookup(self, field, values, columns):
+        # One COQL query per 50 values instead of one search per row, paged: 50 last names can match far
+        # more than one page of contacts.
+        records = []
+        values = sorted(set(values))
+        for start in range(0, len(values), COQL_IN_LIMIT):
+            chunk = values[start:start + COQL_IN_LIMIT]
+            offset = 0
+            while True:
+                query = (f"select {columns} from Contacts where {field} in "
+                         f"({', '.join(self._coql_quote(v) for v in chunk)}) limit {offset}, {COQL_PAGE_SIZE}")
+                response = self.zoho.post("/coql", json={"select_query": query}, retry=True)
+                if response.status_code == 204:
+                    break
+                response.raise_for_status()
+                data = response.json()
+                page = data.get("data", [])
+                records.extend(page)
+                if len(page) < COQL_PAGE_SIZE or not (data.get("info") or {}).get("more_records", True):
+                    break
+                offset += len(page)
+        return records
+
+    def _import_batch(self, batch, summary):
+        # batch: list of (line_no, record)
+        try:
+            emails = {
+                (r.get("Email") or "").lower()
+                for r in self._lookup("Email", [r["Email"] for _, r in batch if r.get("Email")], "Email")
+            }
+            names = {
+                display_name(r).lower()
+                for r in self._lookup("Last_Name", [r["Last_Name"] for _, r in batch if not r.get("Email")],
+                                      "First_Name, Last_Name")
+            }
+        except Exception as e:
+            for line_no, record in batch:
+                summary.add("failed", (line_no, display_name(record), f"duplicate check failed: {str(e)}"))
+            return
+
+        to_insert = []
+        for line_no, record in batch:
+            if record.get("Email") and record["Email"].lower() in emails:
+                summary.add("skipped", (line_no, display_name(record), "email already in CRM"))
+            elif not record.get("Email") and display_name(record).lower() in names:
+                summary.add("skipped", (line_no, display_name(record), "already in CRM"))
+            else:
+                to_insert.append((line_no, record))
+        if not to_insert:
+            return
+
+        try:
+            response = self.zoho.post("/Contacts", json={"data": [r for _, r in to_insert]})
+            results = response.json().get("data", [])
+        except Exception as e:
+            for line_no, record in to_insert:
+                summary.add("failed", (line_no, display_name(record), str(e)))
+            return
+
+        # Zoho answers per record, in request order.
+        for (line_no, record), result in zip(to_insert, results):
+            if result.get("code") == "SUCCESS":
+                summary.add("added", (line_no, display_name(record)))
+            else:
+                summary.add("failed", (line_no, display_name(record), result.get("message", result.get("code"))))
+        for line_no, record in to_insert[len(results):]:
+            summary.add("failed", (line_no, display_name(record), f"no result from Zoho ({response.status_code})"))
+
+    def run(self, rows):
+        # rows: iterable of (line_no, row dict), consumed lazily and sent in batches as they fill up.
+        summary = ImportSummary()
+        summary.max_rows = self.max_rows
+        seen = set()
+        rows = iter(rows)
+
+        def batches():
+            batch = []
+            for line_no, row in islice(rows, self.max_rows):
+                record, error = to_zoho_contact(row)
+                if error:
+                    summary.add("failed", (line_no, row.get("full_name") or row.get("last_name") or "?", error))
+                    continue
+                key = (record.get("Email") or display_name(record)).lower()
+                if key in seen:
+                    summary.add("skipped", (line_no, display_name(record), "duplicate in import"))
+                    continue
+                seen.add(key)
+                batch.append((line_no, record))
+                if len(batch) == self.batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="contact-import") as pool:
+            # Each batch runs in a copy of our context, so it keeps the tenant and command of the request.
+            futures = [pool.submit(contextvars.copy_context().run, self._import_batch, batch, summary)
+                       for batch in batches()]
+            for future in futures:
+                future.result()
+        # Counted, not imported, so the reply can say how much was left out.
+        summary.not_read = sum(1 for _ in rows)
+        return summary
+
+
+def format_summary(summary, limit=10):
+    lines = [f"📥 *Contact import finished* ({summary.total} rows)",
+             f"✅ Added: {len(summary.added)}",
+             f"⏭️ Skipped: {len(summary.skipped)}",
+             f"❌ Failed: {len(summary.failed)}"]
+    if summary.not_read:
+        lines.append(f"⚠️ Not imported: {summary.not_read} rows past the {summary.max_rows}-row limit")
+    for title, items in (("Skipped", summary.skipped), ("Failed", summary.failed)):
+        if not items:
+            continue
+        lines.append(f"\n*{title}:*")
+        for line_no, name, reason in sorted(items)[:limit]:
+            lines.append(f"• line {line_no} {name}: {reason}")
+        if len(items) > limit:
+            lines.append(f"• …and {len(items) - limit} more")
+    return "\n".join(lines)
@@ -0,0 +1,102 @@
+import re
+from dataclasses import dataclass, field
+
+BOT_PREFIX = "@bot"
+SLOT_PATTERN = re.compile(r"\[([^\]]+)\]")
+
+
+@dataclass(frozen=True)
+class Command:
+    name: str
+    args: dict = field(default_factory=dict)
+    text: str = ""
+    media: tuple = ()  # (url, content_type) pairs attached to the message
+
+
+def slot_name(label):
+    # "[Full Name]" -> "full_name"
+    return re.sub(r"\W+", "_", label.strip().lower()).strip("_")
+
+
+# ---------------- Grammar ----------------
+class CommandGrammar:
+    # Compiled from a BOT_COMMANDS template such as "@bot note [Deal Name] note_content [Your Note]".
+    def __init__(self, template, name=None):
+        self.template = template
+        tokens = SLOT_PATTERN.split(template.strip())
+        # Even tokens are literal text, odd tokens are slot labels.
+        literals = tokens[0::2]
+        self.slots = [slot_name(label) for label in tokens[1::2]]
+
+        words = literals[0].split()
+        self.requires_prefix = bool(words) and words[0].lower() == BOT_PREFIX
+        if self.requires_prefix:
+            words = words[1:]
+        # Leading literal words pick the dispatch bucket; the regex does the rest.
+        self.leading = tuple(w.lower() for w in words)
+        self.name = name or "_".join(self.leading)
+
+        # Only the leading command words ignore case; later keywords must be written as in the template,
+        # so "deal name Acme Account Expansion account Acme Holdings" keeps "Account" in the deal name.
+        parts = [r"(?i:\b" + re.escape(w) + r"\b)" for w in words]
+        for i, slot in enumerate(self.slots):
+            later = literals[i + 1].split()
+            # A slot with a keyword after it can't be empty; only the last one may be left out.
+            parts.append(f"(?P<{slot}>\\S.*?)" if later else f"(?P<{slot}>.*?)")
+            parts.extend(r"\b" + re.escape(w) + r"\b" for w in later)
+        # "@bot help me": after @bot, words past a command without slots are ignored.
+        self.open_ended = self.requires_prefix and not self.slots
+        if self.open_ended:
+            parts.append(r"(?P<_rest>\b.*?)")
+        self.regex = re.compile(r"^\s*" + r"\s*".join(parts) + r"\s*$", re.DOTALL)
+
+    def match(self, text, exact=False):
+        # exact: no trailing words after an open-ended command, as when text is only being classified.
+        m = self.regex.match(text)
+        if not m or (exact and self.open_ended and m.group("_rest")):
+            return None
+        return Command(self.name, {slot: (m.group(slot) or "").strip() for slot in self.slots}, text)
+
+
+# ---------------- Router ----------------
+class CommandRouter:
+    def __init__(self, commands):
+        # Buckets keyed by first literal word; inside a bucket the most specific grammar is tried first.
+        self._buckets = {True: {}, False: {}}
+        self.grammars = []
+        for spec in commands:
+            grammar = CommandGrammar(spec["command"], spec.get("name"))
+            self.grammars.append(grammar)
+            first = grammar.leading[0] if grammar.leading else ""
+            self._buckets[grammar.requires_prefix].setdefault(first, []).append(grammar)
+        for buckets in self._buckets.values():
+            for bucket in buckets.values():
+                bucket.sort(key=lambda g: len(g.leading), reverse=True)
+
+    def parse(self, message, exact=False):
+        text = (message or "").strip()
+        if not text:
+            return None
+
+        has_prefix = text[:len(BOT_PREFIX)].lower() == BOT_PREFIX
+        if has_prefix:
+            text = text[len(BOT_PREFIX):]
+            first = text.split(None, 1)[0].lower() if text.strip() else ""
+            # "@bot deal name ..." is accepted for follow-ups too
+            candidates = self._buckets[True].get(first, []) + self._buckets[False].get(first, [])
+        else:
+            first = text.split(None, 1)[0].lower()
+            candidates = self._buckets[False].get(first, [])
+
+        for grammar in candidates:
+            command = grammar.match(text, exact=exact)
+            if command:
+                return Command(command.name, command.args, message)
+        return None
+
+    def render(self, command):
+        # The @bot text that parses back to `command`, e.g. to show it in a "did you mean" question.
+        for grammar in self.grammars:
+            if grammar.name == command.name:
+                return SLOT_PATTERN.sub(lambda m: command.args.get(slot_name(m.group(1)), ""), grammar.template)
+        return None
@@ -0,0 +1,111 @@
+import csv
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from crm_mirror import fetch_page
+
+log = logging.getLogger(__name__)
+
+EXPORT_MODULES = {"deals": "Deals", "contacts": "Contacts", "accounts": "Accounts"}
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def parse_modified_since(value):
+    # "2026-01-31" or a full ISO 8601 timestamp -> what Zoho expects in If-Modified-Since.
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.isoformat(timespec="seconds")
+
+
+def parse_fields(value):
+    return [f.strip() for f in (value or "").split(",") if f.strip()]
+
+
+# ---------------- Paging ----------------
+def iter_pages(zoho, module, fields=None, modified_since=None):
+    # Yields one page of records at a time; the next page is already being fetched while the
+    # caller writes out the current one, so Zoho latency and client writes overlap.
+    def fetch(page, page_token):
+        return fetch_page(zoho, module, page=page, page_token=page_token,
+                          modified_since=modified_since, fields=fields)
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"export-{module.lower()}") as pool:
+        page = 1
+        future = pool.submit(fetch, page, None)
+        while future is not None:
+            records, info = future.result()
+            future = None
+            if info.get("more_records"):
+                page += 1
+                future = pool.submit(fetch, page, info.get("next_page_token"))
+            yield records
+
+
+# ---------------- Formats ----------------
+def csv_value(value):
+    # Lookups come back as {"name": ..., "id": ...}; keep the name so the CSV stays flat.
+    if isinstance(value, dict):
+        return value.get("name") or value.get("id") or json.dumps(value)
+    if isinstance(value, list):
+        return json.dumps(value)
+    return "" if value is None else value
+
+
+def ndjson_chunks(pages):
+    for records in pages:
+        if records:
+            yield "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+
+
+def csv_chunks(pages, fields=None):
+    # Without an explicit field list the columns come from the first page.
+    buffer = io.StringIO()
+    writer = None
+    for records in pages:
+        if not records:
+            continue
+        if writer is None:
+            columns = ["id"] + [f for f in fields if f != "id"] if fields else \
+                ["id"] + sorted({key for record in records for key in record} - {"id"})
+            writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+            writer.writeheader()
+        for record in records:
+            writer.writerow({key: csv_value(value) for key, value in record.items()})
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if writer is None and fields:
+        yield ",".join(["id"] + [f for f in fields if f != "id"]) + "\r\n"
+
+
+def export_chunks(zoho, module, fmt="ndjson", fields=None, modified_since=None):
+    pages = iter_pages(zoho, module, fields=fields, modified_since=modified_since)
+    # The first page is fetched before anything is sent, so an upstream error can still become a 502.
+    first = next(pages)
+
+    def all_pages():
+        yield first
+        yield from pages
+
+    chunks = csv_chunks(all_pages(), fields) if fmt == "csv" else ndjson_chunks(all_pages())
+
+    def stream():
+        count = 0
+        try:
+            for chunk in chunks:
+                count += 1
+                yield chunk
+        except Exception:
+            # Headers are gone; aborting the chunked response tells the client the export is incomplete.
+            log.exception("export failed mid-stream", extra={"module": module, "chunks": count})
+            raise
+        finally:
+            pages.close()
+
+    return stream()
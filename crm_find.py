@@ -0,0 +1,84 @@
+import contextvars
+import difflib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from crm_mirror import record_name
+
+log = logging.getLogger(__name__)
+
+FIND_MODULES = ("Contacts", "Deals", "Accounts")
+
+
+def rank_key(query, module, record):
+    # Exact name, then prefix, then word-prefix, then substring; similarity breaks ties.
+    name = record_name(module, record).lower()
+    query = query.lower()
+    if name == query:
+        tier = 0
+    elif name.startswith(query):
+        tier = 1
+    elif any(word.startswith(query) for word in name.split()):
+        tier = 2
+    elif query in name:
+        tier = 3
+    else:
+        tier = 4
+    similarity = difflib.SequenceMatcher(None, query, name).ratio()
+    return tier, -similarity, FIND_MODULES.index(module)
+
+
+def rank_results(query, results, limit=5):
+    # results: iterable of (module, record); duplicates from the exact and contains queries collapse.
+    seen = set()
+    unique = []
+    for module, record in results:
+        key = (module, str(record.get("id")))
+        if record.get("id") is None or key in seen:
+            continue
+        seen.add(key)
+        unique.append((module, record))
+    unique.sort(key=lambda item: rank_key(query, *item))
+    return unique[:limit]
+
+
+# ---------------- Parallel Search ----------------
+class UnifiedSearch:
+    # Every (module, query) pair goes out at once; whatever has answered by the deadline is ranked.
+    def __init__(self, queries_for, workers=6, deadline=4.0):
+        # queries_for(module, text) -> list of zero-arg callables returning a list of records
+        self.queries_for = queries_for
+        self.deadline = deadline
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="find")
+
+    def find(self, text, modules=FIND_MODULES, limit=5):
+        # Returns (ranked [(module, record)], modules that timed out or failed entirely).
+        started = time.monotonic()
+        futures = {}
+        for module in modules:
+            for query in self.queries_for(module, text):
+                # Run in a copy of our context so spans in the pool keep the command tag.
+                futures[self.pool.submit(contextvars.copy_context().run, query)] = module
+
+        done, pending = wait(futures, timeout=self.deadline)
+        for future in pending:
+            future.cancel()
+
+        results = []
+        answered = set()
+        for future in done:
+            module = futures[future]
+            try:
+                records = future.result()
+            except Exception as e:
+                log.warning("find query failed", extra={"module": module, "error": str(e)})
+                continue
+            answered.add(module)
+            results.extend((module, record) for record in records or [])
+
+        missing = [module for module in modules if module not in answered]
+        if pending:
+            log.warning("find deadline hit", extra={"pending": len(pending), "missing": missing,
+                                                    "elapsed": round(time.monotonic() - started, 3)})
+        return rank_results(text, results, limit), missing
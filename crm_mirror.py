@@ -0,0 +1,313 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# Field used as the display/search name for each mirrored module, plus extra searchable fields.
+MIRROR_MODULES = {
+    "Contacts": ("Full_Name", ["First_Name", "Last_Name", "Email"]),
+    "Deals": ("Deal_Name", []),
+    "Accounts": ("Account_Name", ["Website"]),
+}
+
+PAGE_SIZE = 200  # Max allowed by Zoho
+
+
+def record_name(module, record):
+    name_field, _ = MIRROR_MODULES[module]
+    name = record.get(name_field)
+    if module == "Contacts" and not name:
+        name = " ".join(p for p in (record.get("First_Name"), record.get("Last_Name")) if p)
+    return name or ""
+
+
+def record_search_text(module, record):
+    _, extra_fields = MIRROR_MODULES[module]
+    parts = [record_name(module, record)]
+    for field in extra_fields:
+        value = record.get(field)
+        if isinstance(value, str) and value:
+            parts.append(value)
+    return " ".join(parts)
+
+
+# ---------------- Zoho Paging ----------------
+def fetch_page(zoho, module, page=1, page_token=None, modified_since=None, per_page=PAGE_SIZE, fields=None):
+    params = {"per_page": per_page}
+    if fields:
+        params["fields"] = ",".join(fields)
+    if page_token:
+        params["page_token"] = page_token
+    else:
+        params["page"] = page
+    headers = {"If-Modified-Since": modified_since} if modified_since else {}
+    response = zoho.get(f"/{module}", params=params, headers=headers)
+    # 204 = empty module, 304 = nothing modified since the given time.
+    if response.status_code in (204, 304):
+        return [], {"more_records": False}
+    response.raise_for_status()
+    data = response.json()
+    return data.get("data", []), data.get("info", {})
+
+
+def iter_records(zoho, module, modified_since=None, path=None):
+    # Follows page numbers, switching to page_token when Zoho hands one out (needed past 2000 records).
+    page = 1
+    page_token = None
+    while True:
+        records, info = fetch_page(zoho, path or module, page=page, page_token=page_token,
+                                   modified_since=modified_since)
+        yield from records
+        if not info.get("more_records"):
+            return
+        page_token = info.get("next_page_token")
+        page += 1
+
+
+# ---------------- Mirror ----------------
+class CRMMirror:
+    def __init__(self, path, zoho, sync_interval=300, max_staleness=900):
+        self.path = path
+        self.zoho = zoho
+        self.sync_interval = sync_interval
+        self.max_staleness = max_staleness
+        self._local = threading.local()
+        self._sync_thread = None
+        self._sync_lock = threading.Lock()
+        self._init_schema()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS records (
+                module TEXT NOT NULL,
+                id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                name_lower TEXT NOT NULL,
+                data TEXT NOT NULL,
+                modified_time TEXT,
+                PRIMARY KEY (module, id)
+            );
+            CREATE INDEX IF NOT EXISTS records_name ON records (module, name_lower);
+            CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5(
+                module UNINDEXED, id UNINDEXED, text, tokenize = 'trigram'
+            );
+            CREATE TABLE IF NOT EXISTS sync_state (
+                module TEXT PRIMARY KEY,
+                last_sync REAL NOT NULL DEFAULT 0,
+                max_modified TEXT,
+                lease_until REAL NOT NULL DEFAULT 0
+            );
+            """
+        )
+
+    # ---- writes ----
+    def _upsert(self, conn, module, record):
+        record_id = str(record["id"])
+        name = record_name(module, record)
+        conn.execute(
+            "INSERT OR REPLACE INTO records (module, id, name, name_lower, data, modified_time) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (module, record_id, name, name.lower(), json.dumps(record), record.get("Modified_Time")),
+        )
+        conn.execute("DELETE FROM records_fts WHERE module = ? AND id = ?", (module, record_id))
+        conn.execute(
+            "INSERT INTO records_fts (module, id, text) VALUES (?, ?, ?)",
+            (module, record_id, record_search_text(module, record)),
+        )
+
+    def _delete(self, conn, module, record_id):
+        conn.execute("DELETE FROM records WHERE module = ? AND id = ?", (module, str(record_id)))
+        conn.execute("DELETE FROM records_fts WHERE module = ? AND id = ?", (module, str(record_id)))
+
+    def upsert_records(self, module, records):
+        # Write-through from live API results so the mirror keeps up between syncs.
+        records = [r for r in records if r.get("id")]
+        if not records:
+            return
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN")
+            for record in records:
+                self._upsert(conn, module, record)
+
+    def delete_record(self, module, record_id):
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN")
+            self._delete(conn, module, record_id)
+
+    # ---- sync ----
+    def _claim_sync(self, module, force):
+        # Lease row so only one gunicorn worker syncs a module per interval.
+        conn = self._conn()
+        now = time.time()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT last_sync, max_modified, lease_until FROM sync_state WHERE module = ?", (module,)
+            ).fetchone()
+            last_sync, max_modified, lease_until = row or (0, None, 0)
+            if lease_until > now or (not force and now - last_sync < self.sync_interval):
+                return None
+            conn.execute(
+                "INSERT INTO sync_state (module, last_sync, max_modified, lease_until) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(module) DO UPDATE SET lease_until = excluded.lease_until",
+                (module, last_sync, max_modified, now + 600),
+            )
+        return max_modified or ""
+
+    def _release_sync(self, module, max_modified, synced):
+        conn = self._conn()
+        with conn:
+            if synced:
+                conn.execute(
+                    "UPDATE sync_state SET last_sync = ?, max_modified = ?, lease_until = 0 WHERE module = ?",
+                    (time.time(), max_modified, module),
+                )
+            else:
+                conn.execute("UPDATE sync_state SET lease_until = 0 WHERE module = ?", (module,))
+
+    def sync_module(self, module, full=False, force=False):
+        claimed = self._claim_sync(module, force or full)
+        if claimed is None:
+            return 0
+        modified_since = None if full else (claimed or None)
+        max_modified = claimed
+        count = 0
+        seen_ids = set()
+        try:
+            batch = []
+            for record in iter_records(self.zoho, module, modified_since=modified_since):
+                batch.append(record)
+                seen_ids.add(str(record.get("id")))
+                modified = record.get("Modified_Time") or ""
+                if modified > max_modified:
+                    max_modified = modified
+                if len(batch) >= PAGE_SIZE:
+                    self.upsert_records(module, batch)
+                    count += len(batch)
+                    batch = []
+            self.upsert_records(module, batch)
+            count += len(batch)
+
+            if full:
+                # Swap in place instead of wiping first, so searches keep working during a full load.
+                existing = self._conn().execute("SELECT id FROM records WHERE module = ?", (module,)).fetchall()
+                for (record_id,) in existing:
+                    if record_id not in seen_ids:
+                        self.delete_record(module, record_id)
+            elif modified_since:
+                deleted = list(iter_records(self.zoho, module, modified_since=modified_since,
+                                            path=f"{module}/deleted"))
+                for record in deleted:
+                    self.delete_record(module, record["id"])
+        except Exception:
+            self._release_sync(module, claimed, False)
+            log.exception("mirror sync failed", extra={"module": module})
+            return 0
+
+        self._release_sync(module, max_modified, True)
+        log.info("mirror synced", extra={"module": module, "records": count, "full": full})
+        return count
+
+    def sync_all(self, full=False, force=False):
+        with self._sync_lock:
+            return {module: self.sync_module(module, full=full, force=force) for module in MIRROR_MODULES}
+
+    def start_background_sync(self):
+        if self._sync_thread:
+            return
+
+        def loop():
+            while True:
+                # Modules that were never synced get a full load; later passes are incremental.
+                for module in MIRROR_MODULES:
+                    with self._sync_lock:
+                        self.sync_module(module, full=self.last_sync(module) == 0)
+                time.sleep(self.sync_interval)
+
+        self._sync_thread = threading.Thread(target=loop, name="crm-mirror-sync", daemon=True)
+        self._sync_thread.start()
+
+    # ---- reads ----
+    def last_sync(self, module):
+        row = self._conn().execute("SELECT last_sync FROM sync_state WHERE module = ?", (module,)).fetchone()
+        return row[0] if row else 0
+
+    def is_fresh(self, module):
+        return time.time() - self.last_sync(module) <= self.max_staleness
+
+    def search(self, module, query, limit=5):
+        query = query.strip()
+        if not query:
+            return []
+        conn = self._conn()
+        query_lower = query.lower()
+
+        if len(query) >= 3:
+            # Trigram FTS matches substrings anywhere; quote the query so it's taken as a phrase.
+            phrase = '"' + query.replace('"', '""') + '"'
+            rows = conn.execute(
+                "SELECT r.name_lower, r.data, bm25(records_fts) AS score "
+                "FROM records_fts JOIN records r ON r.module = records_fts.module AND r.id = records_fts.id "
+                "WHERE records_fts MATCH ? AND records_fts.module = ? "
+                "ORDER BY score LIMIT ?",
+                (phrase, module, limit * 4),
+            ).fetchall()
+            if not rows and " " in query:
+                # No phrase hit: fall back to any word, like the live OR search.
+                words = [w for w in query.split() if len(w) >= 3]
+                if words:
+                    match = " OR ".join('"' + w.replace('"', '""') + '"' for w in words)
+                    rows = conn.execute(
+                        "SELECT r.name_lower, r.data, bm25(records_fts) AS score "
+                        "FROM records_fts JOIN records r ON r.module = records_fts.module AND r.id = records_fts.id "
+                        "WHERE records_fts MATCH ? AND records_fts.module = ? "
+                        "ORDER BY score LIMIT ?",
+                        (match, module, limit * 4),
+                    ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT name_lower, data, 0 FROM records WHERE module = ? AND name_lower LIKE ? LIMIT ?",
+                (module, f"%{query_lower}%", limit * 4),
+            ).fetchall()
+
+        # Exact name first, then prefix, then FTS relevance.
+        def rank(row):
+            name_lower, _, score = row
+            if name_lower == query_lower:
+                tier = 0
+            elif name_lower.startswith(query_lower):
+                tier = 1
+            else:
+                tier = 2
+            return tier, score, len(name_lower)
+
+        rows.sort(key=rank)
+        return [json.loads(row[1]) for row in rows[:limit]]
+
+    def stats(self):
+        conn = self._conn()
+        counts = dict(conn.execute("SELECT module, COUNT(*) FROM records GROUP BY module").fetchall())
+        return {
+            module: {
+                "records": counts.get(module, 0),
+                "last_sync": self.last_sync(module),
+                "fresh": self.is_fresh(module),
+            }
+            for module in MIRROR_MODULES
+        }
@@ -0,0 +1,262 @@
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+
+import requests
+
+log = logging.getLogger(__name__)
+
+ZOHO_BATCH_SIZE = 100  # Max records per Zoho insert/update
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+# ---------------- CRM Write Outbox ----------------
+class CRMOutbox:
+    # Durable write-behind queue for stage updates and notes. Stage updates to the same deal
+    # collapse into one row, so only the latest stage is sent. Rows are claimed with a short lease,
+    # so several workers can flush the same file without sending a row twice.
+    def __init__(self, path, zoho, flush_interval=2.0, batch_size=ZOHO_BATCH_SIZE, max_attempts=8,
+                 backoff_base=2.0, backoff_max=300.0, claim_timeout=60, on_failure=None):
+        self.path = path
+        self.zoho = zoho
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.claim_timeout = claim_timeout
+        # on_failure(entry, reason) is called once a write is given up on.
+        self.on_failure = on_failure
+        self._local = threading.local()
+        self._flush_thread = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self.flushed = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.failed = 0
+        self.last_flush = 0
+        self._init_schema()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        self._conn().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                deal_id TEXT NOT NULL,
+                coalesce_key TEXT UNIQUE,
+                payload TEXT NOT NULL,
+                sender TEXT,
+                version INTEGER NOT NULL DEFAULT 1,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                next_attempt_at REAL NOT NULL,
+                claimed_until REAL NOT NULL DEFAULT 0,
+                last_error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS outbox_due ON outbox (kind, next_attempt_at);
+            """
+        )
+
+    # ---- enqueue ----
+    def update_stage(self, deal_id, stage, sender=None, deal_name=None):
+        # A newer stage for a pending deal replaces the payload; created_at keeps the oldest time for lag.
+        now = time.time()
+        payload = json.dumps({"Stage": stage, "deal_name": deal_name})
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            existing = conn.execute(
+                "SELECT id FROM outbox WHERE coalesce_key = ?", (f"stage:{deal_id}",)
+            ).fetchone()
+            conn.execute(
+                "INSERT INTO outbox (kind, deal_id, coalesce_key, payload, sender, created_at, next_attempt_at) "
+                "VALUES ('stage', ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(coalesce_key) DO UPDATE SET payload = excluded.payload, sender = excluded.sender, "
+                "version = version + 1, attempts = 0, next_attempt_at = excluded.next_attempt_at, last_error = NULL",
+                (str(deal_id), f"stage:{deal_id}", payload, sender, now, now),
+            )
+        if existing:
+            with self._lock:
+                self.coalesced += 1
+        self._wake.set()
+
+    def add_note(self, deal_id, content, title="Bot Note", sender=None, deal_name=None):
+        now = time.time()
+        payload = json.dumps({"Note_Title": title, "Note_Content": content, "deal_name": deal_name})
+        self._conn().execute(
+            "INSERT INTO outbox (kind, deal_id, payload, sender, created_at, next_attempt_at) "
+            "VALUES ('note', ?, ?, ?, ?, ?)",
+            (str(deal_id), payload, sender, now, now),
+        )
+        self._wake.set()
+
+    # ---- flush ----
+    def _claim(self, kind):
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id, deal_id, payload, sender, version, attempts FROM outbox "
+                "WHERE kind = ? AND next_attempt_at <= ? AND claimed_until <= ? ORDER BY id LIMIT ?",
+                (kind, now, now, self.batch_size),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE outbox SET claimed_until = ? WHERE id = ?",
+                [(now + self.claim_timeout, row[0]) for row in rows],
+            )
+        return [
+            {"id": r[0], "deal_id": r[1], "payload": json.loads(r[2]), "sender": r[3], "version": r[4],
+             "attempts": r[5], "kind": kind}
+            for r in rows
+        ]
+
+    def _backoff(self, attempts):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempts)))
+
+    def _done(self, entry):
+        # Only delete the version we sent; a stage that changed mid-flight stays queued.
+        conn = self._conn()
+        conn.execute("DELETE FROM outbox WHERE id = ? AND version = ?", (entry["id"], entry["version"]))
+        conn.execute("UPDATE outbox SET claimed_until = 0 WHERE id = ?", (entry["id"],))
+        with self._lock:
+            self.flushed += 1
+
+    def _give_up(self, entry, reason):
+        conn = self._conn()
+        deleted = conn.execute("DELETE FROM outbox WHERE id = ? AND version = ?",
+                               (entry["id"], entry["version"])).rowcount
+        conn.execute("UPDATE outbox SET claimed_until = 0 WHERE id = ?", (entry["id"],))
+        if not deleted:
+            # A newer stage for the deal came in meanwhile and is still queued; that one decides.
+            log.info("outbox write superseded before giving up",
+                     extra={"kind": entry["kind"], "deal_id": entry["deal_id"], "reason": str(reason)})
+            return
+        with self._lock:
+            self.failed += 1
+        log.warning("outbox gave up on write",
+                    extra={"kind": entry["kind"], "deal_id": entry["deal_id"], "reason": str(reason)})
+        if self.on_failure:
+            try:
+                self.on_failure(entry, reason)
+            except Exception:
+                log.exception("outbox failure callback failed")
+
+    def _retry(self, entry, reason):
+        if entry["attempts"] + 1 >= self.max_attempts:
+            self._give_up(entry, reason)
+            return
+        conn = self._conn()
+        # A newer version starts its own attempts and goes out on the next flush, without our backoff.
+        conn.execute(
+            "UPDATE outbox SET attempts = attempts + 1, next_attempt_at = ?, claimed_until = 0, last_error = ? "
+            "WHERE id = ? AND version = ?",
+            (time.time() + self._backoff(entry["attempts"]), str(reason)[:500], entry["id"], entry["version"]),
+        )
+        conn.execute("UPDATE outbox SET claimed_until = 0 WHERE id = ?", (entry["id"],))
+        with self._lock:
+            self.retries += 1
+
+    def _send(self, kind, entries):
+        if kind == "stage":
+            data = [{"id": e["deal_id"], "Stage": e["payload"]["Stage"]} for e in entries]
+            return self.zoho.put("/Deals", json={"data": data})
+        data = [
+            {"Parent_Id": e["deal_id"], "se_module": "Deals",
+             "Note_Title": e["payload"]["Note_Title"], "Note_Content": e["payload"]["Note_Content"]}
+            for e in entries
+        ]
+        return self.zoho.post("/Notes", json={"data": data})
+
+    def _flush_kind(self, kind):
+        entries = self._claim(kind)
+        if not entries:
+            return 0
+        try:
+            response = self._send(kind, entries)
+        except requests.RequestException as e:
+            for entry in entries:
+                self._retry(entry, e)
+            return len(entries)
+
+        try:
+            results = response.json().get("data") if response.content else None
+        except ValueError:
+            results = None
+        if response.status_code in RETRYABLE_STATUSES or not isinstance(results, list):
+            for entry in entries:
+                self._retry(entry, f"HTTP {response.status_code}: {response.text[:200]}")
+            return len(entries)
+
+        # Zoho answers per record, in request order; record-level errors are data problems, not outages.
+        for i, entry in enumerate(entries):
+            result = results[i] if i < len(results) else {}
+            if result.get("code") == "SUCCESS":
+                self._done(entry)
+            elif result:
+                self._give_up(entry, result.get("message") or result.get("code"))
+            else:
+                self._retry(entry, f"no result from Zoho ({response.status_code})")
+        return len(entries)
+
+    def flush(self):
+        sent = 0
+        for kind in ("stage", "note"):
+            while True:
+                count = self._flush_kind(kind)
+                sent += count
+                if count < self.batch_size:
+                    break
+        self.last_flush = time.time()
+        return sent
+
+    def start(self):
+        if self._flush_thread:
+            return
+
+        def loop():
+            while True:
+                # Enqueues wake the loop early; a short wait still lets a burst of updates coalesce.
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                time.sleep(min(self.flush_interval, 0.5))
+                try:
+                    self.flush()
+                except Exception:
+                    log.exception("outbox flush failed")
+
+        self._flush_thread = threading.Thread(target=loop, name="crm-outbox", daemon=True)
+        self._flush_thread.start()
+
+    # ---- stats ----
+    def stats(self):
+        now = time.time()
+        rows = self._conn().execute(
+            "SELECT kind, COUNT(*), MIN(created_at), SUM(attempts > 0) FROM outbox GROUP BY kind"
+        ).fetchall()
+        with self._lock:
+            counters = {"flushed": self.flushed, "coalesced": self.coalesced,
+                        "retries": self.retries, "failed": self.failed}
+        oldest = min((row[2] for row in rows), default=None)
+        return {
+            "depth": sum(row[1] for row in rows),
+            "by_kind": {row[0]: row[1] for row in rows},
+            "retrying": sum(row[3] or 0 for row in rows),
+            "lag_seconds": round(now - oldest, 1) if oldest else 0.0,
+            "last_flush": self.last_flush,
+            **counters,
+        }
@@ -0,0 +1,107 @@
+import difflib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_name(name):
+    return re.sub(r"\s+", " ", (name or "").strip().lower())
+
+
+# ---------------- Deal Name -> ID Cache ----------------
+class DealIdCache:
+    # LRU with TTL. Each deal ID maps from exactly one name, so a rename replaces the old entry.
+    def __init__(self, max_size=2000, ttl=3600, fuzzy_cutoff=0.9):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self._entries = OrderedDict()  # normalized name -> (deal_id, display name, expires_at)
+        self._names_by_id = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.suggestions = 0
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry and self._names_by_id.get(entry[0]) == key:
+            del self._names_by_id[entry[0]]
+
+    def _live_entry(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[2] <= now:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def lookup(self, name):
+        # Exact (normalized) name only: "Gulf Logistics Q3" is not "Gulf Logistics Q4", however close.
+        # Returns (deal_id, display name) or None.
+        key = normalize_name(name)
+        with self._lock:
+            entry = self._live_entry(key, time.time())
+            if entry:
+                self.hits += 1
+                return entry[0], entry[1]
+            self.misses += 1
+            return None
+
+    def closest(self, name, ambiguity_margin=0.05):
+        # A cached deal with a name close to `name`, to offer as "did you mean", never to write to unasked.
+        # A runner-up nearly as close means no suggestion. Returns (deal_id, display name) or None.
+        key = normalize_name(name)
+        with self._lock:
+            now = time.time()
+            candidates = difflib.get_close_matches(key, list(self._entries), n=2, cutoff=self.fuzzy_cutoff)
+            ratios = [difflib.SequenceMatcher(None, key, c).ratio() for c in candidates]
+            clear = len(ratios) == 1 or (len(ratios) > 1 and ratios[0] - ratios[1] >= ambiguity_margin)
+            if clear and candidates[0] != key:
+                entry = self._live_entry(candidates[0], now)
+                if entry:
+                    self.suggestions += 1
+                    return entry[0], entry[1]
+            return None
+
+    def put(self, name, deal_id):
+        key = normalize_name(name)
+        if not key or not deal_id:
+            return
+        deal_id = str(deal_id)
+        with self._lock:
+            # Same ID under a different name means the deal was renamed.
+            old_key = self._names_by_id.get(deal_id)
+            if old_key is not None and old_key != key:
+                self._drop(old_key)
+            if key in self._entries and self._entries[key][0] != deal_id:
+                self._drop(key)
+            self._entries[key] = (deal_id, name.strip(), time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            self._names_by_id[deal_id] = key
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_id(self, deal_id):
+        with self._lock:
+            key = self._names_by_id.get(str(deal_id))
+            if key is not None:
+                self._drop(key)
+
+    def invalidate_name(self, name):
+        with self._lock:
+            self._drop(normalize_name(name))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "suggestions": self.suggestions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,124 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+
+# ---------------- Per-Sender Ordered Worker Pool ----------------
+class KeyedDispatcher:
+    # Messages with the same key run one at a time in arrival order; different keys run in parallel.
+    # A key is in the ready queue at most once, so one chatty sender can't occupy several workers.
+    def __init__(self, handler, workers=8, max_pending=200, max_per_key=20, name="dispatch"):
+        self.handler = handler
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_per_key = max_per_key
+        self.name = name
+
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._ready = queue.Queue()
+        self._threads = []
+        self._depth = 0
+        self._in_flight = 0
+        self._closed = False
+
+        self.accepted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _ensure_started(self):
+        # Threads start lazily so gunicorn's pre-fork import doesn't leave dead threads in the children.
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        atexit.register(self.shutdown)
+
+    def submit(self, key, *args):
+        with self._lock:
+            if self._closed or self._depth >= self.max_pending:
+                self.rejected += 1
+                return False
+            pending = self._pending.get(key)
+            schedule = pending is None
+            if schedule:
+                pending = self._pending[key] = deque()
+            elif len(pending) >= self.max_per_key:
+                self.rejected += 1
+                return False
+            pending.append(args)
+            self._depth += 1
+            self.accepted += 1
+
+        self._ensure_started()
+        if schedule:
+            self._ready.put(key)
+        return True
+
+    def _run(self):
+        while True:
+            key = self._ready.get()
+            if key is None:
+                return
+
+            with self._lock:
+                args = self._pending[key].popleft()
+                self._depth -= 1
+                self._in_flight += 1
+
+            try:
+                self.handler(*args)
+                ok = True
+            except Exception:
+                ok = False
+                log.exception("dispatch worker failed", extra={"dispatcher": self.name, "key": key})
+
+            with self._lock:
+                self._in_flight -= 1
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                # Round-robin: requeue the key behind other senders instead of draining it here.
+                if self._pending[key]:
+                    self._ready.put(key)
+                else:
+                    del self._pending[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_depth": self._depth,
+                "in_flight": self._in_flight,
+                "active_senders": len(self._pending),
+                "max_pending": self.max_pending,
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+    def shutdown(self, timeout=10):
+        # Stop accepting work, let queued messages drain, then release the workers.
+        with self._lock:
+            self._closed = True
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if not self._pending:
+                    break
+            time.sleep(0.05)
+        for _ in self._threads:
+            self._ready.put(None)
@@ -0,0 +1,289 @@
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from telemetry import metrics, span
+from zoho_limits import CircuitBreaker, CreditMeter, ZohoUnavailable, credit_cost, endpoint_class
+
+# ---------------- Defaults ----------------
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "3.05"))
+HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", "20"))
+HTTP_MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", "2"))
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "10"))
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+ZOHO_RESPONSES = metrics.counter(
+    "hfs_bot_zoho_responses_total", "Zoho API responses by endpoint class and status.", labels=("endpoint", "status")
+)
+
+
+# ---------------- Base Client ----------------
+class HTTPClient:
+    # One keep-alive pool per upstream; retries only for idempotent calls unless asked.
+    def __init__(self, base_url, headers=None, auth=None, connect_timeout=None, read_timeout=None,
+                 max_retries=None, backoff_base=0.5, backoff_max=8.0, pool_size=None):
+        self.base_url = base_url.rstrip("/")
+        self.connect_timeout = HTTP_CONNECT_TIMEOUT if connect_timeout is None else connect_timeout
+        self.read_timeout = HTTP_READ_TIMEOUT if read_timeout is None else read_timeout
+        self.max_retries = HTTP_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        pool_size = pool_size or HTTP_POOL_SIZE
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if headers:
+            self.session.headers.update(headers)
+        if auth:
+            self.session.auth = auth
+
+    def close(self):
+        self.session.close()
+
+    def url(self, path):
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def backoff(self, attempt, response=None):
+        # Honour Retry-After when the upstream gives one, otherwise full-jitter exponential backoff.
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def retry_delay(self, attempt, response):
+        # How long to sleep before retrying a response with a RETRYABLE_STATUSES status.
+        return self.backoff(attempt, response)
+
+    def send(self, method, url, **kwargs):
+        return self.session.request(method, url, **kwargs)
+
+    def request(self, method, path, retry=None, **kwargs):
+        method = method.upper()
+        if retry is None:
+            retry = method in IDEMPOTENT_METHODS
+        kwargs.setdefault("timeout", (self.connect_timeout, self.read_timeout))
+        attempts = self.max_retries + 1 if retry else 1
+        url = self.url(path)
+
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            try:
+                response = self.send(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if last_attempt:
+                    raise
+                time.sleep(self.backoff(attempt))
+                continue
+
+            if response.status_code in RETRYABLE_STATUSES and not last_attempt:
+                time.sleep(self.retry_delay(attempt, response))
+                continue
+            return response
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request("PUT", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+
+# ---------------- Zoho CRM ----------------
+class ZohoClient(HTTPClient):
+    # Counts API credits, caps in-flight calls and fails fast through a circuit breaker,
+    # so a throttled or unreachable Zoho doesn't tie up every worker.
+    def __init__(self, token_manager, base_url="https://www.zohoapis.com/crm/v2", max_in_flight=None,
+                 acquire_timeout=10, breaker=None, meter=None, **kwargs):
+        super().__init__(base_url, **kwargs)
+        self.token_manager = token_manager
+        self.max_in_flight = max_in_flight
+        self.acquire_timeout = acquire_timeout
+        self.slots = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+        self.breaker = breaker or CircuitBreaker()
+        self.meter = meter or CreditMeter()
+        self._lock = threading.Lock()
+        self._throttled_until = 0
+        self.in_flight = 0
+        self.throttled = 0
+        self.rejected = 0
+
+    @staticmethod
+    def is_invalid_token_response(response):
+        if response.status_code != 401:
+            return False
+        try:
+            return response.json().get("code") == "INVALID_TOKEN"
+        except ValueError:
+            return False
+
+    @staticmethod
+    def is_throttled_response(response):
+        if response.status_code == 429:
+            return True
+        if response.status_code < 400:
+            return False
+        try:
+            return response.json().get("code") == "TOO_MANY_REQUESTS"
+        except (ValueError, AttributeError):
+            return False
+
+    def _reject(self, message):
+        with self._lock:
+            self.rejected += 1
+        raise ZohoUnavailable(message)
+
+    def retry_delay(self, attempt, response):
+        # A throttled response already set the shared cool-down, which the retry's send() waits out.
+        if self.is_throttled_response(response):
+            return 0
+        return super().retry_delay(attempt, response)
+
+    def _send_authorized(self, method, url, **kwargs):
+        # Refresh once and replay if Zoho rejects a token we still thought was valid.
+        headers = dict(kwargs.pop("headers", None) or {})
+        for attempt in range(2):
+            with span("zoho_token"):
+                access_token = self.token_manager.get_token()
+            headers["Authorization"] = f"Zoho-oauthtoken {access_token}"
+            response = self.session.request(method, url, headers=headers, **kwargs)
+            if attempt == 0 and self.is_invalid_token_response(response):
+                self.token_manager.invalidate(access_token)
+                continue
+            return response
+        return response
+
+    def send(self, method, url, **kwargs):
+        cls = endpoint_class(method, url)
+        # After a 429 every caller waits out the same cool-down instead of hammering Zoho; a cool-down
+        # longer than backoff_max isn't slept through, the request fails at once.
+        wait = self._throttled_until - time.monotonic()
+        if wait > self.backoff_max:
+            self._reject("Zoho CRM's request limit was reached. Please try again in a minute.")
+        if wait > 0:
+            time.sleep(wait)
+
+        if self.slots and not self.slots.acquire(timeout=self.acquire_timeout):
+            self._reject("Zoho CRM is busy right now. Please try again in a moment.")
+        try:
+            if not self.breaker.allow():
+                self._reject("Zoho CRM isn't responding right now. Please try again in a minute.")
+            with self._lock:
+                self.in_flight += 1
+            try:
+                with span(f"zoho.{cls}"):
+                    response = self._send_authorized(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                ZOHO_RESPONSES.inc(endpoint=cls, status="error")
+                self.breaker.record_failure()
+                raise
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+        finally:
+            if self.slots:
+                self.slots.release()
+
+        ZOHO_RESPONSES.inc(endpoint=cls, status=response.status_code)
+        if self.is_throttled_response(response):
+            with self._lock:
+                self.throttled += 1
+                # Uncapped, unlike backoff(): a long Retry-After has to reach the fail-fast check above.
+                retry_after = response.headers.get("Retry-After")
+                cool_down = float(retry_after) if retry_after and retry_after.isdigit() else self.backoff(2)
+                self._throttled_until = time.monotonic() + cool_down
+            # Counted once, as throttled: Zoho answered, so the breaker treats it as up and the cool-down
+            # alone holds callers back (a long one would otherwise open the circuit on top).
+            self.breaker.record_success()
+            return response
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+            return response
+        self.breaker.record_success()
+
+        records = kwargs.get("json", {}).get("data") if isinstance(kwargs.get("json"), dict) else None
+        self.meter.record(cls, credit_cost(cls, len(records) if isinstance(records, list) else 1))
+        return response
+
+    def usage(self):
+        with self._lock:
+            in_flight, throttled, rejected = self.in_flight, self.throttled, self.rejected
+        return {
+            "credits": self.meter.stats(),
+            "breaker": self.breaker.stats(),
+            "in_flight": in_flight,
+            "max_in_flight": self.max_in_flight,
+            "throttled": throttled,
+            "rejected": rejected,
+        }
+
+
+# ---------------- Twilio ----------------
+class TwilioClient(HTTPClient):
+    def __init__(self, account_sid, auth_token, base_url="https://api.twilio.com/2010-04-01", **kwargs):
+        super().__init__(f"{base_url.rstrip('/')}/Accounts/{account_sid}", auth=(account_sid, auth_token), **kwargs)
+
+    def send_message(self, from_number, to, body):
+        return self.post("/Messages.json", data={"From": from_number, "To": to, "Body": body})
+
+    def fetch_media(self, media_url):
+        # Streamed so large attachments are parsed line by line instead of loaded whole.
+        response = self.get(media_url, stream=True)
+        response.raise_for_status()
+        return response
+
+
+# ---------------- Lazy Construction ----------------
+class LazyClient:
+    # Stands in for a client that is built on first use, so importing the app or a worker
+    # that never talks to an upstream doesn't pay for it. Attribute access goes to the real client,
+    # so the proxy's own names are kept to `built` and underscores.
+    def __init__(self, factory, name="client"):
+        self._factory = factory
+        self._name = name
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _resolve(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    with span(f"build_{self._name}"):
+                        self._client = self._factory()
+        return self._client
+
+    @property
+    def built(self):
+        return self._client is not None
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+
+# ---------------- OpenAI ----------------
+def build_openai_client(api_key, base_url=None, timeout=None, max_retries=None):
+    # The SDK keeps its own keep-alive pool; we only pin down the timeout and retries.
+    # Imported here: the SDK takes longer to import than the rest of the app together.
+    from openai import OpenAI
+
+    return OpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        timeout=float(os.environ.get("OPENAI_TIMEOUT", "60")) if timeout is None else timeout,
+        max_retries=HTTP_MAX_RETRIES if max_retries is None else max_retries,
+    )
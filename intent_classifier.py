@@ -0,0 +1,133 @@
+import difflib
+import re
+from dataclasses import dataclass
+
+from command_router import BOT_PREFIX, Command
+
+
+@dataclass(frozen=True)
+class Intent:
+    command: Command = None
+    confidence: float = 0.0
+    reason: str = ""
+
+
+# Natural phrasings that don't follow the @bot grammar: (pattern, command name, slot mapping, confidence).
+PHRASE_PATTERNS = [
+    (r"^(?:find|look ?up|show(?: me)?|get)\s+(?:the\s+)?deal\s+(?P<q>.+)$", "search_deal", "deal_name", 0.85),
+    (r"^(?:find|look ?up|show(?: me)?|get)\s+(?:the\s+)?contact\s+(?P<q>.+)$", "search_contact", "contact_name", 0.85),
+    (r"^(?:find|look ?up|show(?: me)?|get)\s+(?:the\s+)?account\s+(?P<q>.+)$", "search_account", "account_name", 0.85),
+    (r"^(?:move|set|change)\s+(?:the\s+)?deal\s+(?P<deal>.+?)\s+(?:to\s+)?(?:stage\s+)(?P<stage>.+)$", "update_deal", None, 0.8),
+    (r"^(?:move|set|change)\s+(?:the\s+)?deal\s+(?P<deal>.+?)\s+to\s+(?P<stage>.+)$", "update_deal", None, 0.75),
+]
+
+# First words after "find" that mean a sentence rather than a record name.
+PROSE_WORDS = {"out", "me", "a", "an", "the", "some", "how", "what", "why", "when", "where", "who", "if"}
+# Words that turn up in sentences but not in person, company or deal names.
+FUNCTION_WORDS = PROSE_WORDS | {
+    "to", "from", "for", "with", "was", "is", "are", "were", "be", "and", "or", "of", "in", "on", "at",
+    "my", "our", "your", "this", "that", "it", "i", "we", "you", "they", "please", "about",
+}
+# Commands that change the CRM. Recognised without "@bot" they are shown back for a yes/no first,
+# never run directly (see route_message).
+WRITE_COMMANDS = {"add_contact", "note", "update_deal", "import_contacts"}
+
+
+def looks_like_name(text, max_words):
+    # "Priya Raman", "Raman Textiles LLC" but not "details to" or "from the meeting".
+    words = (text or "").lower().split()
+    return 0 < len(words) <= max_words and not any(word in FUNCTION_WORDS for word in words)
+
+
+# ---------------- Intent Classifier ----------------
+class IntentClassifier:
+    # Cheap local pass in front of the LLM: exact grammar, then typo-tolerant keywords, then phrasings.
+    # Stage/pipeline slots are checked against the allowed values to confirm or down-weight a guess.
+    def __init__(self, router, picklists, threshold=0.8, keyword_cutoff=0.8):
+        self.router = router
+        # DealPicklists; read on every call so refreshed options are picked up.
+        self.picklists = picklists
+        self.threshold = threshold
+        self.keyword_cutoff = keyword_cutoff
+        self._phrases = [(re.compile(p, re.IGNORECASE | re.DOTALL), name, slot, conf)
+                         for p, name, slot, conf in PHRASE_PATTERNS]
+        # Leading keyword sequences of prefix commands, e.g. ("search", "deal"), ("help",).
+        self._keywords = {g.leading: g for g in router.grammars if g.requires_prefix and g.leading}
+
+    def _adjust(self, command, confidence):
+        # A recognisable stage/pipeline makes us more sure; an unknown one suggests prose.
+        if command.name == "update_deal":
+            score = self.picklists.stages.score(command.args.get("stage_name"))
+            confidence *= 0.7 + 0.4 * score
+        elif command.name == "deal_details":
+            score = min(self.picklists.stages.score(command.args.get("stage_name")),
+                        self.picklists.pipelines.score(command.args.get("pipeline_name")))
+            confidence *= 0.7 + 0.4 * score
+        elif command.name == "add_contact":
+            # "add contact details to company page" fits the grammar but names nobody.
+            if not (looks_like_name(command.args.get("full_name"), 4) and
+                    looks_like_name(command.args.get("company_name"), 6)):
+                confidence *= 0.5
+        elif command.name == "note":
+            words = command.args.get("deal_name", "").lower().split()
+            if not words or len(words) > 8 or words[0] in FUNCTION_WORDS:
+                confidence *= 0.5
+        elif command.name.startswith("search_") and len(command.text.split()) > 8:
+            # Long sentences that merely start with "search deal" are usually questions.
+            confidence *= 0.7
+        elif command.name == "find":
+            # "find out why ..." and other prose; a lookup is a few words naming a record.
+            words = command.args.get("text", "").lower().split()
+            if len(words) > 4 or (words and words[0] in PROSE_WORDS):
+                confidence *= 0.5
+        return min(confidence, 1.0)
+
+    def _finish(self, command, confidence, reason):
+        return Intent(command, round(self._adjust(command, confidence), 3), reason)
+
+    def classify(self, message):
+        text = (message or "").strip()
+        if not text:
+            return Intent(reason="empty")
+        if text[:len(BOT_PREFIX)].lower() == BOT_PREFIX:
+            text = text[len(BOT_PREFIX):].strip()
+
+        # 1. Exactly our grammar, just without "@bot"
+        command = self.router.parse(f"{BOT_PREFIX} {text}", exact=True)
+        if command and command.name not in ("confirm", "cancel"):
+            return self._finish(Command(command.name, command.args, message), 1.0, "grammar")
+
+        # 2. Misspelt command keywords ("serach deal Acme", "updte deal X stage Y")
+        words = text.split()
+        best = None
+        for leading, grammar in self._keywords.items():
+            if len(words) < len(leading):
+                continue
+            head = " ".join(words[:len(leading)]).lower()
+            ratio = difflib.SequenceMatcher(None, head, " ".join(leading)).ratio()
+            if ratio >= self.keyword_cutoff and (best is None or ratio > best[0]):
+                best = (ratio, grammar, leading)
+        if best:
+            ratio, grammar, leading = best
+            rewritten = " ".join(list(leading) + words[len(leading):])
+            command = grammar.match(rewritten, exact=True)
+            if command:
+                return self._finish(Command(command.name, command.args, message), ratio * 0.95, "fuzzy-keyword")
+
+        # 3. Natural phrasings
+        for regex, name, slot, confidence in self._phrases:
+            m = regex.match(text)
+            if not m:
+                continue
+            if name == "update_deal":
+                args = {"deal_name": m.group("deal").strip(), "stage_name": m.group("stage").strip()}
+            else:
+                args = {slot: m.group("q").strip()}
+            return self._finish(Command(name, args, message), confidence, "phrase")
+
+        return Intent(reason="no-match")
+
+    def route(self, message):
+        # The command to run locally, or None when the text should go to the LLM.
+        intent = self.classify(message)
+        return intent.command if intent.command and intent.confidence >= self.threshold else None
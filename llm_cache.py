@@ -0,0 +1,127 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_prompt(prompt):
+    # "How do I add a contact??" and "how do i  add a contact" share an entry.
+    text = re.sub(r"\s+", " ", (prompt or "").strip().lower())
+    return text.rstrip(" ?!.")
+
+
+def cache_key(prompt, model, system_prompt, temperature):
+    raw = json.dumps([normalize_prompt(prompt), model, system_prompt, temperature])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# ---------------- SQLite Backend ----------------
+class SQLiteLLMCacheBackend:
+    # Shared by all workers on the host; WAL keeps readers from blocking on writers.
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute(
+            "SELECT response FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        if row:
+            conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+            return row[0]
+        return None
+
+    def put(self, key, response, ttl):
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, response, expires_at, last_used) VALUES (?, ?, ?, ?)",
+            (key, response, now + ttl, now),
+        )
+        self._writes += 1
+        # Trim now and then rather than on every write.
+        if self._writes % 100 == 0:
+            conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                "SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+
+# ---------------- Response Cache ----------------
+class LLMResponseCache:
+    # In-process LRU in front of an optional shared SQLite backend.
+    def __init__(self, max_entries=1000, ttl=86400, backend=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self._entries = OrderedDict()  # key -> (response, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                del self._entries[key]
+
+        response = self.backend.get(key) if self.backend else None
+        with self._lock:
+            if response is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(key, response, now + self.ttl)
+        return response
+
+    def put(self, key, response):
+        with self._lock:
+            self._store(key, response, time.time() + self.ttl)
+        if self.backend:
+            self.backend.put(key, response, self.ttl)
+
+    def _store(self, key, response, expires_at):
+        self._entries[key] = (response, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "shared": self.backend is not None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,159 @@
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from outbound import WHATSAPP_BODY_LIMIT, split_message
+from telemetry import metrics, span
+
+log = logging.getLogger(__name__)
+
+HEDGES = metrics.counter("hfs_bot_llm_hedges_total", "LLM requests that also went to the fallback model.")
+ATTEMPTS = metrics.counter("hfs_bot_llm_attempts_total", "LLM calls by model and how they ended.",
+                           labels=("model", "outcome"))
+TIMEOUTS = metrics.counter("hfs_bot_llm_deadline_exceeded_total", "LLM requests with no answer by the deadline.")
+
+
+class LLMDeadlineExceeded(Exception):
+    pass
+
+
+class _Race:
+    # Shared by the attempts of one request: the first to produce output wins, the rest stop.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.winner = None
+        self.won = threading.Event()
+        self.cancelled = threading.Event()
+
+    def claim(self, model):
+        with self.lock:
+            if self.winner is None:
+                self.winner = model
+                self.won.set()
+            return self.winner == model
+
+
+# ---------------- Hedged LLM Calls ----------------
+class HedgedLLM:
+    # One chat completion per request, bounded by `deadline` seconds. If the primary model hasn't answered
+    # after `hedge_delay`, the same prompt also goes to `fallback_model`; the first answer is used and the
+    # other call is stopped. With `stream`, the winner's reply is handed to on_chunk in WhatsApp-sized
+    # parts while the rest is still being generated.
+    def __init__(self, client, model, fallback_model=None, system_prompt="", temperature=0.3, deadline=20.0,
+                 hedge_delay=4.0, stream=False, chunk_size=WHATSAPP_BODY_LIMIT, workers=16):
+        self.client = client
+        self.model = model
+        self.fallback_model = fallback_model if fallback_model != model else None
+        self.system_prompt = system_prompt
+        self.temperature = temperature
+        self.deadline = deadline
+        self.hedge_delay = hedge_delay
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm")
+
+    def _messages(self, prompt):
+        return [{"role": "system", "content": self.system_prompt}, {"role": "user", "content": prompt}]
+
+    def _complete(self, model, prompt, race, expires_at, on_chunk):
+        # Runs on the pool. Returns the full reply, or None if another attempt won first.
+        # No SDK retries: they would restart the timeout, and the fallback model covers a failed call.
+        client = self.client.with_options(timeout=max(expires_at - time.monotonic(), 0.1), max_retries=0)
+        with span(f"llm.{model}"):
+            if not self.stream:
+                response = client.chat.completions.create(
+                    model=model, messages=self._messages(prompt), temperature=self.temperature
+                )
+                reply = response.choices[0].message.content.strip()
+                return reply if race.claim(model) else None
+
+            stream = client.chat.completions.create(
+                model=model, messages=self._messages(prompt), temperature=self.temperature, stream=True
+            )
+            text, pending, winner = [], "", False
+            try:
+                for event in stream:
+                    if race.cancelled.is_set() or (race.winner not in (None, model)):
+                        return None
+                    if time.monotonic() > expires_at:
+                        raise LLMDeadlineExceeded(f"{model} still streaming at the deadline")
+                    delta = event.choices[0].delta.content if event.choices else None
+                    if not delta:
+                        continue
+                    text.append(delta)
+                    pending += delta
+                    if len(pending) <= self.chunk_size:
+                        continue
+                    # A full part is ready: the first attempt to get here wins and starts sending.
+                    if not winner and not race.claim(model):
+                        return None
+                    winner = True
+                    parts = split_message(pending.lstrip(), self.chunk_size)
+                    for part in parts[:-1]:
+                        on_chunk(part)
+                    pending = parts[-1]
+            finally:
+                stream.close()
+
+            if not winner and not race.claim(model):
+                return None
+            for part in split_message(pending.strip(), self.chunk_size) if pending.strip() else []:
+                on_chunk(part)
+            return "".join(text).strip()
+
+    def ask(self, prompt, on_chunk=None):
+        # Returns (reply, model that answered). Raises LLMDeadlineExceeded, or the last error if every
+        # attempt failed. In stream mode the reply has already been passed to on_chunk.
+        on_chunk = on_chunk or (lambda part: None)
+        started = time.monotonic()
+        expires_at = started + self.deadline
+        race = _Race()
+        # Each attempt runs in a copy of the caller's context, so on_chunk replies go out through its tenant.
+        attempts = {self.pool.submit(contextvars.copy_context().run, self._complete, self.model, prompt, race, expires_at,
+                                     on_chunk): self.model}
+
+        # Hedge once the primary is slow; a primary that fails outright is replaced at once.
+        done, _ = wait(attempts, timeout=min(self.hedge_delay, self.deadline))
+        primary_failed = bool(done) and next(iter(done)).exception() is not None
+        if self.fallback_model and not race.won.is_set() and (not done or primary_failed):
+            HEDGES.inc()
+            attempts[self.pool.submit(contextvars.copy_context().run, self._complete, self.fallback_model, prompt,
+                                      race, expires_at, on_chunk)] = self.fallback_model
+
+        error = None
+        pending = set(attempts)
+        while pending:
+            # A winner that is already streaming enforces the deadline itself, between parts.
+            remaining = None if race.won.is_set() else expires_at - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                model = attempts[future]
+                try:
+                    reply = future.result()
+                except Exception as e:
+                    error = e
+                    ATTEMPTS.inc(model=model, outcome="error")
+                    log.warning("llm attempt failed", extra={"model": model, "error": str(e)})
+                    continue
+                if reply is None:
+                    ATTEMPTS.inc(model=model, outcome="cancelled")
+                    continue
+                ATTEMPTS.inc(model=model, outcome="won")
+                race.cancelled.set()
+                for other in pending:
+                    ATTEMPTS.inc(model=attempts[other], outcome="cancelled")
+                return reply, model
+
+        race.cancelled.set()
+        for future in pending:
+            ATTEMPTS.inc(model=attempts[future], outcome="timeout")
+        if pending or error is None:
+            TIMEOUTS.inc()
+            raise LLMDeadlineExceeded(f"no answer within {self.deadline}s")
+        if isinstance(error, LLMDeadlineExceeded):
+            TIMEOUTS.inc()
+        raise error
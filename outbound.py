@@ -0,0 +1,229 @@
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+import requests
+
+from dispatch import KeyedDispatcher
+from telemetry import command_context, current_command, metrics, span
+
+log = logging.getLogger(__name__)
+
+WHATSAPP_BODY_LIMIT = 1600
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+SENDS = metrics.counter("hfs_bot_twilio_sends_total", "WhatsApp message parts sent, by outcome.", labels=("outcome",))
+
+
+# ---------------- Message Splitting ----------------
+def split_message(body, limit=WHATSAPP_BODY_LIMIT):
+    # Split at line boundaries; only a single over-long line is broken at spaces (or hard-cut).
+    body = body or ""
+    if len(body) <= limit:
+        return [body]
+
+    parts = []
+    current = ""
+    for line in body.split("\n"):
+        while len(line) > limit:
+            cut = line.rfind(" ", 0, limit)
+            cut = cut if cut > 0 else limit
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(line[:cut])
+            line = line[cut:].lstrip(" ")
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit:
+            parts.append(current)
+            current = line
+        else:
+            current = candidate
+    if current:
+        parts.append(current)
+    return [part for part in parts if part.strip()]
+
+
+# ---------------- Rate Limiting ----------------
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        # Takes a token now and returns how long the caller must wait before using it.
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def try_take(self):
+        # Takes a token only if one is available now; a refused caller doesn't borrow from the future.
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class BucketMap:
+    # Per-recipient buckets; idle ones are dropped LRU-style so the map stays bounded.
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket
+
+
+# ---------------- Delivery ----------------
+class OutboundDelivery:
+    def __init__(self, twilio, from_number, asynchronous=False, workers=4, max_pending=1000,
+                 global_rate=20, global_burst=20, recipient_rate=1, recipient_burst=5,
+                 max_attempts=4, backoff_base=1.0, backoff_max=30.0):
+        self.twilio = twilio
+        self.from_number = from_number
+        self.asynchronous = asynchronous
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.recipient_buckets = BucketMap(recipient_rate, recipient_burst)
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Keyed by recipient so the parts of one reply (and consecutive replies) keep their order.
+        self.queue = KeyedDispatcher(self._deliver, workers=workers, max_pending=max_pending,
+                                     max_per_key=max_pending, name="outbound")
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.dropped = 0
+
+    def send(self, to, body):
+        enqueued_at = time.monotonic()
+        if not self.asynchronous:
+            return self._deliver(to, body, enqueued_at)
+        # The command travels with the reply so spans on the worker thread are still tagged with it.
+        if not self.queue.submit(to, to, body, enqueued_at, current_command()):
+            with self._lock:
+                self.dropped += 1
+            SENDS.inc(outcome="dropped")
+            log.warning("outbound queue full, reply dropped", extra={"to": to})
+            return False
+        return True
+
+    def close(self):
+        # Let queued replies go out, then stop the delivery workers.
+        self.queue.shutdown()
+
+    def _wait_for_capacity(self, to):
+        delay = max(self.recipient_buckets.get(to).reserve(), self.global_bucket.reserve())
+        if delay > 0:
+            time.sleep(delay)
+
+    def _backoff(self, attempt, response=None):
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _send_part(self, to, body):
+        for attempt in range(self.max_attempts):
+            last_attempt = attempt == self.max_attempts - 1
+            self._wait_for_capacity(to)
+            try:
+                with span("twilio_send"):
+                    response = self.twilio.send_message(self.from_number, to, body)
+            except requests.ConnectionError as e:
+                # Never reached Twilio, so resending can't duplicate the message.
+                if last_attempt:
+                    log.error("twilio send failed", extra={"to": to, "error": str(e)})
+                    return False
+                with self._lock:
+                    self.retries += 1
+                time.sleep(self._backoff(attempt))
+                continue
+            except requests.RequestException as e:
+                log.error("twilio send failed", extra={"to": to, "error": str(e)})
+                return False
+
+            if response.status_code in RETRYABLE_STATUSES and not last_attempt:
+                with self._lock:
+                    self.retries += 1
+                time.sleep(self._backoff(attempt, response))
+                continue
+
+            if response.status_code >= 400:
+                log.error("twilio rejected message", extra={"to": to, "status": response.status_code,
+                                                            "twilio_code": self._error_code(response)})
+                return False
+            log.info("whatsapp message sent", extra={"to": to, "status": response.status_code})
+            return True
+        return False
+
+    @staticmethod
+    def _error_code(response):
+        # Twilio's error code says why without logging the whole response body.
+        try:
+            return response.json().get("code")
+        except ValueError:
+            return None
+
+    def _deliver(self, to, body, enqueued_at, command=None):
+        if command is not None:
+            with command_context(command):
+                return self._deliver(to, body, enqueued_at)
+        ok = True
+        for part in split_message(body):
+            sent = self._send_part(to, part)
+            SENDS.inc(outcome="sent" if sent else "failed")
+            ok = sent and ok
+        with self._lock:
+            if ok:
+                self.sent += 1
+                self._latencies.append(time.monotonic() - enqueued_at)
+            else:
+                self.failed += 1
+        return ok
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            sent, failed, retries, dropped = self.sent, self.failed, self.retries, self.dropped
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 3) if latencies else None
+
+        return {
+            "mode": "async" if self.asynchronous else "sync",
+            "sent": sent,
+            "failed": failed,
+            "retries": retries,
+            "dropped": dropped,
+            "latency_p50": percentile(0.5),
+            "latency_p95": percentile(0.95),
+            "queue": self.queue.stats(),
+        }
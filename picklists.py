@@ -0,0 +1,219 @@
+import difflib
+import logging
+import re
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize_option(value):
+    # "HFS - Credit Risk Assessment", "hfs credit-risk assessment" and "HFS  Credit Risk Assessment " all agree.
+    return NON_WORD.sub(" ", str(value or "").lower()).strip()
+
+
+def parse_deal_fields(payload):
+    # /settings/fields?module=Deals -> {"Stage": [...], "Pipeline": [...], "pipeline_stages": {pipeline: [...]}}.
+    def display_values(values):
+        return [v["display_value"] for v in values or []
+                if v.get("display_value") and v["display_value"] != "-None-"]
+
+    picklists = {"pipeline_stages": {}}
+    for field in payload.get("fields", []):
+        name = field.get("api_name")
+        if name not in ("Stage", "Pipeline"):
+            continue
+        picklists[name] = display_values(field.get("pick_list_values"))
+        if name == "Pipeline":
+            # Each pipeline option maps to the Stage options its layout allows.
+            for option in field.get("pick_list_values") or []:
+                for mapped in option.get("maps") or []:
+                    if mapped.get("api_name") == "Stage" and option.get("display_value"):
+                        picklists["pipeline_stages"][option["display_value"]] = \
+                            display_values(mapped.get("pick_list_values"))
+    return picklists
+
+
+# ---------------- Picklist ----------------
+class Picklist:
+    # The options of one picklist with their normalized forms computed once, so a lookup is a dict hit
+    # and only a miss pays for the typo-tolerant fallback.
+    def __init__(self, values, fuzzy_cutoff=0.85):
+        self.values = list(values)
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self._lookup = {}
+        for value in self.values:
+            self._lookup.setdefault(normalize_option(value), value)
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, value):
+        return normalize_option(value) in self._lookup
+
+    def _closest(self, key, cutoff):
+        return difflib.get_close_matches(key, self._lookup, n=2, cutoff=cutoff)
+
+    def resolve(self, text, ambiguity_margin=0.1):
+        # The option as Zoho spells it, or None. A runner-up nearly as close ("HFS Security Mechanism"
+        # for "... - Initiated" and "... - Done") makes it ambiguous, which also counts as no match.
+        key = normalize_option(text)
+        if not key:
+            return None
+        if key in self._lookup:
+            return self._lookup[key]
+        close = self._closest(key, self.fuzzy_cutoff - ambiguity_margin)
+        ratios = [difflib.SequenceMatcher(None, key, c).ratio() for c in close]
+        if not close or ratios[0] < self.fuzzy_cutoff:
+            return None
+        if len(close) > 1 and ratios[0] - ratios[1] < ambiguity_margin:
+            return None
+        return self._lookup[close[0]]
+
+    def score(self, text):
+        # 0-1: how much `text` looks like one of the options (for the intent classifier).
+        key = normalize_option(text)
+        if not key:
+            return 0.0
+        if key in self._lookup:
+            return 1.0
+        close = self._closest(key, 0.6)
+        return difflib.SequenceMatcher(None, key, close[0]).ratio() if close else 0.0
+
+
+# ---------------- Deal Picklists ----------------
+class DealPicklists:
+    # Deal Stage/Pipeline options and which stages each pipeline allows, loaded from Zoho's field metadata.
+    # Served from memory; once older than `ttl` a refresh runs in the background while the old lists
+    # keep answering. Until the first load succeeds the default lists are used.
+    def __init__(self, fetch, default_stages, default_pipelines, ttl=3600, retry_after=60, fuzzy_cutoff=0.85):
+        # fetch() -> {"Stage": [...], "Pipeline": [...], "pipeline_stages": {...}}, e.g. parse_deal_fields(...)
+        self.fetch = fetch
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._refresh_thread = None
+        self.loaded_at = 0
+        self.last_attempt = 0
+        self.last_error = None
+        self.refreshes = 0
+        self._apply({"Stage": default_stages, "Pipeline": default_pipelines, "pipeline_stages": {}}, source="default")
+
+    def _apply(self, picklists, source):
+        stages = Picklist(picklists.get("Stage") or [], self.fuzzy_cutoff)
+        pipelines = Picklist(picklists.get("Pipeline") or [], self.fuzzy_cutoff)
+        by_pipeline = {pipeline: Picklist(values, self.fuzzy_cutoff)
+                       for pipeline, values in (picklists.get("pipeline_stages") or {}).items()}
+        # Swapped in one assignment so readers never see stages from one load and pipelines from another.
+        self._current = (stages, pipelines, by_pipeline, source)
+
+    @property
+    def stages(self):
+        self._maybe_refresh()
+        return self._current[0]
+
+    @property
+    def pipelines(self):
+        self._maybe_refresh()
+        return self._current[1]
+
+    def stages_for(self, pipeline):
+        # The stages `pipeline` allows; every stage when Zoho didn't say.
+        self._maybe_refresh()
+        stages, _, by_pipeline, _ = self._current
+        return by_pipeline.get(pipeline, stages)
+
+    def validate(self, stage_text, pipeline_text=None):
+        # Returns (stage, pipeline, error message). With a pipeline, the stage must be one of its stages.
+        self._maybe_refresh()
+        stages, pipelines, by_pipeline, _ = self._current
+        stage = stages.resolve(stage_text)
+        if not stage:
+            return None, None, "❌ Invalid stage. Available options:\n" + "\n".join(stages)
+        if pipeline_text is None:
+            return stage, None, None
+        pipeline = pipelines.resolve(pipeline_text)
+        if not pipeline:
+            return stage, None, "❌ Invalid pipeline. Available options:\n" + "\n".join(pipelines)
+        allowed = by_pipeline.get(pipeline)
+        if allowed is not None and stage not in allowed:
+            return stage, pipeline, (f"❌ Stage *{stage}* isn't used in the *{pipeline}* pipeline. "
+                                     "Its stages are:\n" + "\n".join(allowed))
+        return stage, pipeline, None
+
+    # ---- refresh ----
+    def refresh(self):
+        self.last_attempt = time.time()
+        try:
+            picklists = self.fetch()
+        except Exception as e:
+            self.last_error = str(e)
+            log.warning("picklist refresh failed", extra={"error": str(e)})
+            return False
+        if not picklists.get("Stage") or not picklists.get("Pipeline"):
+            self.last_error = "Stage or Pipeline picklist missing from field metadata"
+            log.warning("picklist refresh incomplete", extra={"fields": sorted(picklists)})
+            return False
+        self._apply(picklists, source="zoho")
+        self.loaded_at = time.time()
+        self.last_error = None
+        self.refreshes += 1
+        return True
+
+    def _due(self):
+        now = time.time()
+        return now - self.loaded_at >= self.ttl and now - self.last_attempt >= self.retry_after
+
+    def _claim_refresh(self):
+        # One refresh at a time, whether started by a reader or by the timer.
+        with self._lock:
+            if self._refreshing or not self._due():
+                return False
+            self._refreshing = True
+            return True
+
+    def _run_claimed_refresh(self):
+        try:
+            self.refresh()
+        finally:
+            self._refreshing = False
+
+    def _maybe_refresh(self):
+        if self._due() and self._claim_refresh():
+            threading.Thread(target=self._run_claimed_refresh, name="picklist-refresh", daemon=True).start()
+
+    def start_background_refresh(self):
+        # Refreshes on a timer too, so a quiet worker doesn't answer its next message from expired lists.
+        # The first load is left to the warm-up or the first reader.
+        if self._refresh_thread:
+            return
+
+        def loop():
+            while True:
+                time.sleep(min(self.ttl, self.retry_after))
+                if self._claim_refresh():
+                    self._run_claimed_refresh()
+
+        self._refresh_thread = threading.Thread(target=loop, name="picklist-timer", daemon=True)
+        self._refresh_thread.start()
+
+    def stats(self):
+        stages, pipelines, by_pipeline, source = self._current
+        return {
+            "source": source,
+            "stages": len(stages),
+            "pipelines": len(pipelines),
+            "pipelines_with_stage_map": len(by_pipeline),
+            "loaded_at": self.loaded_at,
+            "age_seconds": round(time.time() - self.loaded_at, 1) if self.loaded_at else None,
+            "ttl": self.ttl,
+            "refreshes": self.refreshes,
+            "last_error": self.last_error,
+        }
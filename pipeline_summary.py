@@ -0,0 +1,313 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from crm_mirror import iter_records
+
+log = logging.getLogger(__name__)
+
+SUMMARY_FIELDS = ("Deal_Name", "Stage", "Pipeline", "Amount", "Closing_Date", "Modified_Time")
+COQL_PAGE_SIZE = 200
+# Zoho stops paging a COQL query past this many rows; bigger loads restart from the last Modified_Time seen.
+COQL_MAX_OFFSET = 10000
+
+
+def _amount(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def week_bounds(today=None):
+    # Monday..Sunday of the week `today` falls in, as the YYYY-MM-DD strings Zoho uses for Closing_Date.
+    today = today or date.today()
+    monday = today - timedelta(days=today.weekday())
+    return monday.isoformat(), (monday + timedelta(days=6)).isoformat()
+
+
+def describe_age(seconds):
+    if seconds is None:
+        return "never"
+    if seconds < 60:
+        return "just now"
+    if seconds < 3600:
+        return f"{int(seconds // 60)} min ago"
+    return f"{int(seconds // 3600)} h ago"
+
+
+# ---------------- Aggregates ----------------
+class PipelineSummary:
+    # Deal counts and Amount totals per pipeline and stage, kept in memory. The first summary() loads every
+    # deal once through COQL (only the fields above); after that a sync asks COQL only for deals whose
+    # Modified_Time is at or after the newest one already seen, plus Zoho's deleted-deals list, and the
+    # bot's own writes are applied as they happen. Answers come from memory together with their age.
+    def __init__(self, zoho, sync_interval=300, max_staleness=900, full_every=86400):
+        self.zoho = zoho
+        # Older than this, a summary is answered at once and a sync starts in the background.
+        self.sync_interval = sync_interval
+        # Older than this, the summary waits for a sync; if that fails the answer carries a warning.
+        self.max_staleness = max_staleness
+        # A full reload now and then catches anything the incremental syncs can't see.
+        self.full_every = full_every
+        self._deals = {}  # id -> (pipeline, stage, amount, closing_date, name)
+        self._totals = defaultdict(lambda: [0, 0.0])  # (pipeline, stage) -> [count, amount]
+        self._closing = defaultdict(set)  # closing_date -> ids
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._syncing = False
+        self._sync_thread = None
+        self.max_modified = None
+        self.synced_at = 0
+        self.loaded_at = 0
+        self.last_error = None
+        self.syncs = 0
+        self.records_synced = 0
+        self.writes_applied = 0
+
+    # ---- aggregates ----
+    def _remove_locked(self, deal_id):
+        old = self._deals.pop(deal_id, None)
+        if old is None:
+            return
+        pipeline, stage, amount, closing_date, _ = old
+        totals = self._totals[(pipeline, stage)]
+        totals[0] -= 1
+        totals[1] -= amount
+        if totals[0] <= 0:
+            del self._totals[(pipeline, stage)]
+        if closing_date:
+            self._closing[closing_date].discard(deal_id)
+            if not self._closing[closing_date]:
+                del self._closing[closing_date]
+
+    def _add_locked(self, deal_id, row):
+        self._deals[deal_id] = row
+        pipeline, stage, amount, closing_date, _ = row
+        totals = self._totals[(pipeline, stage)]
+        totals[0] += 1
+        totals[1] += amount
+        if closing_date:
+            self._closing[closing_date].add(deal_id)
+
+    def _apply_locked(self, record):
+        deal_id = str(record["id"])
+        old = self._deals.get(deal_id)
+        row = (
+            record.get("Pipeline") if "Pipeline" in record else (old[0] if old else None),
+            record.get("Stage") if "Stage" in record else (old[1] if old else None),
+            _amount(record["Amount"]) if "Amount" in record else (old[2] if old else 0.0),
+            record.get("Closing_Date") if "Closing_Date" in record else (old[3] if old else None),
+            record.get("Deal_Name") if "Deal_Name" in record else (old[4] if old else ""),
+        )
+        self._remove_locked(deal_id)
+        self._add_locked(deal_id, row)
+
+    def apply(self, record):
+        # Write-through from the bot's own creates and stage updates; fields left out keep their value.
+        # A sync that read the deal just before the write can put the old values back; the write moved
+        # Modified_Time, so the next sync corrects that.
+        if not record.get("id"):
+            return
+        with self._lock:
+            if not self.loaded_at:
+                return  # the first load will see it
+            if str(record["id"]) not in self._deals and ("Pipeline" not in record or "Stage" not in record):
+                return  # not enough to place it; the next sync will
+            self._apply_locked(record)
+            self.writes_applied += 1
+
+    # ---- sync ----
+    def _coql_pages(self, since):
+        offset = 0
+        fields = ", ".join(SUMMARY_FIELDS)
+        while True:
+            where = f"Modified_Time >= '{since}'" if since else "id is not null"
+            query = (f"select {fields} from Deals where {where} order by Modified_Time asc "
+                     f"limit {offset}, {COQL_PAGE_SIZE}")
+            response = self.zoho.post("/coql", json={"select_query": query}, retry=True)
+            if response.status_code == 204:
+                return
+            response.raise_for_status()
+            data = response.json()
+            records = data.get("data", [])
+            yield records
+            if not records or not (data.get("info") or {}).get("more_records"):
+                return
+            offset += len(records)
+            last_modified = records[-1].get("Modified_Time")
+            if offset >= COQL_MAX_OFFSET and last_modified and last_modified != since:
+                since, offset = last_modified, 0
+
+    def sync(self, full=False):
+        # Returns the number of deals read from Zoho, or None if another sync is running or this one failed.
+        with self._sync_lock:
+            if self._syncing:
+                return None
+            self._syncing = True
+        full = full or not self.loaded_at or time.time() - self.loaded_at >= self.full_every
+        since = None if full else self.max_modified
+        started = time.time()
+        try:
+            count, max_modified = 0, since
+            if full:
+                # Built off to the side and swapped in, so summaries keep answering during a reload.
+                fresh = PipelineSummary(self.zoho)
+                for records in self._coql_pages(None):
+                    with fresh._lock:
+                        for record in records:
+                            fresh._apply_locked(record)
+                    count += len(records)
+                    max_modified = max([max_modified or ""] + [r.get("Modified_Time") or "" for r in records])
+                with self._lock:
+                    self._deals, self._totals, self._closing = fresh._deals, fresh._totals, fresh._closing
+                    self.loaded_at = started
+            else:
+                for records in self._coql_pages(since):
+                    with self._lock:
+                        for record in records:
+                            self._apply_locked(record)
+                    count += len(records)
+                    max_modified = max([max_modified or ""] + [r.get("Modified_Time") or "" for r in records])
+                if since:
+                    deleted = [str(r["id"]) for r in iter_records(self.zoho, "Deals", modified_since=since,
+                                                                  path="Deals/deleted") if r.get("id")]
+                    with self._lock:
+                        for deal_id in deleted:
+                            self._remove_locked(deal_id)
+        except Exception as e:
+            self.last_error = str(e)
+            log.warning("pipeline summary sync failed", extra={"full": full, "error": str(e)})
+            return None
+        finally:
+            self._syncing = False
+
+        self.max_modified = max_modified or self.max_modified
+        # Measured from the start, so anything changed while paging counts as not yet seen.
+        self.synced_at = started
+        self.last_error = None
+        self.syncs += 1
+        self.records_synced += count
+        log.info("pipeline summary synced", extra={"full": full, "records": count,
+                                                   "seconds": round(time.time() - started, 3)})
+        return count
+
+    def load(self):
+        # The first full load; callers arriving meanwhile wait for the one that runs it. True once loaded.
+        if not self.loaded_at:
+            with self._load_lock:
+                if not self.loaded_at:
+                    self.sync(full=True)
+        return bool(self.loaded_at)
+
+    def _maybe_sync(self):
+        if not self.load():
+            raise RuntimeError(f"couldn't load deals from Zoho: {self.last_error}")
+        age = time.time() - self.synced_at
+        # A due full reload takes as long as the first load, so it never runs inside a request.
+        full_due = time.time() - self.loaded_at >= self.full_every
+        if age >= self.max_staleness and not full_due:
+            self.sync()
+        elif (age >= self.sync_interval or full_due) and not self._syncing:
+            threading.Thread(target=self.sync, name="pipeline-summary-sync", daemon=True).start()
+
+    def start_background_sync(self):
+        # Loads the deals right away, so the first summary doesn't wait for it, then keeps them fresh.
+        if self._sync_thread:
+            return
+
+        def loop():
+            self.load()
+            while True:
+                time.sleep(self.sync_interval)
+                if self.loaded_at:
+                    self.sync()
+                else:
+                    self.load()
+
+        self._sync_thread = threading.Thread(target=loop, name="pipeline-summary-timer", daemon=True)
+        self._sync_thread.start()
+
+    # ---- reads ----
+    def summary(self, pipeline=None, today=None):
+        # {"pipelines": {pipeline: {"stages": {stage: (count, amount)}, "count", "amount"}},
+        #  "closing_this_week": [(name, stage, amount, closing_date, pipeline)], "age_seconds", "stale", ...}
+        self._maybe_sync()
+        week_start, week_end = week_bounds(today)
+        pipelines = {}
+        with self._lock:
+            for (deal_pipeline, stage), (count, amount) in self._totals.items():
+                if pipeline and deal_pipeline != pipeline:
+                    continue
+                entry = pipelines.setdefault(deal_pipeline, {"stages": {}, "count": 0, "amount": 0.0})
+                entry["stages"][stage] = (count, amount)
+                entry["count"] += count
+                entry["amount"] += amount
+            closing = []
+            for closing_date, ids in self._closing.items():
+                if week_start <= closing_date <= week_end:
+                    for deal_id in ids:
+                        deal_pipeline, stage, amount, _, name = self._deals[deal_id]
+                        if not pipeline or deal_pipeline == pipeline:
+                            closing.append((name, stage, amount, closing_date, deal_pipeline))
+        closing.sort(key=lambda deal: (deal[3], deal[0] or ""))
+        age = time.time() - self.synced_at if self.synced_at else None
+        return {
+            "pipelines": pipelines,
+            "closing_this_week": closing,
+            "week": (week_start, week_end),
+            "age_seconds": age,
+            "stale": age is None or age > self.max_staleness,
+            "last_error": self.last_error,
+        }
+
+    def stats(self):
+        with self._lock:
+            deals, groups = len(self._deals), len(self._totals)
+        return {
+            "deals": deals,
+            "pipeline_stages": groups,
+            "loaded_at": self.loaded_at,
+            "synced_at": self.synced_at,
+            "age_seconds": round(time.time() - self.synced_at, 1) if self.synced_at else None,
+            "max_modified": self.max_modified,
+            "syncs": self.syncs,
+            "records_synced": self.records_synced,
+            "writes_applied": self.writes_applied,
+            "last_error": self.last_error,
+        }
+
+
+# ---------------- Formatting ----------------
+def format_pipeline_summary(summary, stage_order=(), closing_limit=10):
+    # WhatsApp text; stages follow `stage_order` (the Stage picklist), unknown ones go last.
+    position = {stage: i for i, stage in enumerate(stage_order)}
+    lines = []
+    for pipeline in sorted(summary["pipelines"], key=lambda p: p or ""):
+        entry = summary["pipelines"][pipeline]
+        lines.append(f"📊 *{pipeline or 'No pipeline'}* — {entry['count']} deals, {entry['amount']:,.0f}")
+        stages = sorted(entry["stages"].items(), key=lambda item: (position.get(item[0], len(position)), item[0] or ""))
+        for stage, (count, amount) in stages:
+            lines.append(f"• {stage or 'No stage'}: {count} ({amount:,.0f})")
+        lines.append("")
+    if not summary["pipelines"]:
+        lines.extend(["📊 No deals found.", ""])
+
+    closing = summary["closing_this_week"]
+    week_start, week_end = summary["week"]
+    lines.append(f"📅 *Closing this week* ({week_start} – {week_end}): {len(closing)} deals, "
+                 f"{sum(deal[2] for deal in closing):,.0f}")
+    for name, stage, amount, closing_date, _ in closing[:closing_limit]:
+        lines.append(f"• {name} — {stage}, {amount:,.0f}, {closing_date}")
+    if len(closing) > closing_limit:
+        lines.append(f"…and {len(closing) - closing_limit} more")
+
+    lines.append("")
+    lines.append(f"🕒 Updated {describe_age(summary['age_seconds'])}")
+    if summary["stale"]:
+        lines[-1] += " ⚠️ " + ("couldn't refresh from Zoho just now, " if summary["last_error"] else "") + \
+            "figures may be out of date"
+    return "\n".join(lines)
@@ -0,0 +1,259 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+
+
+# ---------------- In-Memory ----------------
+class MemoryStateStore:
+    # Per-process only; fine for a single worker or tests.
+    def __init__(self, ttl=900, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[key]
+                return None
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (value, time.time() + (ttl or self.ttl))
+            self._entries.move_to_end(key)
+            # Oldest-written conversations go first once we hit the cap.
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is None or entry[1] <= time.time():
+            return None
+        return entry[0]
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        with self._lock:
+            now = time.time()
+            return sum(1 for _, expires_at in self._entries.values() if expires_at > now)
+
+
+# ---------------- SQLite (shared by workers) ----------------
+class SQLiteStateStore:
+    def __init__(self, path, ttl=900, max_entries=10000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS conversation_state ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM conversation_state WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl=None):
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO conversation_state (key, value, expires_at, updated_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now + (ttl or self.ttl), now),
+        )
+        self._writes += 1
+        if self._writes % 100 == 0:
+            conn.execute("DELETE FROM conversation_state WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "DELETE FROM conversation_state WHERE key IN ("
+                "SELECT key FROM conversation_state ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def pop(self, key):
+        # BEGIN IMMEDIATE so two workers can't both consume the same "yes".
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value, expires_at FROM conversation_state WHERE key = ?", (key,)
+            ).fetchone()
+            if row:
+                conn.execute("DELETE FROM conversation_state WHERE key = ?", (key,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None or row[1] <= time.time():
+            return None
+        return json.loads(row[0])
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM conversation_state WHERE key = ?", (key,))
+
+    def __len__(self):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM conversation_state WHERE expires_at > ?", (time.time(),)
+        ).fetchone()[0]
+
+
+# ---------------- Redis protocol ----------------
+class RESPError(Exception):
+    pass
+
+
+class RESPClient:
+    # Minimal RESP2 client: enough for GET/SET/DEL/MULTI against Redis or any compatible stand-in.
+    def __init__(self, host="127.0.0.1", port=6379, db=0, password=None, timeout=2.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._local.sock = sock
+        self._local.reader = sock.makefile("rb")
+        if self.password:
+            self._call("AUTH", self.password)
+        if self.db:
+            self._call("SELECT", self.db)
+
+    def _close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+
+    @staticmethod
+    def _encode(args):
+        out = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            out.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        return b"".join(out)
+
+    def _read(self):
+        line = self._local.reader.readline()
+        if not line:
+            raise ConnectionError("connection closed by server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RESPError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length == -1:
+                return None
+            data = self._local.reader.read(length + 2)
+            return data[:-2].decode("utf-8")
+        if kind == b"*":
+            length = int(payload)
+            if length == -1:
+                return None
+            return [self._read() for _ in range(length)]
+        raise RESPError(f"unexpected reply: {line!r}")
+
+    def _call(self, *args):
+        self._local.sock.sendall(self._encode(args))
+        return self._read()
+
+    def execute(self, *args):
+        # One reconnect per call covers idle connections dropped by the server.
+        for attempt in range(2):
+            if getattr(self._local, "sock", None) is None:
+                self._connect()
+            try:
+                return self._call(*args)
+            except (OSError, ConnectionError):
+                self._close()
+                if attempt:
+                    raise
+
+    def pipeline(self, *commands):
+        if getattr(self._local, "sock", None) is None:
+            self._connect()
+        try:
+            self._local.sock.sendall(b"".join(self._encode(c) for c in commands))
+            return [self._read() for _ in commands]
+        except (OSError, ConnectionError):
+            self._close()
+            raise
+
+
+class RedisStateStore:
+    def __init__(self, client, ttl=900, prefix="hfs-bot:state:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.execute("GET", self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.execute("SET", self.prefix + key, json.dumps(value), "EX", int(ttl or self.ttl))
+
+    def pop(self, key):
+        # MULTI/EXEC makes the read-and-delete atomic across workers.
+        replies = self.client.pipeline(
+            ("MULTI",), ("GET", self.prefix + key), ("DEL", self.prefix + key), ("EXEC",)
+        )
+        value = replies[-1][0] if replies[-1] else None
+        return json.loads(value) if value is not None else None
+
+    def delete(self, key):
+        self.client.execute("DEL", self.prefix + key)
+
+
+def state_store_from_env():
+    kind = os.environ.get("STATE_STORE", "memory").lower()
+    ttl = int(os.environ.get("STATE_TTL", "900"))
+    max_entries = int(os.environ.get("STATE_MAX_ENTRIES", "10000"))
+    if kind == "sqlite":
+        return SQLiteStateStore(os.environ.get("STATE_STORE_PATH", "/tmp/hfs_bot_state.db"), ttl, max_entries)
+    if kind == "redis":
+        url = urllib.parse.urlparse(os.environ.get("STATE_REDIS_URL", "redis://127.0.0.1:6379/0"))
+        client = RESPClient(
+            host=url.hostname or "127.0.0.1",
+            port=url.port or 6379,
+            db=int(url.path.lstrip("/") or 0),
+            password=url.password,
+        )
+        return RedisStateStore(client, ttl)
+    return MemoryStateStore(ttl, max_entries)
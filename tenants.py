@@ -0,0 +1,294 @@
+import contextvars
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, fields, replace
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TENANT_ID = "default"
+
+
+# ---------------- Tenant Settings ----------------
+@dataclass(frozen=True)
+class TenantConfig:
+    id: str
+    number: str = None  # the Twilio "To" number this business unit's users write to
+    zoho_client_id: str = None
+    zoho_client_secret: str = None
+    zoho_refresh_token: str = None
+    zoho_accounts_url: str = "https://accounts.zoho.com"
+    zoho_api_base: str = "https://www.zohoapis.com/crm/v2"
+    zoho_max_in_flight: int = 5
+    zoho_daily_credits: int = 0
+    twilio_account_sid: str = None
+    twilio_auth_token: str = None
+    outbound_rate: float = 20
+    outbound_burst: int = 20
+    llm_per_minute: float = 0  # 0 means no per-tenant cap
+    export_token: str = None  # bearer token for /export and the /debug POSTs; gives access to this tenant only
+
+
+def _resolve_secret(value):
+    # "env:LEASING_ZOHO_SECRET" keeps the secret itself out of the tenants file.
+    if isinstance(value, str) and value.startswith("env:"):
+        return os.environ.get(value[4:])
+    return value
+
+
+def load_tenant_configs(path, defaults):
+    # A JSON list of objects with TenantConfig's field names; anything left out comes from `defaults`
+    # (the settings of the default tenant), so tenants sharing a Twilio account only set what differs.
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    known = {f.name for f in fields(TenantConfig)}
+    configs = []
+    for entry in entries:
+        unknown = set(entry) - known
+        if unknown:
+            raise ValueError(f"tenant {entry.get('id')!r}: unknown settings {sorted(unknown)}")
+        if not entry.get("id") or not entry.get("number"):
+            raise ValueError(f"every tenant needs an id and a number: {entry}")
+        # Never inherited: the default tenant's token mustn't open another tenant's data.
+        entry = dict({"export_token": None}, **entry)
+        configs.append(replace(defaults, **{k: _resolve_secret(v) for k, v in entry.items()}))
+    return configs
+
+
+# ---------------- Current Tenant ----------------
+_tenant = contextvars.ContextVar("tenant", default=None)
+
+
+def current_tenant():
+    return _tenant.get()
+
+
+@contextmanager
+def tenant_context(tenant):
+    token = _tenant.set(tenant)
+    try:
+        yield tenant
+    finally:
+        _tenant.reset(token)
+
+
+class Tenant:
+    # One business unit's clients, token, pools, picklists and budgets. Built on first use, closed on eviction.
+    def __init__(self, config, **resources):
+        self.config = config
+        self.id = config.id
+        self.resources = resources
+        self.created_at = time.time()
+        self.last_used = time.monotonic()
+        self.in_use = 0  # messages and background replies holding it; changed under the registry lock
+        for name, resource in resources.items():
+            setattr(self, name, resource)
+
+    def close(self):
+        for name, resource in self.resources.items():
+            close = getattr(resource, "close", None)
+            if callable(close):
+                try:
+                    close()
+                except Exception:
+                    log.exception("closing tenant resource failed", extra={"tenant": self.id, "resource": name})
+
+
+# ---------------- Registry ----------------
+class TenantRegistry:
+    # Maps the inbound number to a tenant. Built tenants are kept LRU: past `max_active`, or idle longer
+    # than `idle_ttl`, a tenant's resources are closed and rebuilt on its next message, unless a message
+    # is still using it (see use()). The default tenant (the one configured through the plain environment
+    # variables) is never evicted.
+    def __init__(self, default_config, build, configs=(), max_active=32, idle_ttl=1800):
+        self.default_config = default_config
+        self.build = build
+        self.max_active = max_active
+        self.idle_ttl = idle_ttl
+        self.configs = {c.id: c for c in configs}
+        self.by_number = {c.number: c for c in configs if c.number}
+        self._active = OrderedDict()  # id -> Tenant
+        self._lock = threading.Lock()
+        self._building = {}  # id -> Lock, so a tenant is built once even when its first messages race
+        self.builds = 0
+        self.evictions = 0
+        self._next_sweep = 0
+
+    def config_for_number(self, number):
+        # Unknown (or missing) numbers are served by the default tenant.
+        return self.by_number.get(number) or self.default_config
+
+    def config_for_id(self, tenant_id):
+        if tenant_id == self.default_config.id:
+            return self.default_config
+        return self.configs.get(tenant_id)
+
+    def config_for_export_token(self, token):
+        # The one tenant this token was configured for, or None; tenants without a token can't be exported.
+        if not token:
+            return None
+        for config in (self.default_config, *self.configs.values()):
+            if config.export_token and hmac.compare_digest(config.export_token.encode(), token.encode()):
+                return config
+        return None
+
+    def for_number(self, number):
+        return self.get(self.config_for_number(number))
+
+    def default(self):
+        return self.get(self.default_config)
+
+    @contextmanager
+    def use(self, config):
+        # The tenant for `config`, held for the block: a tenant in use is never evicted, since closing it
+        # would stop its reply queue under the message being handled.
+        tenant = self.get(config, hold=True)
+        try:
+            yield tenant
+        finally:
+            self.release(tenant)
+
+    def retain(self, tenant):
+        # Another hold on a tenant already in use, e.g. for a reply sent from a background thread.
+        if tenant is not None:
+            with self._lock:
+                tenant.in_use += 1
+        return tenant
+
+    def release(self, tenant):
+        if tenant is not None:
+            with self._lock:
+                tenant.in_use -= 1
+                tenant.last_used = time.monotonic()
+
+    def get(self, config, hold=False):
+        with self._lock:
+            tenant = self._active.get(config.id)
+            if tenant is not None:
+                self._active.move_to_end(config.id)
+                tenant.in_use += hold
+                tenant.last_used = now = time.monotonic()
+                # Idle tenants are also looked for now and then when nothing new is being built.
+                sweep = now >= self._next_sweep
+                if sweep:
+                    self._next_sweep = now + min(self.idle_ttl, 60)
+        if tenant is not None:
+            if sweep:
+                self.evict()
+            return tenant
+
+        with self._lock:
+            build_lock = self._building.setdefault(config.id, threading.Lock())
+
+        with build_lock:
+            with self._lock:
+                tenant = self._active.get(config.id)
+                if tenant is not None:
+                    self._active.move_to_end(config.id)
+                    tenant.in_use += hold
+            if tenant is None:
+                tenant = self.build(config)
+                with self._lock:
+                    tenant.in_use += hold
+                    self._active[config.id] = tenant
+                    self.builds += 1
+                    evicted = self._evict_locked(keep=config.id)
+                for old in evicted:
+                    self._close(old)
+        return tenant
+
+    def evict(self):
+        # Closes the tenants that are idle too long or over `max_active`; returns how many.
+        with self._lock:
+            evicted = self._evict_locked()
+        for old in evicted:
+            self._close(old)
+        return len(evicted)
+
+    def _evict_locked(self, keep=None):
+        # `keep`: the tenant just built for a caller, which mustn't be closed under it.
+        now = time.monotonic()
+        evicted = []
+        for tenant_id in list(self._active):
+            tenant = self._active[tenant_id]
+            over = len(self._active) - len(evicted) > self.max_active
+            idle = now - tenant.last_used > self.idle_ttl
+            # A tenant in use stays, even past max_active; the next sweep or build evicts it once released.
+            if tenant_id not in (self.default_config.id, keep) and not tenant.in_use and (over or idle):
+                evicted.append(self._active.pop(tenant_id))
+        self.evictions += len(evicted)
+        return evicted
+
+    def _close(self, tenant):
+        log.info("tenant evicted", extra={"tenant": tenant.id})
+        # Closing waits for queued replies; don't make the request that triggered eviction wait too.
+        threading.Thread(target=tenant.close, name=f"close-{tenant.id}", daemon=True).start()
+
+    def active(self):
+        with self._lock:
+            return list(self._active.values())
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            active = {t.id: round(now - t.last_used, 1) for t in self._active.values()}
+            in_use = sum(1 for t in self._active.values() if t.in_use)
+        return {
+            "configured": len(self.configs) + (self.default_config.id not in self.configs),
+            "active": len(active),
+            "in_use": in_use,
+            "max_active": self.max_active,
+            "idle_seconds": active,
+            "builds": self.builds,
+            "evictions": self.evictions,
+        }
+
+    def bound(self, name):
+        return TenantBound(self, name)
+
+
+class TenantBound:
+    # Module-level stand-in for one per-tenant resource (e.g. `zoho`): every use goes to the resource of the
+    # tenant handling the current message, or the default tenant's outside of one (background threads).
+    def __init__(self, registry, name):
+        self._registry = registry
+        self._name = name
+
+    def _resolve(self):
+        tenant = current_tenant() or self._registry.default()
+        return getattr(tenant, self._name)
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __bool__(self):
+        # So `if mirror:` still means "this tenant has a mirror".
+        return self._resolve() is not None
+
+
+class TenantScopedStore:
+    # Prefixes keys with the tenant so a sender writing to two business units has two conversations.
+    def __init__(self, store):
+        self.store = store
+
+    @staticmethod
+    def _key(key):
+        tenant = current_tenant()
+        return key if tenant is None or tenant.id == DEFAULT_TENANT_ID else f"{tenant.id}:{key}"
+
+    def get(self, key):
+        return self.store.get(self._key(key))
+
+    def set(self, key, value, ttl=None):
+        return self.store.set(self._key(key), value, ttl)
+
+    def pop(self, key):
+        return self.store.pop(self._key(key))
+
+    def delete(self, key):
+        return self.store.delete(self._key(key))
@@ -0,0 +1,78 @@
+import pytest
+
+from command_router import Command, CommandRouter
+
+COMMANDS = [
+    {"command": "@bot add contact [Full Name] company [Company Name]"},
+    {"command": "@bot create deal"},
+    {"command": "@bot note [Deal Name] note_content [Your Note]"},
+    {"command": "@bot update deal [Deal Name] stage [Stage Name]"},
+    {"command": "@bot search deal [Deal Name]"},
+    {"command": "@bot pipeline summary [Pipeline]"},
+    {"command": "@bot help"},
+    {"command": "deal name [Deal Name] account [Account Name] stage [Stage Name] pipeline [Pipeline Name]",
+     "name": "deal_details"},
+    {"command": "yes", "name": "confirm"},
+    {"command": "no", "name": "cancel"},
+    {"command": "@bot find deal [Deal Name]", "name": "search_deal"},
+]
+
+
+@pytest.fixture
+def router():
+    return CommandRouter(COMMANDS)
+
+
+def test_capitalised_words_in_a_slot_are_not_keywords(router):
+    command = router.parse("deal name Acme Account Expansion account Acme Holdings stage On Hold "
+                           "pipeline HFS - CX pipeline")
+    assert command.name == "deal_details"
+    assert command.args == {"deal_name": "Acme Account Expansion", "account_name": "Acme Holdings",
+                            "stage_name": "On Hold", "pipeline_name": "HFS - CX pipeline"}
+
+
+def test_slot_may_start_with_a_keyword_in_other_case(router):
+    command = router.parse("@bot update deal Stage Two Rollout stage On Hold")
+    assert command.args == {"deal_name": "Stage Two Rollout", "stage_name": "On Hold"}
+
+
+def test_leading_command_words_ignore_case(router):
+    command = router.parse("@Bot Update Deal Acme stage Closed Lost")
+    assert command.name == "update_deal"
+    assert command.args == {"deal_name": "Acme", "stage_name": "Closed Lost"}
+    assert router.parse("Deal Name X account Y stage Z pipeline W").name == "deal_details"
+
+
+def test_empty_required_slot_is_rejected(router):
+    assert router.parse("@bot update deal stage On Hold") is None
+    assert router.parse("@bot add contact company Acme") is None
+    assert router.parse("@bot note note_content call back") is None
+
+
+def test_last_slot_may_be_left_out(router):
+    assert router.parse("@bot pipeline summary") == Command("pipeline_summary", {"pipeline": ""},
+                                                            "@bot pipeline summary")
+
+
+def test_command_without_slots_accepts_trailing_words_after_bot(router):
+    assert router.parse("@bot help me").name == "help"
+    assert router.parse("@bot create deal please").name == "create_deal"
+    assert router.parse("@bot help me", exact=True) is None
+    assert router.parse("@bot helpful") is None
+
+
+def test_follow_ups_must_be_the_whole_message(router):
+    assert router.parse("yes").name == "confirm"
+    assert router.parse("@bot no").name == "cancel"
+    assert router.parse("no idea what you mean") is None
+
+
+def test_alias_and_original_keep_the_text(router):
+    command = router.parse("@bot find deal Acme")
+    assert command == Command("search_deal", {"deal_name": "Acme"}, "@bot find deal Acme")
+
+
+def test_render_parses_back(router):
+    command = router.parse("@bot add contact Jane Doe company Acme Ltd")
+    assert router.render(command) == "@bot add contact Jane Doe company Acme Ltd"
+    assert router.parse(router.render(command)) == command
@@ -0,0 +1,109 @@
+import json
+
+import pytest
+
+from crm_outbox import CRMOutbox
+
+
+class Response:
+    def __init__(self, status_code=200, data=None):
+        self.status_code = status_code
+        self._body = {"data": data} if data is not None else {}
+        self.content = json.dumps(self._body).encode()
+        self.text = self.content.decode()
+
+    def json(self):
+        return self._body
+
+
+class FakeZoho:
+    # Answers every record with `code`; `during` runs while a request is "in flight".
+    def __init__(self, code="SUCCESS", status_code=200, during=None):
+        self.code = code
+        self.status_code = status_code
+        self.during = during
+        self.requests = []
+
+    def _answer(self, path, json):
+        self.requests.append((path, json["data"]))
+        if self.during:
+            during, self.during = self.during, None
+            during()
+        return Response(self.status_code, [{"code": self.code, "message": self.code} for _ in json["data"]])
+
+    def put(self, path, json):
+        return self._answer(path, json)
+
+    def post(self, path, json):
+        return self._answer(path, json)
+
+
+@pytest.fixture
+def failures():
+    return []
+
+
+def make_outbox(tmp_path, zoho, failures, **kwargs):
+    return CRMOutbox(str(tmp_path / "outbox.db"), zoho, on_failure=lambda entry, reason: failures.append(
+        (entry["deal_id"], entry["payload"].get("Stage"), reason)), **kwargs)
+
+
+def test_stage_updates_to_one_deal_coalesce(tmp_path, failures):
+    zoho = FakeZoho()
+    outbox = make_outbox(tmp_path, zoho, failures)
+    outbox.update_stage("1", "Filtration")
+    outbox.update_stage("1", "On Hold")
+    outbox.add_note("1", "called them")
+    assert outbox.flush() == 2
+    assert zoho.requests == [("/Deals", [{"id": "1", "Stage": "On Hold"}]),
+                             ("/Notes", [{"Parent_Id": "1", "se_module": "Deals", "Note_Title": "Bot Note",
+                                          "Note_Content": "called them"}])]
+    assert outbox.stats()["depth"] == 0
+    assert outbox.stats()["coalesced"] == 1
+
+
+def test_rejected_write_is_reported_once(tmp_path, failures):
+    outbox = make_outbox(tmp_path, FakeZoho(code="INVALID_DATA"), failures)
+    outbox.update_stage("1", "Nonsense")
+    outbox.flush()
+    assert failures == [("1", "Nonsense", "INVALID_DATA")]
+    assert outbox.stats()["depth"] == 0
+    assert outbox.stats()["failed"] == 1
+
+
+def test_rejected_write_superseded_in_flight_is_not_reported(tmp_path, failures):
+    zoho = FakeZoho(code="INVALID_DATA")
+    outbox = make_outbox(tmp_path, zoho, failures)
+    outbox.update_stage("1", "Nonsense")
+    zoho.during = lambda: outbox.update_stage("1", "On Hold")
+    outbox.flush()
+    assert failures == []
+    assert outbox.stats()["failed"] == 0
+
+    zoho.code = "SUCCESS"
+    outbox.flush()
+    assert zoho.requests[-1] == ("/Deals", [{"id": "1", "Stage": "On Hold"}])
+    assert outbox.stats()["depth"] == 0
+
+
+def test_outage_is_retried_and_newer_version_skips_the_backoff(tmp_path, failures):
+    zoho = FakeZoho(status_code=503)
+    outbox = make_outbox(tmp_path, zoho, failures, backoff_base=60)
+    outbox.update_stage("1", "Filtration")
+    outbox.flush()
+    assert outbox.stats()["retrying"] == 1
+    assert outbox.flush() == 0  # backing off
+
+    outbox.update_stage("1", "On Hold")
+    zoho.status_code = 200
+    assert outbox.flush() == 1
+    assert zoho.requests[-1] == ("/Deals", [{"id": "1", "Stage": "On Hold"}])
+    assert failures == []
+
+
+def test_gives_up_after_max_attempts(tmp_path, failures):
+    outbox = make_outbox(tmp_path, FakeZoho(status_code=503), failures, max_attempts=1)
+    outbox.update_stage("1", "Filtration")
+    outbox.flush()
+    assert failures == [("1", "Filtration", failures[0][2])]
+    assert outbox.stats()["depth"] == 0
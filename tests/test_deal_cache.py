@@ -0,0 +1,54 @@
+import pytest
+
+import deal_cache
+from deal_cache import DealIdCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    state = {"now": 1000.0}
+    monkeypatch.setattr(deal_cache.time, "time", lambda: state["now"])
+    return state
+
+
+def test_lookup_is_exact_after_normalizing():
+    cache = DealIdCache()
+    cache.put("Gulf Logistics Q3", "111")
+    assert cache.lookup("  gulf   logistics q3 ") == ("111", "Gulf Logistics Q3")
+    assert cache.lookup("Gulf Logistics Q4") is None
+
+
+def test_closest_suggests_a_single_near_match():
+    cache = DealIdCache()
+    cache.put("Gulf Logistics Q3", "111")
+    assert cache.closest("Gulf Logistcs Q3") == ("111", "Gulf Logistics Q3")
+    assert cache.closest("Gulf Logistics Q3") is None
+    assert cache.closest("Desert Foods") is None
+
+
+def test_closest_gives_up_when_ambiguous():
+    cache = DealIdCache()
+    cache.put("Gulf Logistics Q3", "111")
+    cache.put("Gulf Logistics Q4", "222")
+    assert cache.closest("Gulf Logistics Q5") is None
+
+
+def test_rename_replaces_the_old_name():
+    cache = DealIdCache()
+    cache.put("Gulf Logistics", "111")
+    cache.put("Gulf Logistics FZE", "111")
+    assert cache.lookup("Gulf Logistics") is None
+    assert cache.lookup("Gulf Logistics FZE") == ("111", "Gulf Logistics FZE")
+    cache.invalidate_id("111")
+    assert cache.lookup("Gulf Logistics FZE") is None
+
+
+def test_expiry_and_size_cap(clock):
+    cache = DealIdCache(max_size=2, ttl=60)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.put("c", "3")
+    assert cache.lookup("a") is None
+    clock["now"] += 61
+    assert cache.lookup("b") is None
+    assert cache.stats()["size"] == 1
@@ -0,0 +1,79 @@
+import pytest
+
+import http_clients
+from http_clients import ZohoClient
+from zoho_limits import ZohoUnavailable
+
+
+class Token:
+    def get_token(self):
+        return "token"
+
+    def invalidate(self, token):
+        pass
+
+
+class Response:
+    def __init__(self, status_code, retry_after=None):
+        self.status_code = status_code
+        self.headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+
+    def json(self):
+        return {}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Fake monotonic time; sleeps advance it and the ones that wait at all are recorded.
+    state = {"now": 1000.0, "slept": []}
+
+    def sleep(seconds):
+        if seconds > 0:
+            state["slept"].append(round(seconds, 3))
+            state["now"] += seconds
+
+    monkeypatch.setattr(http_clients.time, "monotonic", lambda: state["now"])
+    monkeypatch.setattr(http_clients.time, "sleep", sleep)
+    return state
+
+
+def make_client(responses, **kwargs):
+    client = ZohoClient(Token(), max_retries=3, backoff_max=8.0, **kwargs)
+    answers = iter(responses)
+    client.session.request = lambda *args, **kw: next(answers)
+    return client
+
+
+def test_throttled_retry_waits_out_the_cool_down_once(clock):
+    client = make_client([Response(429, retry_after=3), Response(200)])
+    assert client.get("/Deals").status_code == 200
+    assert clock["slept"] == [3.0]  # the cool-down, no backoff on top
+    assert client.throttled == 1
+    assert client.breaker.failures == 0
+
+
+def test_throttled_retry_without_retry_after_sleeps_once(clock):
+    client = make_client([Response(429), Response(200)])
+    client.backoff = lambda attempt, response=None: 1.5 if attempt == 2 else 0.4
+    assert client.get("/Deals").status_code == 200
+    assert clock["slept"] == [1.5]
+
+
+def test_long_cool_down_fails_fast_without_opening_the_breaker(clock):
+    client = make_client([Response(429, retry_after=60)] * 10)
+    with pytest.raises(ZohoUnavailable):
+        client.get("/Deals")
+    assert clock["slept"] == []
+    assert client.throttled == 1
+    assert client.breaker.state == "closed"
+    for _ in range(10):
+        with pytest.raises(ZohoUnavailable):
+            client.get("/Deals")
+    assert client.breaker.state == "closed"
+
+
+def test_server_errors_still_back_off_and_count_as_failures(clock):
+    client = make_client([Response(503)] * 4)
+    assert client.get("/Deals").status_code == 503
+    assert len(clock["slept"]) == 3
+    assert client.breaker.failures == 4
@@ -0,0 +1,49 @@
+import pytest
+
+import llm_cache
+from llm_cache import LLMResponseCache, SQLiteLLMCacheBackend, cache_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    state = {"now": 1000.0}
+    monkeypatch.setattr(llm_cache.time, "time", lambda: state["now"])
+    return state
+
+
+def test_key_ignores_case_spacing_and_trailing_punctuation():
+    key = cache_key("How do I add a contact??", "gpt-4", "system", 0.2)
+    assert cache_key("  how do i  add a contact", "gpt-4", "system", 0.2) == key
+    assert cache_key("How do I add a contact", "gpt-3.5-turbo", "system", 0.2) != key
+    assert cache_key("How do I add a contact", "gpt-4", "system", 0.7) != key
+
+
+def test_hit_miss_and_expiry(clock):
+    cache = LLMResponseCache(max_entries=10, ttl=60)
+    assert cache.get("k") is None
+    cache.put("k", "reply")
+    assert cache.get("k") == "reply"
+    clock["now"] += 61
+    assert cache.get("k") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 2, 0)
+
+
+def test_least_recently_used_goes_first(clock):
+    cache = LLMResponseCache(max_entries=2, ttl=60)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    cache.get("a")
+    cache.put("c", "C")
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == ("A", None, "C")
+
+
+def test_shared_backend_fills_other_workers(tmp_path, clock):
+    path = str(tmp_path / "llm.db")
+    first = LLMResponseCache(ttl=60, backend=SQLiteLLMCacheBackend(path))
+    second = LLMResponseCache(ttl=60, backend=SQLiteLLMCacheBackend(path))
+    first.put("k", "reply")
+    assert second.get("k") == "reply"
+    assert second.stats()["size"] == 1
+    clock["now"] += 61
+    assert LLMResponseCache(ttl=60, backend=SQLiteLLMCacheBackend(path)).get("k") is None
@@ -0,0 +1,104 @@
+import pytest
+
+import state_store
+from fake_upstreams import FakeRedis
+from state_store import MemoryStateStore, RedisStateStore, RESPClient, RESPError, SQLiteStateStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # The memory and sqlite backends read time.time(); FakeRedis is handed the same clock.
+    clock = Clock()
+    monkeypatch.setattr(state_store.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def redis(clock):
+    server = FakeRedis(clock=clock).start()
+    yield server
+    server.stop()
+
+
+def redis_client(server, **kwargs):
+    host, port = server._server.server_address[:2]
+    return RESPClient(host=host, port=port, **kwargs)
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def store(request, tmp_path, clock):
+    if request.param == "memory":
+        return MemoryStateStore(ttl=60)
+    if request.param == "sqlite":
+        return SQLiteStateStore(str(tmp_path / "state.db"), ttl=60)
+    return RedisStateStore(redis_client(request.getfixturevalue("redis")), ttl=60)
+
+
+def test_set_get_delete(store):
+    assert store.get("whatsapp:+1") is None
+    store.set("whatsapp:+1", {"flow": "create_deal", "deal": {"Deal_Name": "Gulf Logistics"}})
+    assert store.get("whatsapp:+1") == {"flow": "create_deal", "deal": {"Deal_Name": "Gulf Logistics"}}
+    store.delete("whatsapp:+1")
+    assert store.get("whatsapp:+1") is None
+
+
+def test_pop_returns_value_once(store):
+    store.set("whatsapp:+1", {"flow": "create_deal"})
+    assert store.pop("whatsapp:+1") == {"flow": "create_deal"}
+    assert store.pop("whatsapp:+1") is None
+    assert store.get("whatsapp:+1") is None
+
+
+def test_entries_expire(store, clock):
+    store.set("default", {"step": 1})
+    store.set("short", {"step": 2}, ttl=5)
+    clock.now += 6
+    assert store.get("short") is None
+    assert store.pop("short") is None
+    assert store.get("default") == {"step": 1}
+    clock.now += 60
+    assert store.get("default") is None
+
+
+def test_redis_sets_ttl_and_prefix(redis):
+    client = redis_client(redis)
+    RedisStateStore(client, ttl=900).set("whatsapp:+1", {"flow": "create_deal"}, ttl=30)
+    assert client.execute("TTL", "hfs-bot:state:whatsapp:+1") == 30
+    assert client.execute("GET", "whatsapp:+1") is None
+
+
+def test_redis_pop_is_one_transaction(redis):
+    store = RedisStateStore(redis_client(redis))
+    store.set("whatsapp:+1", {"flow": "create_deal"})
+    redis.calls.clear()
+    store.pop("whatsapp:+1")
+    assert redis.calls == {"MULTI": 1, "GET": 1, "DEL": 1, "EXEC": 1}
+
+
+def test_redis_auth_and_db(clock):
+    server = FakeRedis(password="s3cret", clock=clock).start()
+    try:
+        with pytest.raises(RESPError, match="NOAUTH"):
+            redis_client(server).execute("GET", "k")
+        store = RedisStateStore(redis_client(server, password="s3cret", db=2))
+        store.set("k", {"v": 1})
+        assert store.get("k") == {"v": 1}
+        assert server.dbs[2]["hfs-bot:state:k"][0] == '{"v": 1}'
+    finally:
+        server.stop()
+
+
+def test_redis_client_reconnects_after_drop(redis):
+    client = redis_client(redis)
+    store = RedisStateStore(client)
+    store.set("k", {"v": 1})
+    client._local.sock.close()
+    assert store.get("k") == {"v": 1}
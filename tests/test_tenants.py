@@ -0,0 +1,87 @@
+import json
+
+from tenants import TenantConfig, TenantRegistry, load_tenant_configs
+
+
+def write_tenants(tmp_path, entries):
+    path = tmp_path / "tenants.json"
+    path.write_text(json.dumps(entries))
+    return str(path)
+
+
+def test_export_token_is_not_inherited_from_the_default_tenant(tmp_path):
+    default = TenantConfig(id="default", export_token="default-token", zoho_client_id="shared")
+    configs = load_tenant_configs(write_tenants(tmp_path, [
+        {"id": "leasing", "number": "whatsapp:+1555", "export_token": "leasing-token"},
+        {"id": "fleet", "number": "whatsapp:+1556"},
+    ]), default)
+    by_id = {c.id: c for c in configs}
+    assert by_id["leasing"].export_token == "leasing-token"
+    assert by_id["fleet"].export_token is None
+    assert by_id["fleet"].zoho_client_id == "shared"
+
+
+def test_export_token_picks_exactly_one_tenant():
+    default = TenantConfig(id="default", export_token="default-token")
+    leasing = TenantConfig(id="leasing", number="whatsapp:+1555", export_token="leasing-token")
+    fleet = TenantConfig(id="fleet", number="whatsapp:+1556")
+    registry = TenantRegistry(default, build=None, configs=[leasing, fleet])
+    assert registry.config_for_export_token("default-token") is default
+    assert registry.config_for_export_token("leasing-token") is leasing
+    assert registry.config_for_export_token("wrong") is None
+    assert registry.config_for_export_token("") is None
+    assert registry.config_for_export_token(None) is None
+
+
+def test_no_token_configured_opens_nothing():
+    registry = TenantRegistry(TenantConfig(id="default"), build=None)
+    assert registry.config_for_export_token("anything") is None
+
+
+class Resource:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_registry(max_active=1):
+    from tenants import Tenant
+
+    configs = [TenantConfig(id=f"t{i}", number=f"whatsapp:+1{i}") for i in range(3)]
+    registry = TenantRegistry(TenantConfig(id="default"), lambda config: Tenant(config, outbound=Resource()),
+                              configs=configs, max_active=max_active)
+    registry._close = lambda tenant: tenant.close()  # synchronously, for the asserts
+    return registry, configs
+
+
+def test_tenant_in_use_is_not_evicted():
+    registry, (a, b, _) = make_registry(max_active=1)
+    with registry.use(a) as tenant_a:
+        tenant_b = registry.get(b)
+        assert not tenant_b.outbound.closed  # just built for the caller
+        assert registry.evict() == 1
+        assert tenant_b.outbound.closed and not tenant_a.outbound.closed
+        assert [t.id for t in registry.active()] == ["t0"]
+
+
+def test_released_tenant_is_evicted_and_closed():
+    registry, (a, b, c) = make_registry(max_active=1)
+    with registry.use(a) as tenant_a:
+        pass
+    registry.get(b)
+    registry.get(c)
+    assert tenant_a.outbound.closed
+    assert registry.stats()["in_use"] == 0
+
+
+def test_retain_keeps_a_tenant_for_a_background_reply():
+    registry, (a, b, _) = make_registry(max_active=1)
+    with registry.use(a) as tenant_a:
+        registry.retain(tenant_a)
+    registry.get(b)
+    assert not tenant_a.outbound.closed
+    registry.release(tenant_a)
+    registry.evict()
+    assert tenant_a.outbound.closed
@@ -0,0 +1,63 @@
+import pytest
+
+import webhook_dedup
+from webhook_dedup import DONE, NEW, PROCESSING, MemoryDeliveryLog, SQLiteDeliveryLog
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    state = {"now": 1000.0}
+    monkeypatch.setattr(webhook_dedup.time, "time", lambda: state["now"])
+    return state
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def log(request, tmp_path, clock):
+    if request.param == "memory":
+        return MemoryDeliveryLog(ttl=3600, processing_timeout=300)
+    return SQLiteDeliveryLog(str(tmp_path / "dedup.db"), ttl=3600, processing_timeout=300)
+
+
+def test_retry_while_processing_then_done(log):
+    assert log.claim("SM1") == NEW
+    assert log.claim("SM1") == PROCESSING
+    log.complete("SM1")
+    assert log.claim("SM1") == DONE
+    assert log.claim("SM2") == NEW
+    stats = log.stats()
+    assert (stats["processing"], stats["done"], stats["duplicates"]) == (1, 1, 2)
+
+
+def test_release_lets_the_retry_run(log):
+    assert log.claim("SM1") == NEW
+    log.release("SM1")
+    assert log.claim("SM1") == NEW
+
+
+def test_release_keeps_a_completed_delivery(log):
+    log.claim("SM1")
+    log.complete("SM1")
+    log.release("SM1")
+    assert log.claim("SM1") == DONE
+
+
+def test_stalled_claim_expires(log, clock):
+    assert log.claim("SM1") == NEW
+    clock["now"] += 301
+    assert log.claim("SM1") == NEW
+
+
+def test_done_expires_after_ttl(log, clock):
+    log.claim("SM1")
+    log.complete("SM1")
+    clock["now"] += 3599
+    assert log.claim("SM1") == DONE
+    clock["now"] += 2
+    assert log.claim("SM1") == NEW
+
+
+def test_sqlite_log_is_shared(tmp_path, clock):
+    path = str(tmp_path / "dedup.db")
+    first, second = SQLiteDeliveryLog(path), SQLiteDeliveryLog(path)
+    assert first.claim("SM1") == NEW
+    assert second.claim("SM1") == PROCESSING
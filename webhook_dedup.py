@@ -0,0 +1,153 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# claim() outcomes
+NEW = "new"                # first delivery: the caller owns it and must call complete() or release()
+PROCESSING = "processing"  # a retry while the first delivery is still being handled
+DONE = "done"              # a retry of a message that was already handled
+
+
+# ---------------- In-Memory ----------------
+class MemoryDeliveryLog:
+    # Recently seen Twilio MessageSids, per process. Oldest entries go first once max_entries is hit.
+    def __init__(self, ttl=3600, processing_timeout=300, max_entries=50000):
+        self.ttl = ttl
+        # A claim that isn't completed in this time (crashed worker) lets the next retry run the message.
+        self.processing_timeout = processing_timeout
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # sid -> (state, expires_at)
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    def claim(self, sid):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry and entry[1] > now:
+                self.duplicates += 1
+                return entry[0]
+            self._entries[sid] = (PROCESSING, now + self.processing_timeout)
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return NEW
+
+    def complete(self, sid):
+        with self._lock:
+            self._entries[sid] = (DONE, time.time() + self.ttl)
+            self._entries.move_to_end(sid)
+
+    def release(self, sid):
+        # The delivery failed before doing anything useful; let Twilio's retry run it.
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry and entry[0] == PROCESSING:
+                del self._entries[sid]
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            live = [state for state, expires_at in self._entries.values() if expires_at > now]
+            duplicates = self.duplicates
+        return {"backend": "memory", "processing": live.count(PROCESSING), "done": live.count(DONE),
+                "duplicates": duplicates}
+
+
+# ---------------- SQLite (shared by workers) ----------------
+class SQLiteDeliveryLog:
+    def __init__(self, path, ttl=3600, processing_timeout=300, max_entries=50000):
+        self.path = path
+        self.ttl = ttl
+        self.processing_timeout = processing_timeout
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.duplicates = 0
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS webhook_deliveries ("
+            "sid TEXT PRIMARY KEY, state TEXT NOT NULL, expires_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def claim(self, sid):
+        # BEGIN IMMEDIATE so two workers receiving the same retry can't both claim it.
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT state FROM webhook_deliveries WHERE sid = ? AND expires_at > ?", (sid, now)
+            ).fetchone()
+            if row is None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO webhook_deliveries (sid, state, expires_at, updated_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (sid, PROCESSING, now + self.processing_timeout, now),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if row:
+            with self._lock:
+                self.duplicates += 1
+            return row[0]
+        self._prune(conn, now)
+        return NEW
+
+    def _prune(self, conn, now):
+        with self._lock:
+            self._writes += 1
+            due = self._writes % 100 == 0
+        if due:
+            conn.execute("DELETE FROM webhook_deliveries WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "DELETE FROM webhook_deliveries WHERE sid IN ("
+                "SELECT sid FROM webhook_deliveries ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def complete(self, sid):
+        now = time.time()
+        self._conn().execute(
+            "UPDATE webhook_deliveries SET state = ?, expires_at = ?, updated_at = ? WHERE sid = ?",
+            (DONE, now + self.ttl, now, sid),
+        )
+
+    def release(self, sid):
+        self._conn().execute("DELETE FROM webhook_deliveries WHERE sid = ? AND state = ?", (sid, PROCESSING))
+
+    def stats(self):
+        rows = self._conn().execute(
+            "SELECT state, COUNT(*) FROM webhook_deliveries WHERE expires_at > ? GROUP BY state", (time.time(),)
+        ).fetchall()
+        counts = dict(rows)
+        with self._lock:
+            duplicates = self.duplicates
+        return {"backend": "sqlite", "processing": counts.get(PROCESSING, 0), "done": counts.get(DONE, 0),
+                "duplicates": duplicates}
+
+
+def delivery_log_from_env():
+    kind = os.environ.get("DEDUP_STORE", "memory").lower()
+    if kind == "off":
+        return None
+    ttl = int(os.environ.get("DEDUP_TTL", "3600"))
+    processing_timeout = int(os.environ.get("DEDUP_PROCESSING_TIMEOUT", "300"))
+    max_entries = int(os.environ.get("DEDUP_MAX_ENTRIES", "50000"))
+    if kind == "sqlite":
+        return SQLiteDeliveryLog(os.environ.get("DEDUP_STORE_PATH", "/tmp/hfs_bot_dedup.db"),
+                                 ttl, processing_timeout, max_entries)
+    return MemoryDeliveryLog(ttl, processing_timeout, max_entries)
@@ -0,0 +1,137 @@
+import math
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from urllib.parse import urlparse
+
+import requests
+
+
+class ZohoUnavailable(requests.RequestException):
+    # Raised instead of calling Zoho while the breaker is open or every request slot is busy.
+    # The text is shown to WhatsApp users as-is.
+    pass
+
+
+# ---------------- Credits ----------------
+def endpoint_class(method, url):
+    path = urlparse(url).path.lower()
+    if path.endswith("/coql"):
+        return "coql"
+    if "/search" in path:
+        return "search"
+    if "/notes" in path:
+        return "notes"
+    if "/settings/" in path:
+        return "metadata"
+    if method == "POST":
+        return "insert"
+    if method in ("PUT", "PATCH"):
+        return "update"
+    if method == "DELETE":
+        return "delete"
+    return "read"
+
+
+def credit_cost(cls, records=1):
+    # Zoho's published costs: writes are billed per 10 records, reads per 200, everything else 1.
+    records = max(records, 1)
+    if cls in ("insert", "update", "notes", "delete"):
+        return math.ceil(records / 10)
+    if cls in ("read", "coql"):
+        return math.ceil(records / 200)
+    return 1
+
+
+class CreditMeter:
+    # Per-minute buckets for the last 24 hours; enough to see burn rate and today's usage.
+    def __init__(self, daily_limit=None, keep_minutes=1440):
+        self.daily_limit = daily_limit
+        self.keep_minutes = keep_minutes
+        self._minutes = OrderedDict()  # minute -> {class: credits}
+        self._totals = defaultdict(int)
+        self._calls = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, cls, credits):
+        minute = int(time.time() // 60)
+        with self._lock:
+            bucket = self._minutes.get(minute)
+            if bucket is None:
+                bucket = self._minutes[minute] = defaultdict(int)
+                while self._minutes and next(iter(self._minutes)) <= minute - self.keep_minutes:
+                    self._minutes.popitem(last=False)
+            bucket[cls] += credits
+            self._totals[cls] += credits
+            self._calls[cls] += 1
+
+    def used_since(self, seconds):
+        since = int((time.time() - seconds) // 60)
+        with self._lock:
+            return sum(sum(b.values()) for m, b in self._minutes.items() if m > since)
+
+    def stats(self):
+        last_15m = self.used_since(900)
+        last_24h = self.used_since(86400)
+        per_minute = last_15m / 15
+        with self._lock:
+            totals, calls = dict(self._totals), dict(self._calls)
+        stats = {
+            "credits_by_class": totals,
+            "calls_by_class": calls,
+            "last_hour": self.used_since(3600),
+            "last_24h": last_24h,
+            "burn_per_minute": round(per_minute, 2),
+            "projected_daily": round(per_minute * 1440),
+        }
+        if self.daily_limit:
+            stats["daily_limit"] = self.daily_limit
+            stats["remaining_24h"] = max(self.daily_limit - last_24h, 0)
+        return stats
+
+
+# ---------------- Circuit Breaker ----------------
+class CircuitBreaker:
+    # closed -> open after `failure_threshold` failures in a row; after `reset_timeout` one trial
+    # request is let through (half-open) and its result closes or re-opens the circuit.
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0
+        self.opens = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.opens += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures, "opens": self.opens}
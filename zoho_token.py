@@ -0,0 +1,245 @@
+import fcntl
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+log = logging.getLogger(__name__)
+
+
+# ---------------- Token Cache Backends ----------------
+class MemoryTokenBackend:
+    # Per-process only: every gunicorn worker keeps its own copy.
+    def __init__(self):
+        self._entry = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        return self._entry
+
+    def store(self, access_token, expires_at):
+        self._entry = (access_token, expires_at)
+
+    def clear(self, access_token=None):
+        if access_token is None or (self._entry and self._entry[0] == access_token):
+            self._entry = None
+
+    @contextmanager
+    def refresh_lock(self):
+        with self._lock:
+            yield
+
+
+class FileTokenBackend:
+    # JSON file shared by all workers on the host, guarded by an flock'd sidecar.
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = path + ".lock"
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            return data["access_token"], float(data["expires_at"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def store(self, access_token, expires_at):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"access_token": access_token, "expires_at": expires_at}, f)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, self.path)
+
+    def clear(self, access_token=None):
+        entry = self.load()
+        if entry and (access_token is None or entry[0] == access_token):
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    @contextmanager
+    def refresh_lock(self):
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class SQLiteTokenBackend:
+    # Single-row table; BEGIN IMMEDIATE serialises refreshes across workers.
+    def __init__(self, path, key="default"):
+        self.path = path
+        self.key = key
+        self._local = threading.local()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS zoho_token ("
+                "key TEXT PRIMARY KEY, access_token TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @contextmanager
+    def _conn(self):
+        # Reuse the connection holding the refresh lock, otherwise we'd block on ourselves.
+        locked = getattr(self._local, "conn", None)
+        if locked is not None:
+            yield locked
+            return
+        conn = self._connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def load(self):
+        with self._conn() as conn:
+            row = conn.execute(
+                "SELECT access_token, expires_at FROM zoho_token WHERE key = ?", (self.key,)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def store(self, access_token, expires_at):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO zoho_token (key, access_token, expires_at) VALUES (?, ?, ?)",
+                (self.key, access_token, expires_at),
+            )
+
+    def clear(self, access_token=None):
+        with self._conn() as conn:
+            if access_token is None:
+                conn.execute("DELETE FROM zoho_token WHERE key = ?", (self.key,))
+            else:
+                conn.execute(
+                    "DELETE FROM zoho_token WHERE key = ? AND access_token = ?",
+                    (self.key, access_token),
+                )
+
+    @contextmanager
+    def refresh_lock(self):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            self._local.conn = conn
+            try:
+                yield
+            finally:
+                self._local.conn = None
+                conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+
+def token_backend_from_env(key="default"):
+    # `key` keeps the tokens of different Zoho orgs (tenants) apart in a shared file or database.
+    kind = os.environ.get("ZOHO_TOKEN_BACKEND", "memory").lower()
+    path = os.environ.get("ZOHO_TOKEN_CACHE_PATH")
+    if kind == "file":
+        path = path or "/tmp/zoho_token.json"
+        if key != "default":
+            root, ext = os.path.splitext(path)
+            path = f"{root}.{key}{ext}"
+        return FileTokenBackend(path)
+    if kind == "sqlite":
+        return SQLiteTokenBackend(path or "/tmp/zoho_token.db", key=key)
+    return MemoryTokenBackend()
+
+
+# ---------------- Token Manager ----------------
+class ZohoTokenManager:
+    def __init__(self, client_id, client_secret, refresh_token, backend=None,
+                 accounts_url="https://accounts.zoho.com", refresh_margin=300,
+                 failure_backoff=10):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.refresh_token = refresh_token
+        self.backend = backend or MemoryTokenBackend()
+        self.accounts_url = accounts_url.rstrip("/")
+        # Treat the token as expired this many seconds early so in-flight calls don't race expiry.
+        self.refresh_margin = refresh_margin
+        # After a failed refresh, don't hammer Zoho again for this long.
+        self.failure_backoff = failure_backoff
+        self._entry = None
+        self._lock = threading.Lock()
+        self._last_failure = 0.0
+        self.refresh_count = 0
+
+    def _usable(self, entry):
+        return entry is not None and entry[1] - self.refresh_margin > time.time()
+
+    def get_token(self):
+        entry = self._entry
+        if self._usable(entry):
+            return entry[0]
+
+        # Only one thread per process refreshes; the rest wait and reuse its result.
+        with self._lock:
+            entry = self._entry
+            if self._usable(entry):
+                return entry[0]
+
+            entry = self.backend.load()
+            if self._usable(entry):
+                self._entry = entry
+                return entry[0]
+
+            if time.time() - self._last_failure < self.failure_backoff:
+                return None
+
+            # Across workers, the backend lock makes sure only one of them calls Zoho.
+            with self.backend.refresh_lock():
+                entry = self.backend.load()
+                if not self._usable(entry):
+                    entry = self._refresh()
+                    if entry is None:
+                        self._last_failure = time.time()
+                        return None
+                    self.backend.store(*entry)
+                self._entry = entry
+                return entry[0]
+
+    def invalidate(self, access_token):
+        # Only drop the token if nobody has replaced it already.
+        with self._lock:
+            if self._entry and self._entry[0] == access_token:
+                self._entry = None
+            self.backend.clear(access_token)
+
+    def _refresh(self):
+        params = {
+            "refresh_token": self.refresh_token,
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "grant_type": "refresh_token"
+        }
+        try:
+            response = requests.post(f"{self.accounts_url}/oauth/v2/token", params=params, timeout=10)
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            log.error("zoho token refresh failed", extra={"error": str(e)})
+            return None
+
+        access_token = data.get("access_token")
+        if not access_token:
+            log.error("zoho token refresh rejected", extra={"error": data.get("error")})
+            return None
+
+        self.refresh_count += 1
+        expires_in = int(data.get("expires_in", 3600))
+        return access_token, time.time() + expires_in
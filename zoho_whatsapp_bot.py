@@ -1,16 +1,44 @@
-from flask import Flask, request
-import requests
+from flask import Blueprint, Flask, Response, current_app, request
+import codecs
+import contextvars
 import json
+import logging
 import os
+import threading
+import time
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
-from openai import OpenAI
 import urllib.parse
+from dataclasses import replace
+from bulk_import import ContactImporter, format_summary, parse_rows, parse_text_lines
+from command_router import Command, CommandRouter
+from crm_find import FIND_MODULES, UnifiedSearch
+from crm_export import EXPORT_FORMATS, EXPORT_MODULES, export_chunks, parse_fields, parse_modified_since
+from crm_mirror import CRMMirror, record_name
+from crm_outbox import CRMOutbox
+from deal_cache import DealIdCache
+from dispatch import KeyedDispatcher
+from llm_hedge import HedgedLLM
+from llm_cache import LLMResponseCache, SQLiteLLMCacheBackend, cache_key
+from outbound import OutboundDelivery, TokenBucket
+from picklists import DealPicklists, parse_deal_fields
+from pipeline_summary import PipelineSummary, format_pipeline_summary
+from state_store import state_store_from_env
+from tenants import DEFAULT_TENANT_ID, Tenant, TenantConfig, TenantRegistry, TenantScopedStore, load_tenant_configs
+from tenants import current_tenant, tenant_context
+from webhook_dedup import NEW, delivery_log_from_env
+from telemetry import configure_logging, command_context, current_command, metrics, set_command, span
+from http_clients import LazyClient, ZohoClient, TwilioClient, build_openai_client
+from intent_classifier import WRITE_COMMANDS, IntentClassifier
+from zoho_limits import CircuitBreaker, CreditMeter, ZohoUnavailable
+from zoho_token import ZohoTokenManager, token_backend_from_env
 
 
 # Load .env file
 load_dotenv()
-app = Flask(__name__)
+log = logging.getLogger(__name__)
+# Routes are registered on this blueprint; create_app() builds the Flask app around it.
+bot = Blueprint("bot", __name__)
 
 # ---------------- Zoho API Credentials ----------------
 ZOHO_CLIENT_ID = os.environ.get("ZOHO_CLIENT_ID")
@@ -21,8 +49,47 @@ TWILIO_ACCOUNT_SID = os.environ.get("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.environ.get("TWILIO_AUTH_TOKEN")
 TWILIO_NUMBER = os.environ.get("TWILIO_NUMBER")
 
-# ---------------- Pending Confirmations ----------------
-pending_deal_confirmations = {}
+# ---------------- Upstream Base URLs ----------------
+ZOHO_ACCOUNTS_URL = os.environ.get("ZOHO_ACCOUNTS_URL", "https://accounts.zoho.com")
+ZOHO_API_BASE = os.environ.get("ZOHO_API_BASE", "https://www.zohoapis.com/crm/v2")
+TWILIO_API_BASE = os.environ.get("TWILIO_API_BASE", "https://api.twilio.com/2010-04-01")
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL")
+
+# ---------------- Tenants ----------------
+# Each business unit writes to its own Twilio number and has its own Zoho org, token, HTTP pools,
+# picklists and rate budgets (see build_tenant). The settings above are the default tenant;
+# TENANTS_FILE lists the others. Messages to an unknown number go to the default tenant.
+DEFAULT_TENANT = TenantConfig(
+    id=DEFAULT_TENANT_ID,
+    number=TWILIO_NUMBER,
+    zoho_client_id=ZOHO_CLIENT_ID,
+    zoho_client_secret=ZOHO_CLIENT_SECRET,
+    zoho_refresh_token=ZOHO_REFRESH_TOKEN,
+    zoho_accounts_url=ZOHO_ACCOUNTS_URL,
+    zoho_api_base=ZOHO_API_BASE,
+    zoho_max_in_flight=int(os.environ.get("ZOHO_MAX_IN_FLIGHT", "5")),
+    zoho_daily_credits=int(os.environ.get("ZOHO_DAILY_CREDITS", "0")),
+    twilio_account_sid=TWILIO_ACCOUNT_SID,
+    twilio_auth_token=TWILIO_AUTH_TOKEN,
+    outbound_rate=float(os.environ.get("OUTBOUND_GLOBAL_RATE", "20")),
+    outbound_burst=int(os.environ.get("OUTBOUND_GLOBAL_BURST", "20")),
+    llm_per_minute=float(os.environ.get("TENANT_LLM_PER_MINUTE", "0")),
+    export_token=os.environ.get("EXPORT_TOKEN") or None
+)
+TENANTS_FILE = os.environ.get("TENANTS_FILE")
+# Tenants are built on their first message; idle ones are closed LRU and rebuilt when needed again.
+tenants = TenantRegistry(
+    DEFAULT_TENANT,
+    lambda config: build_tenant(config),
+    configs=load_tenant_configs(TENANTS_FILE, DEFAULT_TENANT) if TENANTS_FILE else (),
+    max_active=int(os.environ.get("TENANT_MAX_ACTIVE", "32")),
+    idle_ttl=int(os.environ.get("TENANT_IDLE_TTL", "1800"))
+)
+
+# ---------------- Conversation State ----------------
+# Multi-step flows keyed by sender, e.g. {"flow": "create_deal", "data": {...}} while a preview awaits yes/no.
+# Entries expire after STATE_TTL; use STATE_STORE=sqlite|redis so every worker sees the same state.
+conversation_state = TenantScopedStore(state_store_from_env())
 # ---------------- Available Bot Commands ----------------
 BOT_COMMANDS = [
     {"command": "@bot add contact [Full Name] company [Company Name]", "description": "Add a new contact to Zoho CRM"},
@@ -32,17 +99,34 @@ BOT_COMMANDS = [
     {"command": "@bot search deal [Deal Name]", "description": "Search for a deal by name"},
     {"command": "@bot search account [Account Name]", "description": "Search for an account by name"},
     {"command": "@bot search contact [Contact Name]", "description": "Search for a contact by name"},
+    {"command": "@bot find [Text]", "description": "Search contacts, deals and accounts at once"},
+    {"command": "@bot pipeline summary [Pipeline]", "description": "Deals and total amount per stage, and deals closing this week; leave out the pipeline for all of them"},
+    {"command": "@bot import contacts [Contacts]", "description": "Add many contacts at once: one 'Name, Company' per line, or attach a CSV/vCard"},
     {"command": "@bot help", "description": "Show this help menu"},
 ]
+# Follow-up replies to a bot prompt; these are accepted with or without `@bot`.
+FOLLOW_UP_COMMANDS = [
+    {"command": "deal name [Deal Name] account [Account Name] stage [Stage Name] pipeline [Pipeline Name]", "name": "deal_details"},
+    {"command": "yes", "name": "confirm"},
+    {"command": "no", "name": "cancel"},
+]
+# Alternative spellings that aren't listed in help; "@bot find deal X" is the same as "@bot search deal X".
+COMMAND_ALIASES = [
+    {"command": "@bot find deal [Deal Name]", "name": "search_deal"},
+    {"command": "@bot find contact [Contact Name]", "name": "search_contact"},
+    {"command": "@bot find account [Account Name]", "name": "search_account"},
+]
+command_router = CommandRouter(BOT_COMMANDS + FOLLOW_UP_COMMANDS + COMMAND_ALIASES)
 # ---------------- Allowed Dropdown Values ----------------
-ALLOWED_PIPELINES = [
+# Loaded from Zoho's Deals field metadata (see deal_picklists); these are only used until the first load.
+DEFAULT_PIPELINES = [
     "Standard(Standard)",
     "HFS - CX pipeline",
     "HFS - Altalease",
     "Moneste"
 ]
 
-ALLOWED_STAGES = [
+DEFAULT_STAGES = [
     "HFS Initial Email and Engagement",
     "HFS Filtration",
     "HFS Prelimary Data Collection",
@@ -66,31 +150,52 @@ ALLOWED_STAGES = [
     "Current KPIs not fit"
 ]
 
-def validate_dropdown(value, allowed_list):
-    for option in allowed_list:
-        if value.strip().lower() == option.lower():
-            return option
-    return None
+def fetch_deal_picklists(zoho_client):
+    # Stage and Pipeline options, and the stages each pipeline allows, as currently configured in Zoho.
+    response = zoho_client.get("/settings/fields?module=Deals")
+    response.raise_for_status()
+    return parse_deal_fields(response.json())
+
+# Per tenant, since every Zoho org has its own stages (see build_tenant).
+deal_picklists = tenants.bound("picklists")
+
+# Decides which messages without `@bot` are really commands and can skip the LLM.
+intent_classifier = IntentClassifier(
+    command_router,
+    deal_picklists,
+    threshold=float(os.environ.get("INTENT_THRESHOLD", "0.8"))
+)
 
 # ---------------- Get Zoho Access Token ----------------
+# Cached until shortly before `expires_in`; set ZOHO_TOKEN_BACKEND=file|sqlite to share it between workers.
+# This and the clients below stand for the current tenant's own instance, built on its first message.
+token_manager = tenants.bound("token_manager")
+
 def get_access_token():
-    url = "https://accounts.zoho.com/oauth/v2/token"
-    params = {
-        "refresh_token": ZOHO_REFRESH_TOKEN,
-        "client_id": ZOHO_CLIENT_ID,
-        "client_secret": ZOHO_CLIENT_SECRET,
-        "grant_type": "refresh_token"
-    }
-    response = requests.post(url, params=params)
-    return response.json().get("access_token")
+    return token_manager.get_token()
+
+# ---------------- Upstream Clients ----------------
+# Pooled keep-alive sessions with timeouts; auth and base URLs live in the client.
+# Zoho calls are also credit-metered, capped in flight and guarded by a circuit breaker.
+zoho = tenants.bound("zoho")
+twilio = tenants.bound("twilio")
+
+# ---------------- Local CRM Mirror ----------------
+# Optional SQLite/FTS5 copy of Contacts, Deals and Accounts used to answer `@bot search`.
+# Default tenant only; other tenants always search live.
+MIRROR_DB_PATH = os.environ.get("MIRROR_DB_PATH")
+default_mirror = None
+if MIRROR_DB_PATH:
+    default_mirror = CRMMirror(
+        MIRROR_DB_PATH,
+        zoho,
+        sync_interval=int(os.environ.get("MIRROR_SYNC_INTERVAL", "300")),
+        max_staleness=int(os.environ.get("MIRROR_MAX_STALENESS", "900"))
+    )
+mirror = tenants.bound("mirror")
 
 # ---------------- Add Contact ----------------
 def add_contact(name, company):
-    access_token = get_access_token()
-    headers = {
-        "Authorization": f"Zoho-oauthtoken {access_token}",
-        "Content-Type": "application/json"
-    }
     first_name = " ".join(name.split()[:-1])
     last_name = name.split()[-1]
 
@@ -101,16 +206,11 @@ def add_contact(name, company):
             "Account_Name": company
         }]
     }
-    response = requests.post("https://www.zohoapis.com/crm/v2/Contacts", headers=headers, json=data)
+    response = zoho.post("/Contacts", json=data)
     return response.json()
 
 # ---------------- Create Deal ----------------
 def create_deal(deal_name, account_name, stage, pipeline):
-    access_token = get_access_token()
-    headers = {
-        "Authorization": f"Zoho-oauthtoken {access_token}",
-        "Content-Type": "application/json"
-    }
     closing_date = (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%d")
 
     deal_data = {
@@ -122,30 +222,122 @@ def create_deal(deal_name, account_name, stage, pipeline):
             "Closing_Date": closing_date
         }]
     }
-    response = requests.post("https://www.zohoapis.com/crm/v2/Deals", headers=headers, json=deal_data)
-    return response.json()
+    response = zoho.post("/Deals", json=deal_data)
+    result = response.json()
+    for record in result.get("data", []):
+        deal_id = (record.get("details") or {}).get("id")
+        deal_id_cache.put(deal_name, deal_id)
+        pipeline_summary.apply(dict(deal_data["data"][0], id=deal_id))
+    return result
+
+# ---------------- Deal Name Resolution ----------------
+# Per tenant: two orgs can have deals with the same name.
+deal_id_cache = tenants.bound("deal_ids")
+
+def cache_deal_ids(deals):
+    for deal in deals:
+        deal_id_cache.put(deal.get("Deal_Name"), deal.get("id"))
+
+def resolve_deal(deal_name, use_cache=True):
+    # The deal named exactly `deal_name` (a close cached name is never taken, see suggest_deal).
+    # Returns (deal_id, resolved name, came from cache) or (None, None, False).
+    if use_cache:
+        cached = deal_id_cache.lookup(deal_name)
+        if cached:
+            return cached[0], cached[1], True
+
+    matches = zoho_search(f"/Deals/search?criteria=(Deal_Name:equals:{deal_name})")
+    if not matches:
+        return None, None, False
+    cache_deal_ids(matches)
+    return matches[0]["id"], matches[0].get("Deal_Name") or deal_name, False
+
+def is_missing_record_response(response):
+    if response.status_code == 404:
+        return True
+    try:
+        data = response.json()
+    except ValueError:
+        return False
+    entries = data.get("data") if isinstance(data.get("data"), list) else [data]
+    return any(entry.get("code") in ("INVALID_DATA", "INVALID_URL_PATTERN") for entry in entries)
+
+def write_to_deal(deal_name, write, deal_id=None):
+    # Runs write(deal_id) on the deal named `deal_name`, or on `deal_id` once the user has confirmed it.
+    # A cached ID Zoho no longer knows (deleted/merged deal) is resolved again once.
+    if deal_id:
+        response = write(deal_id)
+        if is_missing_record_response(response):
+            deal_id_cache.invalidate_id(deal_id)
+            return None, None
+        return response, deal_name
+    deal_id, resolved_name, from_cache = resolve_deal(deal_name)
+    if not deal_id:
+        return None, None
+    response = write(deal_id)
+    if from_cache and is_missing_record_response(response):
+        deal_id_cache.invalidate_id(deal_id)
+        deal_id, resolved_name, _ = resolve_deal(deal_name, use_cache=False)
+        if not deal_id:
+            return None, None
+        response = write(deal_id)
+    return response, resolved_name
+
+def suggest_deal(sender, deal_name, action):
+    # No deal is named exactly `deal_name`. A cached deal with a close name is offered instead, and only
+    # written to once the user replies yes (see handle_deal_suggestion). Returns the question, or None.
+    suggestion = deal_id_cache.closest(deal_name)
+    if not suggestion:
+        return None
+    deal_id, suggested_name = suggestion
+    conversation_state.set(sender, {
+        "flow": "confirm_deal",
+        "data": dict(action, deal_id=deal_id, deal_name=suggested_name)
+    })
+    return (f"❓ No deal is named *{deal_name}*. Did you mean *{suggested_name}*?\n\n"
+            "✅ Reply *yes* to use it or *no* to cancel.")
+
+def deal_not_found(sender, deal_name, action):
+    return (sender and suggest_deal(sender, deal_name, action)) or f"❌ No deal found with name: {deal_name}"
+
+# ---------------- Write-Behind Outbox ----------------
+# "direct" writes stage updates and notes inside the request; "outbox" acks at once and lets a
+# background flusher send them in batches, keeping only the latest stage per deal.
+CRM_WRITE_MODE = os.environ.get("CRM_WRITE_MODE", "direct").lower()
+
+def report_outbox_failure(entry, reason):
+    if entry["kind"] == "stage":
+        deal_id_cache.invalidate_id(entry["deal_id"])
+    if entry["sender"]:
+        deal_name = entry["payload"].get("deal_name") or entry["deal_id"]
+        what = "stage update" if entry["kind"] == "stage" else "note"
+        send_whatsapp_message(entry["sender"], f"⚠️ The {what} for deal *{deal_name}* could not be saved: {reason}")
+
+# Default tenant only; other tenants always write directly.
+default_outbox = None
+if CRM_WRITE_MODE == "outbox":
+    default_outbox = CRMOutbox(
+        os.environ.get("OUTBOX_PATH", "/tmp/hfs_bot_outbox.db"),
+        zoho,
+        flush_interval=float(os.environ.get("OUTBOX_FLUSH_INTERVAL", "2")),
+        max_attempts=int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "8")),
+        on_failure=report_outbox_failure
+    )
+outbox = tenants.bound("outbox")
 
 # ---------------- Add Note to Deal ----------------
-def add_note_to_deal(deal_name, note_text):
-    access_token = get_access_token()
-    headers = {"Authorization": f"Zoho-oauthtoken {access_token}"}
+def add_note_to_deal(deal_name, note_text, sender=None, deal_id=None):
+    # `deal_id` is a suggested deal the user confirmed; `deal_name` is then its name.
+    not_found = {"kind": "note", "note": note_text}
+    if outbox:
+        resolved_name = deal_name
+        if not deal_id:
+            deal_id, resolved_name, _ = resolve_deal(deal_name)
+        if not deal_id:
+            return deal_not_found(sender, deal_name, not_found)
+        outbox.add_note(deal_id, note_text, sender=sender, deal_name=resolved_name)
+        return f"✅ Note queued for deal *{resolved_name}*."
 
-    # Search for deal
-    search_url = f"https://www.zohoapis.com/crm/v2/Deals/search?criteria=(Deal_Name:equals:{deal_name})"
-    search_response = requests.get(search_url, headers=headers)
-    search_data = search_response.json()
-
-    if "data" not in search_data:
-        return f"❌ No deal found with name: {deal_name}"
-
-    deal_id = search_data["data"][0]["id"]
-
-    # Add the note
-    note_url = f"https://www.zohoapis.com/crm/v2/Deals/{deal_id}/Notes"
-    note_headers = {
-        "Authorization": f"Zoho-oauthtoken {access_token}",
-        "Content-Type": "application/json"
-    }
     note_payload = {
         "data": [
             {
@@ -154,440 +346,1107 @@ def add_note_to_deal(deal_name, note_text):
             }
         ]
     }
-    note_response = requests.post(note_url, headers=note_headers, json=note_payload)
-    return "✅ Note added to deal." if note_response.status_code == 201 else f"❌ Failed to add note: {note_response.text}"
+    note_response, resolved_name = write_to_deal(
+        deal_name, lambda deal_id: zoho.post(f"/Deals/{deal_id}/Notes", json=note_payload), deal_id=deal_id
+    )
+
+    if note_response is None:
+        return deal_not_found(sender, deal_name, not_found) if not deal_id else \
+            f"❌ Deal *{deal_name}* no longer exists in Zoho."
+    if note_response.status_code != 201:
+        return f"❌ Failed to add note: {note_response.text}"
+    return f"✅ Note added to deal *{resolved_name}*."
 # ---------------- LLM Helper ----------------
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = LazyClient(lambda: build_openai_client(os.getenv("OPENAI_API_KEY"), base_url=OPENAI_BASE_URL), name="openai")
+
+LLM_MODEL = os.environ.get("LLM_MODEL", "gpt-4")  # or "gpt-3.5-turbo"
+LLM_SYSTEM_PROMPT = "You are a CRM assistant. Help users add contacts, create deals, update deals, search contacts, and add notes."
+LLM_TEMPERATURE = 0.3
+
+# Repeated questions are answered from cache; LLM_CACHE_PATH shares it between workers.
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH")
+llm_cache = LLMResponseCache(
+    max_entries=int(os.environ.get("LLM_CACHE_SIZE", "1000")),
+    ttl=int(os.environ.get("LLM_CACHE_TTL", "86400")),
+    backend=SQLiteLLMCacheBackend(LLM_CACHE_PATH) if LLM_CACHE_PATH else None
+)
+
+# Bounded by LLM_DEADLINE; after LLM_HEDGE_DELAY the prompt also goes to LLM_FALLBACK_MODEL and the
+# first answer wins. LLM_STREAM=1 sends the reply in WhatsApp-sized parts while it is being generated.
+llm = HedgedLLM(
+    client,
+    LLM_MODEL,
+    fallback_model=os.environ.get("LLM_FALLBACK_MODEL", "gpt-3.5-turbo") or None,
+    system_prompt=LLM_SYSTEM_PROMPT,
+    temperature=LLM_TEMPERATURE,
+    deadline=float(os.environ.get("LLM_DEADLINE", "20")),
+    hedge_delay=float(os.environ.get("LLM_HEDGE_DELAY", "4")),
+    stream=os.environ.get("LLM_STREAM", "0") == "1",
+    chunk_size=int(os.environ.get("LLM_STREAM_CHUNK", "1600"))
+)
+
+def ask_llm(prompt, on_chunk=None):
+    # Returns what is left to send: with streaming, parts already passed to on_chunk aren't repeated.
+    key = cache_key(prompt, LLM_MODEL, LLM_SYSTEM_PROMPT, LLM_TEMPERATURE)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return cached
+
+    sent = []
+
+    def forward(part):
+        sent.append(part)
+        on_chunk(part)
 
-def ask_llm(prompt):
     try:
-        response = client.chat.completions.create(
-            model="gpt-4",  # or "gpt-3.5-turbo"
-            messages=[
-                {"role": "system", "content": "You are a CRM assistant. Help users add contacts, create deals, update deals, search contacts, and add notes."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3
-        )
-        return response.choices[0].message.content.strip()
+        with span("llm"):
+            reply, model = llm.ask(prompt, on_chunk=forward if on_chunk else None)
+        if model == LLM_MODEL:
+            # A fallback answer is served this once but not cached, so it never stands in for the main model.
+            llm_cache.put(key, reply)
+        return "" if sent else reply
     except Exception as e:
-        print(f"❌ Error calling LLM: {str(e)}")
+        log.error("llm call failed", extra={"model": LLM_MODEL, "error": str(e)})
+        if sent:
+            return "⚠️ The rest of this answer took too long. Please ask again if you need more."
         return "⚠️ I'm currently unable to process that request. Please try again later."
 
 
 # ---------------- WhatsApp Messaging ----------------
-def send_whatsapp_message(to, body):
-    url = f"https://api.twilio.com/2010-04-01/Accounts/{TWILIO_ACCOUNT_SID}/Messages.json"
-    auth = (TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-    data = {
-        "From": TWILIO_NUMBER,
-        "To": to,
-        "Body": body
-    }
-    response = requests.post(url, data=data, auth=auth)
+# Rate-limited (globally and per recipient), split at WhatsApp's body limit, retried on 429/5xx.
+# OUTBOUND_MODE=async hands replies to background delivery workers instead of sending inline.
+outbound = tenants.bound("outbound")
 
-    print("📤 Twilio Message Send Response:")
-    print(f"To: {to}")
-    print(response.status_code)
-    print(response.text)
-# ---------------- Command Handler ----------------
-def handle_command(message, sender):
-    original_message = message.strip()
-    message = original_message.lower()
-
-    if "@bot help" in message:
-        help_text = "🤖 *HFS CRM Bot Commands*\n\n"
-
-        for cmd in BOT_COMMANDS:
-            help_text += f"• *{cmd['command']}*\n  _{cmd['description']}_\n\n"
-
-        help_text += "📋 *Tip:* Always start your message with `@bot`!"
-
-        send_whatsapp_message(sender, help_text)
-        return
-
-    elif "add" in message and "contact" in message and "company" in message:
+def send_whatsapp_message(to, body):
+    outbound.send(to, body)
+
+# ---------------- Tenant Resources ----------------
+def build_tenant(config):
+    token_manager = ZohoTokenManager(
+        config.zoho_client_id,
+        config.zoho_client_secret,
+        config.zoho_refresh_token,
+        backend=token_backend_from_env(config.id),
+        accounts_url=config.zoho_accounts_url,
+        refresh_margin=int(os.environ.get("ZOHO_TOKEN_REFRESH_MARGIN", "300"))
+    )
+    # The in-flight cap, breaker and credit meter are per tenant, so one org being throttled
+    # (or flooding us) doesn't hold up the others.
+    zoho = ZohoClient(
+        token_manager,
+        base_url=config.zoho_api_base,
+        max_in_flight=config.zoho_max_in_flight,
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.environ.get("ZOHO_BREAKER_THRESHOLD", "5")),
+            reset_timeout=int(os.environ.get("ZOHO_BREAKER_RESET", "30"))
+        ),
+        meter=CreditMeter(daily_limit=config.zoho_daily_credits or None)
+    )
+    twilio = TwilioClient(config.twilio_account_sid, config.twilio_auth_token, base_url=TWILIO_API_BASE)
+    # Rate-limited (globally and per recipient), split at WhatsApp's body limit, retried on 429/5xx.
+    # OUTBOUND_MODE=async hands replies to background delivery workers instead of sending inline.
+    outbound = OutboundDelivery(
+        twilio,
+        config.number,
+        asynchronous=os.environ.get("OUTBOUND_MODE", "sync").lower() == "async",
+        workers=int(os.environ.get("OUTBOUND_WORKERS", "4")),
+        global_rate=config.outbound_rate,
+        global_burst=config.outbound_burst,
+        recipient_rate=float(os.environ.get("OUTBOUND_RECIPIENT_RATE", "1")),
+        recipient_burst=int(os.environ.get("OUTBOUND_RECIPIENT_BURST", "5")),
+        max_attempts=int(os.environ.get("OUTBOUND_MAX_ATTEMPTS", "4"))
+    )
+    picklists = DealPicklists(
+        lambda: fetch_deal_picklists(zoho),
+        DEFAULT_STAGES,
+        DEFAULT_PIPELINES,
+        ttl=int(os.environ.get("PICKLIST_TTL", "3600")),
+        fuzzy_cutoff=float(os.environ.get("PICKLIST_FUZZY_CUTOFF", "0.85"))
+    )
+    # Notes and stage updates only need the deal ID; cache it so repeat touches skip the search call.
+    deal_ids = DealIdCache(
+        max_size=int(os.environ.get("DEAL_CACHE_SIZE", "2000")),
+        ttl=int(os.environ.get("DEAL_CACHE_TTL", "3600")),
+        fuzzy_cutoff=float(os.environ.get("DEAL_CACHE_FUZZY_CUTOFF", "0.9"))
+    )
+    # OpenAI is one account for everyone, so each tenant gets a share of it.
+    pipeline_summary = PipelineSummary(
+        zoho,
+        sync_interval=int(os.environ.get("PIPELINE_SUMMARY_SYNC_INTERVAL", "300")),
+        max_staleness=int(os.environ.get("PIPELINE_SUMMARY_MAX_STALENESS", "900")),
+        full_every=int(os.environ.get("PIPELINE_SUMMARY_FULL_EVERY", "86400"))
+    )
+    llm_budget = None
+    if config.llm_per_minute:
+        llm_budget = TokenBucket(config.llm_per_minute / 60, max(1, int(config.llm_per_minute)))
+    is_default = config.id == DEFAULT_TENANT_ID
+    log.info("tenant built", extra={"tenant": config.id})
+    return Tenant(
+        config,
+        token_manager=token_manager,
+        zoho=zoho,
+        twilio=twilio,
+        outbound=outbound,
+        picklists=picklists,
+        deal_ids=deal_ids,
+        pipeline_summary=pipeline_summary,
+        llm_budget=llm_budget,
+        mirror=default_mirror if is_default else None,
+        outbox=default_outbox if is_default else None
+    )
+
+llm_budget = tenants.bound("llm_budget")
+LLM_THROTTLED = metrics.counter("hfs_bot_llm_throttled_total", "LLM questions turned away by a tenant's budget.",
+                                labels=("tenant",))
+
+# ---------------- CRM Search ----------------
+def zoho_search(search_url):
+    response = zoho.get(search_url)
+    # Zoho answers 204 with an empty body when nothing matches.
+    if response.status_code == 204:
+        return []
+    return response.json().get("data") or []
+
+def contact_search_urls(contact_query):
+    # Exact match on Full_Name, then partial match on First/Last/Full name
+    criteria_raw = f"(Full_Name:equals:{contact_query})"
+    exact_url = f"/Contacts/search?criteria={urllib.parse.quote(criteria_raw, safe='():')}"
+
+    criteria_parts = []
+    for word in contact_query.split():
+        criteria_parts.append(f"(First_Name:contains:{word})")
+        criteria_parts.append(f"(Last_Name:contains:{word})")
+        criteria_parts.append(f"(Full_Name:contains:{word})")
+    criteria_raw = "(" + " or ".join(criteria_parts) + ")"
+    partial_url = f"/Contacts/search?criteria={urllib.parse.quote(criteria_raw, safe='():')}"
+    return [exact_url, partial_url]
+
+def deal_search_urls(deal_query):
+    exact_url = f"/Deals/search?criteria={urllib.parse.quote(f'(Deal_Name:equals:{deal_query})', safe='():')}"
+    partial_url = f"/Deals/search?criteria={urllib.parse.quote(f'(Deal_Name:contains:{deal_query})', safe='():')}"
+    return [exact_url, partial_url]
+
+def account_search_urls(account_query):
+    # Zoho's word search is case-insensitive and matches across fields
+    return [f"/Accounts/search?word={urllib.parse.quote(account_query)}"]
+
+SEARCH_URLS = {
+    "Contacts": contact_search_urls,
+    "Deals": deal_search_urls,
+    "Accounts": account_search_urls,
+}
+
+def search_live(module, query):
+    # The partial-match query only goes out when the exact one finds nothing.
+    for search_url in SEARCH_URLS[module](query):
+        log.debug("zoho search", extra={"url": search_url})
+        matches = zoho_search(search_url)
+        if matches:
+            return matches
+    return []
+
+def search_crm(module, query):
+    # Serve from the local mirror while it's fresh; go live when it's stale or has no match.
+    matches = []
+    if mirror and mirror.is_fresh(module):
+        matches = mirror.search(module, query)
+
+    if not matches:
         try:
-            after_contact = message.split("contact", 1)[1].strip()
-            name_part, company_part = after_contact.split("company", 1)
-            name = name_part.strip()
-            company = company_part.strip()
+            matches = search_live(module, query)
+        except ZohoUnavailable:
+            # A stale mirror answer beats none while Zoho is throttled or down.
+            matches = mirror.search(module, query) if mirror else []
+            if not matches:
+                raise
+        if mirror and matches:
+            mirror.upsert_records(module, matches)
+
+    if module == "Deals":
+        cache_deal_ids(matches)
+    return matches
+
+def format_other_matches(module, matches, limit=4):
+    others = [record_name(module, match) for match in matches[1:limit + 1]]
+    others = [name for name in others if name]
+    if not others:
+        return ""
+    return "\n\n🔎 *Other matches:*\n" + "\n".join(f"• {name}" for name in others)
+
+# ---------------- Find (all modules) ----------------
+FIND_LIMIT = int(os.environ.get("FIND_LIMIT", "5"))
+FIND_MODULE_ICONS = {"Contacts": "👤", "Deals": "💼", "Accounts": "🏢"}
+
+def find_queries(module, text):
+    # A fresh mirror answers locally; otherwise the exact and partial live searches go out together.
+    if mirror and mirror.is_fresh(module):
+        return [lambda: mirror.search(module, text, limit=FIND_LIMIT)]
+    return [lambda url=url: zoho_search(url) for url in SEARCH_URLS[module](text)]
+
+unified_search = UnifiedSearch(
+    find_queries,
+    workers=int(os.environ.get("FIND_WORKERS", "6")),
+    deadline=float(os.environ.get("FIND_DEADLINE", "4"))
+)
+
+def describe_match(module, record):
+    name = record_name(module, record) or "N/A"
+    if module == "Deals":
+        account = (record.get("Account_Name") or {}).get("name")
+        details = [record.get("Stage"), account]
+    elif module == "Contacts":
+        details = [(record.get("Account_Name") or {}).get("name"), record.get("Email")]
+    else:
+        details = [record.get("Phone"), record.get("Website")]
+    details = [d for d in details if d]
+    return f"{FIND_MODULE_ICONS[module]} *{name}*" + (f" ({', '.join(details)})" if details else "")
 
-            if not name or not company:
-                send_whatsapp_message(sender, "⚠️ Name or company is missing.")
-                return
+# ---------------- Pipeline Summary ----------------
+# Per-stage deal counts and Amount totals, answered from memory (one per tenant, see build_tenant).
+# Loaded once with COQL, then kept current from Modified_Time and the bot's own direct writes;
+# outbox writes show up with the next sync.
+pipeline_summary = tenants.bound("pipeline_summary")
 
-            result = add_contact(name, company)
-            if "data" in result:
-                send_whatsapp_message(sender, f"✅ Added contact *{name}* with company *{company}*.")
-            else:
-                send_whatsapp_message(sender, f"⚠️ Failed to add contact. Response: {json.dumps(result)}")
+# ---------------- Command Handlers ----------------
+def handle_help(command, sender):
+    help_text = "🤖 *HFS CRM Bot Commands*\n\n"
 
-        except Exception as e:
-            send_whatsapp_message(sender, f"❌ Error while adding contact: {str(e)}")
+    for cmd in BOT_COMMANDS:
+        help_text += f"• *{cmd['command']}*\n  _{cmd['description']}_\n\n"
 
-    elif "@bot create deal" in message:
-        try:
-            prompt_text = (
-                "📝 To create a new deal, please send the details in this format:\n"
-                "`deal name DEAL_NAME account ACCOUNT_NAME stage STAGE_NAME pipeline PIPELINE_NAME`\n\n"
-                "📋 *Available Pipelines:*\n" +
-                "\n".join(ALLOWED_PIPELINES) +
-                "\n\n📋 *Available Stages:*\n" +
-                "\n".join(ALLOWED_STAGES)
-            )
-            send_whatsapp_message(sender, prompt_text)
-        except Exception as e:
-            send_whatsapp_message(sender, f"❌ Error prompting for deal info: {str(e)}")
+    help_text += "📋 *Tip:* Always start your message with `@bot`!"
 
-    elif all(x in message for x in ["deal name", "account", "stage", "pipeline"]):
-        try:
-            parts = original_message.split("deal name", 1)[1].strip()
-            deal_part, rest = parts.split("account", 1)
-            account_part, stage_pipeline = rest.split("stage", 1)
-            stage_part, pipeline_part = stage_pipeline.split("pipeline", 1)
+    send_whatsapp_message(sender, help_text)
 
-            deal_name = deal_part.strip()
-            account_name = account_part.strip()
-            stage_input = stage_part.strip()
-            pipeline_input = pipeline_part.strip()
+def handle_add_contact(command, sender):
+    try:
+        name = command.args["full_name"]
+        company = command.args["company_name"]
 
-            stage = validate_dropdown(stage_input, ALLOWED_STAGES)
-            pipeline = validate_dropdown(pipeline_input, ALLOWED_PIPELINES)
+        if not name or not company:
+            send_whatsapp_message(sender, "⚠️ Name or company is missing.")
+            return
 
-            if not stage:
-                send_whatsapp_message(sender, "❌ Invalid stage. Available options:\n" + "\n".join(ALLOWED_STAGES))
-                return
+        result = add_contact(name, company)
+        if "data" in result:
+            send_whatsapp_message(sender, f"✅ Added contact *{name}* with company *{company}*.")
+        else:
+            send_whatsapp_message(sender, f"⚠️ Failed to add contact. Response: {json.dumps(result)}")
 
-            if not pipeline:
-                send_whatsapp_message(sender, "❌ Invalid pipeline. Available options:\n" + "\n".join(ALLOWED_PIPELINES))
-                return
+    except Exception as e:
+        send_whatsapp_message(sender, f"❌ Error while adding contact: {str(e)}")
+
+def handle_create_deal(command, sender):
+    try:
+        prompt_text = (
+            "📝 To create a new deal, please send the details in this format:\n"
+            "`deal name DEAL_NAME account ACCOUNT_NAME stage STAGE_NAME pipeline PIPELINE_NAME`\n\n"
+            "📋 *Available Pipelines:*\n" +
+            "\n".join(deal_picklists.pipelines) +
+            "\n\n📋 *Available Stages:*\n" +
+            "\n".join(deal_picklists.stages)
+        )
+        send_whatsapp_message(sender, prompt_text)
+    except Exception as e:
+        send_whatsapp_message(sender, f"❌ Error prompting for deal info: {str(e)}")
 
-            # Save the pending deal for confirmation
-            pending_deal_confirmations[sender] = {
+def handle_deal_details(command, sender):
+    try:
+        deal_name = command.args["deal_name"]
+        account_name = command.args["account_name"]
+
+        # Checked here, including that the stage belongs to the pipeline, so Zoho never sees a bad pair.
+        stage, pipeline, error = deal_picklists.validate(command.args["stage_name"], command.args["pipeline_name"])
+        if error:
+            send_whatsapp_message(sender, error)
+            return
+
+        # Save the pending deal for confirmation
+        conversation_state.set(sender, {
+            "flow": "create_deal",
+            "data": {
                 "deal_name": deal_name,
                 "account_name": account_name,
                 "stage": stage,
                 "pipeline": pipeline
             }
+        })
+
+        # Ask for confirmation
+        preview = (
+            f"🆕 *Deal Preview:*\n"
+            f"• Deal Name: *{deal_name}*\n"
+            f"• Account Name: *{account_name}*\n"
+            f"• Stage: *{stage}*\n"
+            f"• Pipeline: *{pipeline}*\n\n"
+            "✅ Reply *yes* to confirm or *no* to cancel."
+        )
+        send_whatsapp_message(sender, preview)
 
-            # Ask for confirmation
-            preview = (
-                f"🆕 *Deal Preview:*\n"
-                f"• Deal Name: *{deal_name}*\n"
-                f"• Account Name: *{account_name}*\n"
-                f"• Stage: *{stage}*\n"
-                f"• Pipeline: *{pipeline}*\n\n"
-                "✅ Reply *yes* to confirm or *no* to cancel."
-            )
-            send_whatsapp_message(sender, preview)
-
-        except Exception as e:
-            send_whatsapp_message(sender, f"❌ Error while preparing deal: {str(e)}")
-
-    elif "note" in message and "note_content" in message:
-        try:
-            parts = original_message.split("note", 1)[1].strip()
-            deal_part, note_part = parts.split("note_content", 1)
-            deal_name = deal_part.strip()
-            note_text = note_part.strip()
-
-            result = add_note_to_deal(deal_name, note_text)
-            send_whatsapp_message(sender, result)
-
-        except Exception as e:
-            send_whatsapp_message(sender, f"❌ Error while adding note: {str(e)}")
-
-    elif sender in pending_deal_confirmations:
-        # Waiting for user confirmation
-        user_reply = message.strip().lower()
-
-        if user_reply == "yes":
-            # User confirmed deal creation
-            deal_info = pending_deal_confirmations.pop(sender)
-            result = create_deal(
-                deal_info["deal_name"],
-                deal_info["account_name"],
-                deal_info["stage"],
-                deal_info["pipeline"]
-            )
-            if "data" in result:
-                send_whatsapp_message(sender, f"✅ Deal *{deal_info['deal_name']}* created successfully!")
-            else:
-                send_whatsapp_message(sender, f"⚠️ Failed to create deal. Response: {json.dumps(result)}")
+    except Exception as e:
+        send_whatsapp_message(sender, f"❌ Error while preparing deal: {str(e)}")
 
-        elif user_reply == "no":
-            # User canceled
-            pending_deal_confirmations.pop(sender)
-            send_whatsapp_message(sender, "❌ Deal creation cancelled.")
+def handle_note(command, sender):
+    try:
+        result = add_note_to_deal(command.args["deal_name"], command.args["your_note"], sender)
+        send_whatsapp_message(sender, result)
 
+    except Exception as e:
+        send_whatsapp_message(sender, f"❌ Error while adding note: {str(e)}")
+
+def handle_deal_confirmation(command, sender, state):
+    # Returns False to let a different command run while the preview is still pending.
+    if command is None:
+        # Invalid confirmation reply
+        send_whatsapp_message(sender, "⚠️ Please reply with *yes* to confirm or *no* to cancel.")
+        return True
+    if command.name not in ("confirm", "cancel"):
+        return False
+
+    # pop() is atomic in every backend, so a duplicate "yes" can't create the deal twice.
+    state = conversation_state.pop(sender)
+    if state is None:
+        return True
+    deal_info = state["data"]
+
+    if command.name == "confirm":
+        # User confirmed deal creation
+        result = create_deal(
+            deal_info["deal_name"],
+            deal_info["account_name"],
+            deal_info["stage"],
+            deal_info["pipeline"]
+        )
+        if "data" in result:
+            send_whatsapp_message(sender, f"✅ Deal *{deal_info['deal_name']}* created successfully!")
         else:
-            # Invalid confirmation reply
-            send_whatsapp_message(sender, "⚠️ Please reply with *yes* to confirm or *no* to cancel.")
-    elif "@bot update deal" in message and "stage" in message:
-        try:
-            parts = original_message.split("update deal", 1)[1].strip()
-            deal_part, stage_part = parts.split("stage", 1)
-
-            deal_name = deal_part.strip()
-            stage_input = stage_part.strip()
-
-            stage = validate_dropdown(stage_input, ALLOWED_STAGES)
-
-            if not stage:
-                send_whatsapp_message(sender, "❌ Invalid stage. Available options:\n" + "\n".join(ALLOWED_STAGES))
-                return
-
-            # Search for the deal by name
-            access_token = get_access_token()
-            search_url = f"https://www.zohoapis.com/crm/v2/Deals/search?criteria=(Deal_Name:equals:{deal_name})"
-            headers = {"Authorization": f"Zoho-oauthtoken {access_token}"}
-            response = requests.get(search_url, headers=headers)
-            data = response.json()
-
-            if "data" not in data:
-                send_whatsapp_message(sender, f"❌ No deal found with name: {deal_name}")
-                return
-
-            deal_id = data["data"][0]["id"]
-
-            # Update deal's stage
-            update_url = f"https://www.zohoapis.com/crm/v2/Deals/{deal_id}"
-            update_payload = {
-                "data": [
-                    {
-                        "Stage": stage
-                    }
-                ]
-            }
-            update_headers = {
-                "Authorization": f"Zoho-oauthtoken {access_token}",
-                "Content-Type": "application/json"
+            send_whatsapp_message(sender, f"⚠️ Failed to create deal. Response: {json.dumps(result)}")
+    else:
+        # User canceled
+        send_whatsapp_message(sender, "❌ Deal creation cancelled.")
+    return True
+
+# ---------------- Update Deal Stage ----------------
+def update_deal_stage(deal_name, stage, sender=None, deal_id=None):
+    # `deal_id` is a suggested deal the user confirmed; `deal_name` is then its name.
+    not_found = {"kind": "stage", "stage": stage}
+    if outbox:
+        resolved_name = deal_name
+        if not deal_id:
+            deal_id, resolved_name, _ = resolve_deal(deal_name)
+        if not deal_id:
+            return deal_not_found(sender, deal_name, not_found)
+        outbox.update_stage(deal_id, stage, sender=sender, deal_name=resolved_name)
+        return f"✅ Deal *{resolved_name}* will move to stage *{stage}* shortly."
+
+    update_payload = {
+        "data": [
+            {
+                "Stage": stage
             }
-            update_response = requests.put(update_url, headers=update_headers, json=update_payload)
-
-            if update_response.status_code == 200:
-                send_whatsapp_message(sender, f"✅ Deal *{deal_name}* updated to stage *{stage}* successfully!")
-            else:
-                send_whatsapp_message(sender, f"⚠️ Failed to update deal. Response: {json.dumps(update_response.json())}")
-
-        except Exception as e:
-            send_whatsapp_message(sender, f"❌ Error while updating deal stage: {str(e)}")
+        ]
+    }
+    def put_stage(deal_id):
+        response = zoho.put(f"/Deals/{deal_id}", json=update_payload)
+        if response.status_code == 200:
+            pipeline_summary.apply({"id": deal_id, "Stage": stage})
+        return response
+
+    update_response, resolved_name = write_to_deal(deal_name, put_stage, deal_id=deal_id)
+
+    if update_response is None:
+        return deal_not_found(sender, deal_name, not_found) if not deal_id else \
+            f"❌ Deal *{deal_name}* no longer exists in Zoho."
+    if update_response.status_code != 200:
+        return f"⚠️ Failed to update deal. Response: {json.dumps(update_response.json())}"
+    return f"✅ Deal *{resolved_name}* updated to stage *{stage}* successfully!"
+
+def handle_update_deal(command, sender):
+    try:
+        stage, _, error = deal_picklists.validate(command.args["stage_name"])
+        if error:
+            send_whatsapp_message(sender, error)
+            return
+        send_whatsapp_message(sender, update_deal_stage(command.args["deal_name"], stage, sender))
 
+    except Exception as e:
+        send_whatsapp_message(sender, f"❌ Error while updating deal stage: {str(e)}")
+
+def handle_deal_suggestion(command, sender, state):
+    # The reply to "Did you mean ...?". Returns False to let a different command run instead.
+    if command is None:
+        send_whatsapp_message(sender, "⚠️ Please reply with *yes* to confirm or *no* to cancel.")
+        return True
+    if command.name not in ("confirm", "cancel"):
+        return False
+
+    state = conversation_state.pop(sender)
+    if state is None:
+        return True
+    action = state["data"]
+
+    if command.name == "cancel":
+        send_whatsapp_message(sender, "❌ Cancelled, nothing was changed.")
+    elif action["kind"] == "note":
+        send_whatsapp_message(sender, add_note_to_deal(action["deal_name"], action["note"], sender,
+                                                       deal_id=action["deal_id"]))
+    else:
+        send_whatsapp_message(sender, update_deal_stage(action["deal_name"], action["stage"], sender,
+                                                        deal_id=action["deal_id"]))
+    return True
 
-    elif "@bot search contact" in message:
-        try:
-            contact_query = original_message.split("search contact", 1)[1].strip()
+def handle_search_contact(command, sender):
+    try:
+        contact_query = command.args["contact_name"]
+
+        if not contact_query:
+            send_whatsapp_message(sender, "⚠️ Please provide a contact name to search.")
+            return
+
+        matches = search_crm("Contacts", contact_query)
+        if not matches:
+            send_whatsapp_message(sender, f"❌ No contact found matching: {contact_query}")
+            return
+
+        contact = matches[0]
+        first_name = contact.get("First_Name", "N/A")
+        last_name = contact.get("Last_Name", "N/A")
+        company = (contact.get("Account_Name") or {}).get("name", "N/A")
+        email = contact.get("Email", "N/A")
+        phone = contact.get("Phone", "N/A")
+
+        contact_info = (
+            f"👤 *Contact Found:*\n"
+            f"• Name: *{first_name} {last_name}*\n"
+            f"• Company: *{company}*\n"
+            f"• Email: *{email}*\n"
+            f"• Phone: *{phone}*"
+        )
+        send_whatsapp_message(sender, contact_info + format_other_matches("Contacts", matches))
 
-            if not contact_query:
-                send_whatsapp_message(sender, "⚠️ Please provide a contact name to search.")
-                return
+    except Exception as e:
+        send_whatsapp_message(sender, f"❌ Error while searching for contact: {str(e)}")
 
-            access_token = get_access_token()
-            headers = {"Authorization": f"Zoho-oauthtoken {access_token}"}
-
-            # Try exact match on Full_Name first
-            criteria_raw = f"(Full_Name:equals:{contact_query})"
-            criteria_encoded = urllib.parse.quote(criteria_raw, safe="():")
-            search_url = f"https://www.zohoapis.com/crm/v2/Contacts/search?criteria={criteria_encoded}"
-
-            print(f"🔍 Searching Contact with URL: {search_url}")
-            response = requests.get(search_url, headers=headers)
-            data = response.json()
-
-            if "data" not in data or not data["data"]:
-                # Fallback to partial match on First/Last/Full name
-                words = contact_query.split()
-                criteria_parts = []
-                for word in words:
-                    criteria_parts.append(f"(First_Name:contains:{word})")
-                    criteria_parts.append(f"(Last_Name:contains:{word})")
-                    criteria_parts.append(f"(Full_Name:contains:{word})")
-                criteria_raw = "(" + " or ".join(criteria_parts) + ")"
-                criteria_encoded = urllib.parse.quote(criteria_raw, safe="():")
-                search_url = f"https://www.zohoapis.com/crm/v2/Contacts/search?criteria={criteria_encoded}"
-
-                print(f"🔍 Fallback Searching Contact with URL: {search_url}")
-                response = requests.get(search_url, headers=headers)
-                data = response.json()
-
-            if "data" not in data or not data["data"]:
-                send_whatsapp_message(sender, f"❌ No contact found matching: {contact_query}")
-                return
+def handle_search_deal(command, sender):
+    try:
+        deal_query = command.args["deal_name"]
+
+        if not deal_query:
+            send_whatsapp_message(sender, "⚠️ Please provide a deal name to search.")
+            return
+
+        matches = search_crm("Deals", deal_query)
+        if not matches:
+            send_whatsapp_message(sender, f"❌ No deal found matching: {deal_query}")
+            return
+
+        deal = matches[0]
+        name = deal.get("Deal_Name", "N/A")
+        account = (deal.get("Account_Name") or {}).get("name", "N/A")
+        stage = deal.get("Stage", "N/A")
+        pipeline = deal.get("Pipeline", "N/A")
+        amount = deal.get("Amount", "N/A")
+        closing = deal.get("Closing_Date", "N/A")
+
+        deal_info = (
+            f"🔍 *Deal Found:*\n"
+            f"• Name: *{name}*\n"
+            f"• Account: *{account}*\n"
+            f"• Stage: *{stage}*\n"
+            f"• Pipeline: *{pipeline}*\n"
+            f"• Amount: *{amount}*\n"
+            f"• Closing Date: *{closing}*"
+        )
+        send_whatsapp_message(sender, deal_info + format_other_matches("Deals", matches))
 
-            contact = data["data"][0]
-            first_name = contact.get("First_Name", "N/A")
-            last_name = contact.get("Last_Name", "N/A")
-            company = contact.get("Account_Name", {}).get("name", "N/A")
-            email = contact.get("Email", "N/A")
-            phone = contact.get("Phone", "N/A")
-
-            contact_info = (
-                f"👤 *Contact Found:*\n"
-                f"• Name: *{first_name} {last_name}*\n"
-                f"• Company: *{company}*\n"
-                f"• Email: *{email}*\n"
-                f"• Phone: *{phone}*"
-            )
-            send_whatsapp_message(sender, contact_info)
+    except Exception as e:
+        send_whatsapp_message(sender, f"❌ Error while searching for deal: {str(e)}")
 
-        except Exception as e:
-            send_whatsapp_message(sender, f"❌ Error while searching for contact: {str(e)}")
+def handle_search_account(command, sender):
+    try:
+        account_query = command.args["account_name"]
+
+        if not account_query:
+            send_whatsapp_message(sender, "⚠️ Please provide an account name to search.")
+            return
+
+        matches = search_crm("Accounts", account_query)
+        if not matches:
+            send_whatsapp_message(sender, f"❌ No account found matching: {account_query}")
+            return
+
+        # Return best match
+        account = matches[0]
+        name = account.get("Account_Name", "N/A")
+        phone = account.get("Phone", "N/A")
+        website = account.get("Website", "N/A")
+        industry = account.get("Industry", "N/A")
+        account_id = account.get("id", "N/A")
+
+        account_details = (
+            f"🏢 *Account Found:*\n"
+            f"• Name: *{name}*\n"
+            f"• Phone: *{phone}*\n"
+            f"• Website: *{website}*\n"
+            f"• Industry: *{industry}*\n"
+            f"• ID: `{account_id}`"
+        )
 
-    elif "@bot search deal" in message:
-        try:
-            deal_query = original_message.split("search deal", 1)[1].strip()
+        send_whatsapp_message(sender, account_details + format_other_matches("Accounts", matches))
 
-            if not deal_query:
-                send_whatsapp_message(sender, "⚠️ Please provide a deal name to search.")
-                return
+    except Exception as e:
+        send_whatsapp_message(sender, f"❌ Error while searching for account: {str(e)}")
 
-            access_token = get_access_token()
-            headers = {"Authorization": f"Zoho-oauthtoken {access_token}"}
+# ---------------- Bulk Contact Import ----------------
+contact_importer = ContactImporter(
+    zoho,
+    concurrency=int(os.environ.get("BULK_IMPORT_CONCURRENCY", "3")),
+    max_rows=int(os.environ.get("BULK_IMPORT_MAX_ROWS", "2000"))
+)
 
-            # Try exact match first
-            criteria_raw = f"(Deal_Name:equals:{deal_query})"
-            criteria_encoded = urllib.parse.quote(criteria_raw, safe="():")
-            search_url = f"https://www.zohoapis.com/crm/v2/Deals/search?criteria={criteria_encoded}"
+def handle_import_contacts(command, sender):
+    try:
+        text = command.args.get("contacts", "")
+        if not text and not command.media:
+            send_whatsapp_message(sender,
+                "📥 Send one contact per line after the command, e.g.\n"
+                "`@bot import contacts\nJane Doe, Acme Ltd\nJohn Smith, Globex, john@globex.com`\n\n"
+                "or attach a CSV / vCard file with the command as caption."
+            )
+            return
 
-            print(f"🔍 Searching Deal with URL: {search_url}")
-            response = requests.get(search_url, headers=headers)
-            data = response.json()
+        send_whatsapp_message(sender, "⏳ Importing contacts...")
+        summaries = []
+        if text:
+            summaries.append(contact_importer.run(parse_text_lines(text.splitlines())))
+        for media_url, content_type in command.media:
+            with twilio.fetch_media(media_url) as response:
+                # text/csv and text/vcard carry no charset, which requests takes as ISO-8859-1; exports are
+                # UTF-8, often with a BOM.
+                lines = codecs.iterdecode(response.iter_lines(), "utf-8-sig")
+                summaries.append(contact_importer.run(parse_rows(lines, content_type)))
 
-            if "data" not in data or not data["data"]:
-                # Fallback to partial match
-                criteria_raw = f"(Deal_Name:contains:{deal_query})"
-                criteria_encoded = urllib.parse.quote(criteria_raw, safe="():")
-                search_url = f"https://www.zohoapis.com/crm/v2/Deals/search?criteria={criteria_encoded}"
-                response = requests.get(search_url, headers=headers)
-                data = response.json()
+        send_whatsapp_message(sender, "\n\n".join(format_summary(summary) for summary in summaries))
 
-            if "data" not in data or not data["data"]:
-                send_whatsapp_message(sender, f"❌ No deal found matching: {deal_query}")
-                return
+    except Exception as e:
+        send_whatsapp_message(sender, f"❌ Error while importing contacts: {str(e)}")
 
-            deal = data["data"][0]
-            name = deal.get("Deal_Name", "N/A")
-            account = deal.get("Account_Name", {}).get("name", "N/A")
-            stage = deal.get("Stage", "N/A")
-            pipeline = deal.get("Pipeline", "N/A")
-            amount = deal.get("Amount", "N/A")
-            closing = deal.get("Closing_Date", "N/A")
-
-            deal_info = (
-                f"🔍 *Deal Found:*\n"
-                f"• Name: *{name}*\n"
-                f"• Account: *{account}*\n"
-                f"• Stage: *{stage}*\n"
-                f"• Pipeline: *{pipeline}*\n"
-                f"• Amount: *{amount}*\n"
-                f"• Closing Date: *{closing}*"
+def handle_find(command, sender):
+    try:
+        text = command.args["text"]
+        if not text:
+            send_whatsapp_message(sender, "⚠️ Please tell me what to find, e.g. `@bot find acme`.")
+            return
+
+        matches, missing = unified_search.find(text, FIND_MODULES, limit=FIND_LIMIT)
+        for module in FIND_MODULES:
+            found = [record for m, record in matches if m == module]
+            if mirror and found:
+                mirror.upsert_records(module, found)
+        cache_deal_ids([record for module, record in matches if module == "Deals"])
+
+        if not matches:
+            reply = f"❌ Nothing found matching: {text}"
+        else:
+            reply = f"🔎 *Results for \"{text}\":*\n" + "\n".join(
+                f"{i}. {describe_match(module, record)}" for i, (module, record) in enumerate(matches, 1)
             )
-            send_whatsapp_message(sender, deal_info)
+        if missing:
+            reply += f"\n\n⏱️ No answer in time from: {', '.join(missing)}. Results may be incomplete."
+        send_whatsapp_message(sender, reply)
 
-        except Exception as e:
-            send_whatsapp_message(sender, f"❌ Error while searching for deal: {str(e)}")
+    except Exception as e:
+        send_whatsapp_message(sender, f"❌ Error while searching: {str(e)}")
 
-    elif "@bot search account" in message:
-        try:
-            account_query = original_message.split("search account", 1)[1].strip()
+def send_pipeline_summary(sender, pipeline=None):
+    try:
+        summary = pipeline_summary.summary(pipeline)
+        send_whatsapp_message(sender, format_pipeline_summary(summary, stage_order=deal_picklists.stages))
+    except Exception as e:
+        send_whatsapp_message(sender, f"❌ Error while building the pipeline summary: {str(e)}")
 
-            if not account_query:
-                send_whatsapp_message(sender, "⚠️ Please provide an account name to search.")
+def handle_pipeline_summary(command, sender):
+    try:
+        pipeline = None
+        if command.args["pipeline"]:
+            pipeline = deal_picklists.pipelines.resolve(command.args["pipeline"])
+            if not pipeline:
+                send_whatsapp_message(sender, "❌ Invalid pipeline. Available options:\n" +
+                                      "\n".join(deal_picklists.pipelines))
                 return
 
-            access_token = get_access_token()
-            headers = {"Authorization": f"Zoho-oauthtoken {access_token}"}
+        if not pipeline_summary.loaded_at:
+            # The first load reads every deal and can outlast Twilio's webhook timeout, so the answer
+            # follows from a thread carrying this request's tenant.
+            send_whatsapp_message(sender, "⏳ Building the pipeline summary, I'll send it as soon as it's ready.")
+            tenant = tenants.retain(current_tenant())
 
-            # Split into words for flexible matching (case-sensitive in Zoho!)
-            words = account_query.split()
-            criteria_parts = [f"(Account_Name:contains:{word})" for word in words]
-            criteria_raw = "(" + " or ".join(criteria_parts) + ")"
-            encoded_criteria = urllib.parse.quote(criteria_raw)
+            def reply():
+                try:
+                    send_pipeline_summary(sender, pipeline)
+                finally:
+                    tenants.release(tenant)
 
-            search_url = f"https://www.zohoapis.com/crm/v2/Accounts/search?word={urllib.parse.quote(account_query)}"
-            response = requests.get(search_url, headers=headers)
-            data = response.json()
-
-            if "data" not in data or not data["data"]:
-                send_whatsapp_message(sender, f"❌ No account found matching: {account_query}")
-                return
+            threading.Thread(target=contextvars.copy_context().run, args=(reply,),
+                             name="pipeline-summary-reply", daemon=True).start()
+            return
+        send_pipeline_summary(sender, pipeline)
 
-            # Return first match
-            account = data["data"][0]
-            name = account.get("Account_Name", "N/A")
-            phone = account.get("Phone", "N/A")
-            website = account.get("Website", "N/A")
-            industry = account.get("Industry", "N/A")
-            account_id = account.get("id", "N/A")
-
-            account_details = (
-                f"🏢 *Account Found:*\n"
-                f"• Name: *{name}*\n"
-                f"• Phone: *{phone}*\n"
-                f"• Website: *{website}*\n"
-                f"• Industry: *{industry}*\n"
-                f"• ID: `{account_id}`"
-            )
+    except Exception as e:
+        send_whatsapp_message(sender, f"❌ Error while building the pipeline summary: {str(e)}")
+
+def preview_command(sender, command):
+    conversation_state.set(sender, {
+        "flow": "confirm_command",
+        "data": {"name": command.name, "args": command.args, "text": command.text, "media": list(command.media)}
+    })
+    send_whatsapp_message(sender, f"🤔 Did you mean:\n`{command_router.render(command)}`\n\n"
+                                  "✅ Reply *yes* to do it or *no* to cancel.")
+
+def handle_command_confirmation(command, sender, state):
+    # The reply to preview_command. Returns False to let a different command run instead.
+    if command is None:
+        send_whatsapp_message(sender, "⚠️ Please reply with *yes* to confirm or *no* to cancel.")
+        return True
+    if command.name not in ("confirm", "cancel"):
+        return False
+
+    state = conversation_state.pop(sender)
+    if state is None:
+        return True
+    if command.name == "cancel":
+        send_whatsapp_message(sender, "❌ Cancelled, nothing was changed.")
+        return True
+
+    data = state["data"]
+    pending = Command(data["name"], data["args"], data["text"], tuple(tuple(m) for m in data["media"]))
+    set_command(pending.name)
+    COMMAND_HANDLERS[pending.name](pending, sender)
+    return True
+
+COMMAND_HANDLERS = {
+    "help": handle_help,
+    "add_contact": handle_add_contact,
+    "create_deal": handle_create_deal,
+    "deal_details": handle_deal_details,
+    "note": handle_note,
+    "update_deal": handle_update_deal,
+    "search_contact": handle_search_contact,
+    "search_deal": handle_search_deal,
+    "search_account": handle_search_account,
+    "import_contacts": handle_import_contacts,
+    "find": handle_find,
+    "pipeline_summary": handle_pipeline_summary,
+}
+
+# Handlers for replies while a multi-step flow is active: handler(command or None, sender, state) -> handled
+FLOW_HANDLERS = {
+    "create_deal": handle_deal_confirmation,
+    "confirm_deal": handle_deal_suggestion,
+    "confirm_command": handle_command_confirmation,
+}
 
-            send_whatsapp_message(sender, account_details)
+# ---------------- Command Handler ----------------
+def handle_command(message, sender, command=None, state=None):
+    if command is None:
+        command = command_router.parse(message)
+    if state is None:
+        state = conversation_state.get(sender)
+    set_command(command.name if command else "invalid")
+
+    # An active flow gets the first look at the reply; other valid commands still run.
+    if state:
+        flow_handler = FLOW_HANDLERS.get(state.get("flow"))
+        if flow_handler is None:
+            conversation_state.delete(sender)
+        else:
+            try:
+                if flow_handler(command, sender, state):
+                    return
+            except ZohoUnavailable as e:
+                send_whatsapp_message(sender, f"⏳ {str(e)}")
+                return
 
-        except Exception as e:
-            send_whatsapp_message(sender, f"❌ Error while searching for account: {str(e)}")
-    else:
+    if command is None or command.name in ("confirm", "cancel"):
         send_whatsapp_message(sender,
             "⚠️ Invalid command. Try:\n"
             "@bot add contact NAME company COMPANY\n"
             "@bot create deal\n"
             "@bot note DEAL_NAME note_content YOUR_NOTE"
         )
-# ---------------- Webhook ----------------
-@app.route("/whatsapp", methods=["POST"])
-def whatsapp():
-    message = request.form.get("Body")
-    sender = request.form.get("From")
-    print("🟢 Incoming WhatsApp message:", message)
-    print("👤 From:", sender)
+        return
+
+    COMMAND_HANDLERS[command.name](command, sender)
+
+# ---------------- Message Processing ----------------
+MESSAGES = metrics.counter("hfs_bot_messages_total", "Messages handled, by command.", labels=("command",))
+
+def process_message(message, sender, media=()):
+    # Spans below are tagged with the command once routing has picked one.
+    with command_context("unknown"), span("message"):
+        try:
+            route_message(message, sender, media)
+        finally:
+            MESSAGES.inc(command=current_command())
+
+def route_message(message, sender, media=()):
+    with span("parse"):
+        command = command_router.parse(message)
+    if command and media:
+        command = replace(command, media=tuple(media))
+    state = conversation_state.get(sender)
 
     # 🔥 First: Check if the user has pending confirmation
-    if sender in pending_deal_confirmations:
-        handle_command(message, sender)
+    if state:
+        handle_command(message, sender, command, state)
     elif message and message.lower().startswith("@bot"):
-        handle_command(message, sender)
+        handle_command(message, sender, command)
+    elif command and command.name == "deal_details":
+        # Reply to the `@bot create deal` prompt, which doesn't ask for the @bot prefix
+        handle_command(message, sender, command)
     else:
-        # No pending confirmation, no @bot → Use LLM
-        llm_response = ask_llm(message)
-        send_whatsapp_message(sender, llm_response)
+        # Plainly recognisable commands skip the model round trip
+        with span("classify"):
+            command = intent_classifier.route(message)
+        if command and command.name in WRITE_COMMANDS:
+            # A guess never changes the CRM by itself.
+            preview_command(sender, command)
+            return
+        if command:
+            handle_command(message, sender, command)
+            return
+
+        # No pending confirmation, no @bot, nothing recognisable → Use LLM
+        set_command("llm")
+        if llm_budget and not llm_budget.try_take():
+            LLM_THROTTLED.inc(tenant=(current_tenant() or tenants.default()).id)
+            send_whatsapp_message(sender, "⏳ I'm getting a lot of questions right now. Please try again in a minute.")
+            return
+        llm_response = ask_llm(message, on_chunk=lambda part: send_whatsapp_message(sender, part))
+        if llm_response:
+            send_whatsapp_message(sender, llm_response)
+
+# ---------------- Webhook Deduplication ----------------
+# Twilio re-delivers a webhook it didn't get a timely 200 for, with the same MessageSid.
+# A retry of a message that is being handled or was handled is acked without doing anything;
+# the reply from the first delivery is the one the user gets. DEDUP_STORE=sqlite shares this across workers.
+deliveries = delivery_log_from_env()
+DUPLICATES = metrics.counter("hfs_bot_webhook_duplicates_total", "Re-delivered webhooks that were skipped.",
+                             labels=("state",))
+
+def process_delivery(config, message_sid, message, sender, media=()):
+    try:
+        with tenants.use(config) as tenant, tenant_context(tenant):
+            process_message(message, sender, media)
+    except Exception:
+        if deliveries and message_sid:
+            deliveries.release(message_sid)
+        raise
+    if deliveries and message_sid:
+        deliveries.complete(message_sid)
+
+# "sync" handles the message inside the webhook request; "async" acks first and uses the worker pool.
+DISPATCH_MODE = os.environ.get("DISPATCH_MODE", "sync").lower()
+dispatcher = KeyedDispatcher(
+    process_delivery,
+    workers=int(os.environ.get("DISPATCH_WORKERS", "8")),
+    max_pending=int(os.environ.get("DISPATCH_MAX_PENDING", "200")),
+    max_per_key=int(os.environ.get("DISPATCH_MAX_PER_SENDER", "20"))
+)
 
+# ---------------- Webhook ----------------
+@bot.route("/whatsapp", methods=["POST"])
+def whatsapp():
+    message = request.form.get("Body")
+    sender = request.form.get("From")
+    # Attachments, e.g. a CSV or vCard sent with "@bot import contacts"
+    media = [
+        (request.form.get(f"MediaUrl{i}"), request.form.get(f"MediaContentType{i}", ""))
+        for i in range(int(request.form.get("NumMedia") or 0))
+    ]
+    # The number the user wrote to picks the business unit; the tenant itself is built by whoever handles it.
+    config = tenants.config_for_number(request.form.get("To"))
+    log.info("whatsapp message received", extra={"sender": sender, "tenant": config.id,
+                                                 "chars": len(message or ""), "media": len(media)})
+    log.debug("whatsapp message body", extra={"sender": sender, "body": message})
+
+    message_sid = request.form.get("MessageSid")
+    if deliveries and message_sid:
+        state = deliveries.claim(message_sid)
+        if state != NEW:
+            DUPLICATES.inc(state=state)
+            log.info("duplicate webhook skipped", extra={"sender": sender, "message_sid": message_sid, "state": state})
+            return "OK", 200
+
+    if current_app.config["DISPATCH_MODE"] != "async":
+        process_delivery(config, message_sid, message, sender, media)
+        return "OK", 200
+
+    # Ack Twilio right away; the reply goes out from a worker, in order per sender and tenant.
+    if not dispatcher.submit((config.id, sender), config, message_sid, message, sender, media):
+        if deliveries and message_sid:
+            deliveries.release(message_sid)
+        log.warning("dispatch queue full, message rejected", extra={"sender": sender})
+        return "Busy", 503, {"Retry-After": "5"}
     return "OK", 200
 
-@app.route("/debug/deals")
-def debug_deals():
-    access_token = get_access_token()
-    headers = {"Authorization": f"Zoho-oauthtoken {access_token}"}
-    response = requests.get("https://www.zohoapis.com/crm/v2/Deals", headers=headers)
-    return response.json()
-
-@app.route("/debug/accounts")
-def debug_all_accounts():
-    access_token = get_access_token()
-    headers = {"Authorization": f"Zoho-oauthtoken {access_token}"}
-
-    url = "https://www.zohoapis.com/crm/v2/Accounts"
-    params = {
-        "page": 1,
-        "per_page": 200  # Max allowed by Zoho
-    }
+# ---------------- Metrics ----------------
+metrics.gauge("hfs_bot_dispatch_queue_depth", "Messages waiting for a dispatch worker.",
+              lambda: dispatcher.stats()["queue_depth"])
+metrics.gauge("hfs_bot_outbox_depth", "CRM writes waiting in the outbox.",
+              lambda: default_outbox.stats()["depth"] if default_outbox else None)
+
+# Per tenant, over the tenants currently built, so a scrape doesn't build any.
+def per_tenant(fn):
+    return lambda: {tenant.id: fn(tenant) for tenant in tenants.active()}
+
+metrics.gauge("hfs_bot_outbound_queue_depth", "Replies waiting to be sent to Twilio.",
+              per_tenant(lambda t: t.outbound.queue.stats()["queue_depth"]), label="tenant")
+metrics.gauge("hfs_bot_zoho_in_flight", "Zoho requests currently in flight.",
+              per_tenant(lambda t: t.zoho.in_flight), label="tenant")
+metrics.gauge("hfs_bot_zoho_breaker_open", "1 while the Zoho circuit breaker is open.",
+              per_tenant(lambda t: int(t.zoho.breaker.state != "closed")), label="tenant")
+metrics.gauge("hfs_bot_zoho_credits_per_minute", "Zoho API credits used per minute, last 15 minutes.",
+              per_tenant(lambda t: t.zoho.meter.stats()["burn_per_minute"]), label="tenant")
+metrics.gauge("hfs_bot_tenants_active", "Tenants whose clients are currently built.", lambda: len(tenants.active()))
+metrics.gauge("hfs_bot_llm_cache_hit_ratio", "LLM response cache hit ratio.", lambda: llm_cache.stats()["hit_rate"])
+
+@bot.route("/metrics")
+def prometheus_metrics():
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+@bot.route("/debug/dispatch")
+def debug_dispatch():
+    return dispatcher.stats()
+
+# ---------------- CRM Export ----------------
+# Every page of a module, streamed as NDJSON or CSV, e.g.
+# /export/accounts?format=csv&fields=Account_Name,Phone&modified_since=2026-01-01
+# The bearer token decides whose data: each tenant has its own, and without one nothing is exported.
+def token_tenant():
+    # The TenantConfig whose export_token came as "Authorization: Bearer <token>", or an error response.
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    config = tenants.config_for_export_token(token.strip()) if scheme == "Bearer" else None
+    if config is None:
+        return None, ({"error": "unauthorized"}, 401)
+    return config, None
+
+@bot.route("/export/<module>")
+def export_module(module):
+    config, denied = token_tenant()
+    if denied:
+        return denied
+    zoho_module = EXPORT_MODULES.get(module.lower())
+    if zoho_module is None:
+        return {"error": f"unknown module, use one of: {', '.join(EXPORT_MODULES)}"}, 404
+    fmt = request.args.get("format", "ndjson").lower()
+    if fmt not in EXPORT_FORMATS:
+        return {"error": f"unknown format, use one of: {', '.join(EXPORT_FORMATS)}"}, 400
+    try:
+        modified_since = parse_modified_since(request.args.get("modified_since"))
+    except ValueError:
+        return {"error": "modified_since must be an ISO 8601 date or timestamp"}, 400
 
-    response = requests.get(url, headers=headers, params=params)
-    print("🔍 Accounts Fetch URL:", response.url)
-    return response.json()
+    # The tenant's own client, held until the stream ends: it outlives this request and its tenant context.
+    tenant = tenants.get(config, hold=True)
+    try:
+        chunks = export_chunks(tenant.zoho, zoho_module, fmt, parse_fields(request.args.get("fields")), modified_since)
+    except Exception as e:
+        tenants.release(tenant)
+        log.error("export failed", extra={"module": zoho_module, "error": str(e)})
+        return {"error": str(e)}, 502
 
-@app.route("/", methods=["GET"])
+    def stream():
+        try:
+            yield from chunks
+        finally:
+            tenants.release(tenant)
+
+    filename = f"{zoho_module.lower()}.{fmt}"
+    return Response(stream(), mimetype=EXPORT_FORMATS[fmt],
+                    headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+@bot.route("/debug/dedup")
+def debug_dedup():
+    return deliveries.stats() if deliveries else {"enabled": False}
+
+@bot.route("/debug/picklists", methods=["GET", "POST"])
+def debug_picklists():
+    if request.method == "POST":
+        # Like the other POSTs below: needs a tenant's export token and acts on that tenant.
+        config, denied = token_tenant()
+        if denied:
+            return denied
+        with tenants.use(config) as tenant, tenant_context(tenant):
+            deal_picklists.refresh()
+            return deal_picklists.stats()
+    return deal_picklists.stats()
+
+@bot.route("/debug/outbound")
+def debug_outbound():
+    return outbound.stats()
+
+@bot.route("/debug/zoho-usage")
+def debug_zoho_usage():
+    return zoho.usage()
+
+@bot.route("/debug/outbox")
+def debug_outbox():
+    return outbox.stats() if outbox else {"mode": CRM_WRITE_MODE}
+
+@bot.route("/debug/llm-cache")
+def debug_llm_cache():
+    return llm_cache.stats()
+
+@bot.route("/debug/deal-cache")
+def debug_deal_cache():
+    return deal_id_cache.stats()
+
+@bot.route("/debug/mirror", methods=["GET", "POST"])
+def debug_mirror():
+    if request.method == "POST":
+        config, denied = token_tenant()
+        if denied:
+            return denied
+        with tenants.use(config) as tenant, tenant_context(tenant):
+            if not mirror:
+                return {"enabled": False}
+            return mirror.sync_all(full=request.args.get("full") == "1", force=True)
+    if not mirror:
+        return {"enabled": False}
+    return mirror.stats()
+
+@bot.route("/debug/pipeline-summary", methods=["GET", "POST"])
+def debug_pipeline_summary():
+    if request.method == "POST":
+        config, denied = token_tenant()
+        if denied:
+            return denied
+        with tenants.use(config) as tenant, tenant_context(tenant):
+            pipeline_summary.sync(full=request.args.get("full") == "1")
+            return pipeline_summary.stats()
+    return pipeline_summary.stats()
+
+@bot.route("/debug/tenants")
+def debug_tenants():
+    return tenants.stats()
+
+@bot.route("/", methods=["GET"])
 def home():
     return "✅ WhatsApp Bot is up and running!", 200
 
+@bot.route("/ready")
+def ready():
+    # For load balancers: 503 until the warm-up (if any) has finished.
+    warmup = current_app.extensions["hfs_bot_warmup"]
+    ready = warmup.recheck()
+    return warmup.status(), 200 if ready else 503
+
+
+# ---------------- Warm-Up ----------------
+class WarmUp:
+    # Gets the Zoho token and the Deal picklists before the first request needs them.
+    def __init__(self, mode="off"):
+        self.mode = mode
+        self.ready = mode == "off"
+        self.started_at = None
+        self.finished_at = None
+        self.steps = {}
+        self._started = False
+        self._lock = threading.Lock()
+
+    def _step(self, name, fn):
+        started = time.monotonic()
+        try:
+            # A step reports failure by raising or by returning nothing: get_token() gives None when
+            # the refresh fails, refresh() gives False.
+            self.steps[name] = {"ok": bool(fn())}
+        except Exception as e:
+            # A failed step only means the first real request does the work instead.
+            log.warning("warm-up step failed", extra={"step": name, "error": str(e)})
+            self.steps[name] = {"ok": False, "error": str(e)}
+        self.steps[name]["seconds"] = round(time.monotonic() - started, 3)
+
+    def run(self):
+        self.started_at = time.time()
+        self._step("zoho_token", get_access_token)
+        self._step("picklists", deal_picklists.refresh)
+        self.finished_at = time.time()
+        # Without a token nothing works; the picklists have defaults to fall back on.
+        self.ready = self.steps["zoho_token"]["ok"]
+        log.info("warm-up finished", extra={"steps": self.steps})
+
+    def recheck(self):
+        # /ready after a failed token step: try again (get_token() backs off between failed refreshes).
+        if self.finished_at and not self.ready:
+            self._step("zoho_token", get_access_token)
+            self.ready = self.steps["zoho_token"]["ok"]
+        return self.ready
+
+    def start(self):
+        with self._lock:
+            if self._started or self.mode == "off":
+                return
+            self._started = True
+        if self.mode == "blocking":
+            self.run()
+        else:
+            threading.Thread(target=self.run, name="warm-up", daemon=True).start()
+
+    def status(self):
+        return {"ready": self.ready, "warmup": self.mode, "started_at": self.started_at,
+                "finished_at": self.finished_at, "steps": self.steps}
+
+
+# ---------------- App Factory ----------------
+DEFAULT_CONFIG = {
+    "DISPATCH_MODE": DISPATCH_MODE,
+    # "off", "background" (serve at once, /ready turns 200 when done) or "blocking" (before create_app returns)
+    "WARMUP": os.environ.get("WARMUP", "off").lower(),
+    # Start the mirror sync and outbox flusher threads, when those are enabled.
+    "BACKGROUND_WORKERS": True,
+}
+
+def start_background_workers():
+    # Other tenants' picklists and summaries refresh when read; a timer each would outlive their eviction.
+    tenants.default().picklists.start_background_refresh()
+    tenants.default().pipeline_summary.start_background_sync()
+    if default_mirror:
+        default_mirror.start_background_sync()
+    if default_outbox:
+        default_outbox.start()
+
+def create_app(config=None):
+    # Settings in `config` override DEFAULT_CONFIG for this app only; CRM and Twilio credentials
+    # and the clients built from them are shared by every app in the process.
+    # Structured JSON logs, written from a background thread (once per process)
+    configure_logging(os.environ.get("LOG_LEVEL", "INFO"))
+    app = Flask(__name__)
+    app.config.update(DEFAULT_CONFIG)
+    app.config.update(config or {})
+    app.register_blueprint(bot)
+    if app.config["BACKGROUND_WORKERS"]:
+        start_background_workers()
+    warmup = app.extensions["hfs_bot_warmup"] = WarmUp(app.config["WARMUP"])
+    warmup.start()
+    return app
+
+# Importing this module builds no tenant and starts no thread: gunicorn runs the factory in each worker
+# ("zoho_whatsapp_bot:create_app()"), and `from zoho_whatsapp_bot import app` builds a default app on
+# first use for the benchmarks and older deployments.
+_default_app = None
+_default_app_lock = threading.Lock()
+
+def __getattr__(name):
+    global _default_app
+    if name != "app":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _default_app_lock:
+        if _default_app is None:
+            _default_app = create_app()
+    return _default_app
+
 
 # ---------------- Run Server ----------------
 if __name__ == "__main__":
-    app.run(port=8000)
\ No newline at end of file
+    create_app().run(port=8000)
\ No newline at end of file